@@ -0,0 +1,104 @@
+"""Benchmark: subpage fetches per site and field recall, first-3-keyword-links vs ranked discovery.
+
+Usage: python benchmarks/bench_discovery.py
+
+Runs offline over the fixture sites. A "fetch" of a link resolves its path
+to a fixture file by name (/who-we-are -> who-we-are.html); links with no
+matching file count as wasted fetches. "legacy" is the old
+find_contact_pages (the first 3 links matching any of 8 keywords, all
+fetched); "ranked" uses discovery.rank_candidates with the scraper's waves
+and early stop. robots.txt and sitemaps are not part of the fixtures. A
+field counts as found when all of its needles from expected.json appear in
+the collected text or the rule-resolved fields.
+"""
+import json
+import sys
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper import rule_extract  # noqa: E402
+from ngo_scraper.discovery import WAVES, covered_fields, rank_candidates  # noqa: E402
+from ngo_scraper.html_parse import parse_page  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+BASE = "https://ngo.example.org/"
+
+
+def legacy_candidates(base_url, page):
+    contact_pages = []
+    base_domain = urlparse(base_url).netloc
+    keywords = ['contact', 'about', 'reach', 'connect', 'get-in-touch', 'office', 'location', 'team']
+    for href, link_text in page.links:
+        full_url = urljoin(base_url, href)
+        if urlparse(full_url).netloc == base_domain:
+            if any(keyword in link_text.lower() or keyword in href.lower() for keyword in keywords):
+                if full_url not in contact_pages and full_url != base_url:
+                    contact_pages.append(full_url)
+    return contact_pages[:3]
+
+
+def load(site_dir, url):
+    name = urlparse(url).path.strip('/').split('/')[-1] or "index"
+    for candidate in (site_dir / name, site_dir / f"{name}.html"):
+        if candidate.is_file() and candidate.suffix == ".html":
+            return parse_page(candidate.read_bytes())
+    return None
+
+
+def crawl(site_dir, ranked):
+    main = parse_page((site_dir / "index.html").read_bytes())
+    pages = [main]
+    all_content = [("Main Page", main.text)]
+    fetches = wasted = 0
+    if ranked:
+        remaining = [url for _, url in rank_candidates(BASE, main.links)]
+        waves = WAVES
+    else:
+        remaining = legacy_candidates(BASE, main)
+        waves = (len(remaining),)
+    for wave in waves:
+        if not remaining:
+            break
+        if ranked and covered_fields(rule_extract.extract_known_fields(pages),
+                                     all_content) >= set(rule_extract.REQUIRED_FIELDS):
+            break
+        batch, remaining = remaining[:wave], remaining[wave:]
+        for url in batch:
+            fetches += 1
+            page = load(site_dir, url)
+            if page is None:
+                wasted += 1
+                continue
+            pages.append(page)
+            all_content.append((url, page.text))
+    structured = [main.footer_text or ""] + main.contact_sections + [href for href, _ in main.links]
+    #rule-resolved fields go straight into the record, so they count as found too
+    structured += list(rule_extract.extract_known_fields(pages).values())
+    text = ' '.join(content for _, content in all_content) + ' ' + ' '.join(structured)
+    return fetches, wasted, text
+
+
+def fields_found(content, expected):
+    lowered = ' '.join(content.lower().split())
+    return sum(1 for needles in expected.values()
+               if needles and all(needle.lower() in lowered for needle in needles))
+
+
+def main():
+    expected = json.loads((FIXTURES / "expected.json").read_text())
+    print(f"{'site':<20}{'legacy fetch':>13}{'wasted':>8}{'found':>7}{'ranked fetch':>14}{'wasted':>8}{'found':>7}")
+    totals = [0] * 6
+    for site, fields in expected.items():
+        row = []
+        for ranked in (False, True):
+            fetches, wasted, text = crawl(FIXTURES / site, ranked)
+            row += [fetches, wasted, fields_found(text, fields)]
+        totals = [t + r for t, r in zip(totals, row)]
+        print(f"{site:<20}{row[0]:>13}{row[1]:>8}{row[2]:>7}{row[3]:>14}{row[4]:>8}{row[5]:>7}")
+    print(f"{'total':<20}{totals[0]:>13}{totals[1]:>8}{totals[2]:>7}{totals[3]:>14}{totals[4]:>8}{totals[5]:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Export benchmark: time and peak memory per format, legacy DataFrame export vs streaming writers.
+
+Usage: python benchmarks/bench_export.py [--rows 100000] [--formats xlsx,csv,jsonl,parquet]
+
+"legacy xlsx" reproduces the pre-refactor create_excel_file: a DataFrame
+through pd.ExcelWriter followed by a str() pass over every cell to size the
+columns. Peak memory is measured with tracemalloc, so it counts Python
+allocations only (not pyarrow's native buffers).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper.export import EXPORT_FORMATS, export_records  # noqa: E402
+
+
+def make_records(count):
+    for i in range(count):
+        yield {
+            "Website": f"https://ngo-{i}.example.org",
+            "NGO Name": f"Seva Foundation {i}",
+            "Address": f"{i % 400} MG Road, Sector {i % 60}, Pune, Maharashtra 4110{i % 90:02d}",
+            "Services Offered": "Education, healthcare camps, women's self-help groups, rural livelihoods",
+            "Contact Person Details": f"Anita Rao (Director), anita{i}@example.org",
+            "Contact Number": f"+91 98{i % 100000000:08d}",
+        }
+
+
+def legacy_xlsx(records, path):
+    import pandas as pd
+
+    df = pd.DataFrame(list(records))
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='NGO Data')
+        worksheet = writer.sheets['NGO Data']
+        for column in worksheet.columns:
+            max_length = max(len(str(cell.value)) for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = min(max_length + 2, 50)
+
+
+def measure(run, rows, suffix):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"out.{suffix}")
+        tracemalloc.start()
+        start = time.perf_counter()
+        run(make_records(rows), path)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak / 1e6, os.path.getsize(path) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS))
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    cases = [] if args.skip_legacy else [("legacy xlsx", legacy_xlsx, "xlsx")]
+    for fmt in args.formats.split(","):
+        cases.append((f"stream {fmt}", lambda records, path, fmt=fmt: export_records(records, path, fmt), fmt))
+
+    print(f"{args.rows} rows")
+    print(f"{'case':16} {'seconds':>8} {'peak MB':>8} {'file MB':>8}")
+    for name, run, suffix in cases:
+        elapsed, peak, size = measure(run, args.rows, suffix)
+        print(f"{name:16} {elapsed:8.2f} {peak:8.1f} {size:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
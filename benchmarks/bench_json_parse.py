@@ -0,0 +1,131 @@
+"""Benchmark: parsing model responses, legacy regex cascade vs the single-pass json_scan parser.
+
+Usage: python benchmarks/bench_json_parse.py [--size 200000] [--repeat 5]
+
+Each case is a response shape seen from Gemini (or one built to be hostile):
+a clean object, fenced JSON with prose around it, an object truncated by the
+token limit, a large multi-site array, adversarial text of about ``--size``
+characters with thousands of unmatched braces before the JSON, and nesting
+deeper than the json module's recursion limit (an exception counts as "n").
+"legacy" is the old clean_json_response (fence stripping, a nested-brace
+regex retried from every ``{``, then json.loads, then line splitting);
+"scan" is extraction.clean_json_response. Reported: best time per parse
+and whether the expected fields came back.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper.extraction import clean_json_response, parse_json_array  # noqa: E402
+
+RECORD = {
+    "NGO Name": "Asha Foundation {Regd.}",
+    "Address": "12 MG Road, Bengaluru, Karnataka 560001",
+    "Services Offered": "Education; Health camps; Women's self-help groups",
+    "Contact Person Details": "Priya Rao (director) \"Didi\"",
+    "Contact Number": "+91 98450 12345",
+}
+
+
+def legacy_clean_json_response(response_text):
+    response_text = response_text.strip()
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]
+    elif response_text.startswith('```'):
+        response_text = response_text[3:]
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]
+    response_text = response_text.strip()
+    matches = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response_text, re.DOTALL)
+    for match in matches:
+        try:
+            parsed = json.loads(match)
+            if isinstance(parsed, dict) and len(parsed) > 0:
+                return parsed
+        except ValueError:
+            continue
+    try:
+        return json.loads(response_text)
+    except ValueError:
+        pass
+    result = {}
+    for line in response_text.split('\n'):
+        if ':' in line and ('"' in line or "'" in line):
+            parts = line.split(':', 1)
+            key = parts[0].strip().strip('"').strip("'").strip(',')
+            value = parts[1].strip().strip('"').strip("'").strip(',')
+            if key and value:
+                result[key] = value
+    return result or None
+
+
+def cases(size):
+    record = json.dumps(RECORD, indent=2)
+    filler = "The organisation {see annual report} works across districts. " * (size // 64)
+    return {
+        "clean": (record, RECORD),
+        "fenced + prose": (f"Here is the extracted data:\n```json\n{record}\n```\nLet me know if you need more.",
+                           RECORD),
+        "unbalanced brace in a value": (
+            "Sure!\n" + json.dumps({**RECORD, "Address": "Block C}, Sector 5, Noida"}, indent=2) + "\nDone.",
+            {"Address": "Block C}, Sector 5, Noida"}),
+        "wrapped, nested two levels": (
+            "Result:\n" + json.dumps({"result": {"site": {"name": "x"}}, **RECORD}), RECORD),
+        "truncated": (record[:record.index('"Contact Person Details"') + 40], {"NGO Name": RECORD["NGO Name"]}),
+        "long prose first": (filler + "\n" + record, RECORD),
+        "unmatched braces": ("{" * size + "\n" + record, RECORD),
+        "open/close pairs, unclosed": ("{" + "{}" * (size // 2) + "\n" + record, RECORD),
+        #deeper than the json module's recursion limit
+        "deeply nested, closed": ("Here: " + "[" * 5000 + "]" * 5000 + "\n" + record, RECORD),
+        "deeply nested object": ("Result: " + '{"a":' * 5000 + "1" + "}" * 5000 + "\n" + record, RECORD),
+        "deeply nested, unclosed": ("[" * size + "\n" + record, RECORD),
+    }
+
+
+def correct(parsed, expected):
+    return isinstance(parsed, dict) and all(parsed.get(field) == value for field, value in expected.items())
+
+
+def best_time(fn, text, repeat):
+    """Best time over ``repeat`` calls and the result; an exception counts as the result (a wrong answer)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = fn(text)
+        except Exception as e:
+            result = e
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000, help="characters of adversarial/prose text")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':30}{'chars':>9}{'legacy ms':>12}{'ok':>4}{'scan ms':>10}{'ok':>4}")
+    for name, (text, expected) in cases(args.size).items():
+        legacy_seconds, legacy = best_time(legacy_clean_json_response, text, args.repeat)
+        scan_seconds, scanned = best_time(clean_json_response, text, args.repeat)
+        print(f"{name:30}{len(text):>9}{legacy_seconds * 1000:>12.2f}{'y' if correct(legacy, expected) else 'n':>4}"
+              f"{scan_seconds * 1000:>10.2f}{'y' if correct(scanned, expected) else 'n':>4}")
+
+    sites = [{"url": f"https://ngo{i}.example.org", **RECORD} for i in range(200)]
+    array = json.dumps(sites)
+    seconds, parsed = best_time(parse_json_array, "```json\n" + array + "\n```", args.repeat)
+    print(f"\nmulti-site array, {len(sites)} sites ({len(array)} chars): {seconds * 1000:.2f} ms, "
+          f"{len(parsed or [])} objects")
+    cut = array[:len(array) * 3 // 4]
+    seconds, parsed = best_time(parse_json_array, cut, args.repeat)
+    print(f"same array cut at 75%: {seconds * 1000:.2f} ms, {len(parsed or [])} complete objects recovered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark: prompt tokens per site and field recall, fixed truncation vs relevance packing.
+
+Usage: python benchmarks/bench_packing.py [--budget 2500]
+
+Each fixture site is turned into ``all_content`` the way the scraper does it
+(index.html as the main page, the other pages as subpages, plus the
+structured-data line); the legacy run keeps the old 8,000 character page cap. A field counts as "found" when every needle listed
+for it in fixtures/expected.json appears in the prompt content, i.e. the
+information is at least available to the model.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper.content_pack import PAGE_TEXT_LIMIT, estimate_tokens, pack_content  # noqa: E402
+from ngo_scraper.html_parse import parse_page  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def site_content(site_dir, page_limit):
+    paths = sorted(site_dir.glob("*.html"), key=lambda path: path.name != "index.html")
+    all_content = []
+    structured = []
+    for path in paths:
+        page = parse_page(path.read_bytes())
+        all_content.append(("Main Page" if path.name == "index.html" else path.name, page.text[:page_limit]))
+        if path.name == "index.html":
+            if page.footer_text:
+                structured.append(f"FOOTER: {page.footer_text}")
+            structured += [f"CONTACT SECTION: {text}" for text in page.contact_sections]
+            structured += [f"PHONE: {href[4:]}" for href, _ in page.links if href.startswith('tel:')]
+            structured += [f"EMAIL: {href[7:]}" for href, _ in page.links if href.startswith('mailto:')]
+    if structured:
+        all_content.append(("Structured Data", ' | '.join(structured)))
+    return all_content
+
+
+def legacy_content(all_content):
+    combined_content = "\n\n=== WEBSITE SECTIONS ===\n\n"
+    for source, content in all_content:
+        combined_content += f"\n--- {source} ---\n{content[:3000]}\n"
+    return combined_content[:15000]
+
+
+def fields_found(content, expected):
+    lowered = ' '.join(content.lower().split())
+    return sum(1 for needles in expected.values()
+               if needles and all(needle.lower() in lowered for needle in needles))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=int, default=None, help="token budget (default NGO_PROMPT_TOKEN_BUDGET)")
+    args = parser.parse_args()
+
+    expected = json.loads((FIXTURES / "expected.json").read_text())
+    print(f"{'site':<20}{'legacy tok':>11}{'found':>7}{'packed tok':>12}{'found':>7}{'possible':>10}")
+    totals = [0, 0, 0, 0, 0]
+    for site, fields in expected.items():
+        legacy = legacy_content(site_content(FIXTURES / site, 8000))
+        all_content = site_content(FIXTURES / site, PAGE_TEXT_LIMIT)
+        packed = pack_content(all_content, args.budget) if args.budget else pack_content(all_content)
+        row = [estimate_tokens(legacy), fields_found(legacy, fields),
+               estimate_tokens(packed), fields_found(packed, fields),
+               sum(1 for needles in fields.values() if needles)]
+        totals = [t + r for t, r in zip(totals, row)]
+        print(f"{site:<20}{row[0]:>11}{row[1]:>7}{row[2]:>12}{row[3]:>7}{row[4]:>10}")
+    print(f"{'total':<20}{totals[0]:>11}{totals[1]:>7}{totals[2]:>12}{totals[3]:>7}{totals[4]:>10}")
+    print(f"\ntokens saved: {(1 - totals[2] / max(1, totals[0])) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Microbenchmark: HTML parse cost per page, old double-parse vs the single-parse pipeline.
+
+Usage: python benchmarks/bench_parse.py [--repeat 50]
+
+"legacy" reproduces the pre-refactor flow for a main page: two html.parser
+parses, a decompose pass, get_text and a regex whitespace pass, plus the
+footer/contact/link walks of extract_structured_data. The other rows run
+ngo_scraper.html_parse.parse_page with each available backend.
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper.html_parse import available_backend, parse_page  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def legacy_parse(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    links = [(link['href'], link.get_text().lower()) for link in soup.find_all('a', href=True)]
+
+    main_soup = BeautifulSoup(content, 'html.parser')
+    for script in main_soup(["script", "style", "nav", "header", "aside", "img"]):
+        script.decompose()
+    text = re.sub(r'\s+', ' ', main_soup.get_text()).strip()
+
+    footer = soup.find('footer')
+    if footer:
+        re.sub(r'\s+', ' ', footer.get_text()).strip()
+    for section in soup.find_all(['div', 'section'], class_=re.compile(r'contact|address|info', re.I))[:3]:
+        re.sub(r'\s+', ' ', section.get_text()).strip()
+    for link in soup.find_all(['a']):
+        link.get('href', '')
+    return text, links
+
+
+def load_pages():
+    pages = [(str(path.relative_to(FIXTURES)), path.read_bytes()) for path in sorted(FIXTURES.glob("*/*.html"))]
+    #a realistically heavy page: the richest fixture body repeated to ~150KB
+    biggest = max(pages, key=lambda item: len(item[1]))[1]
+    head, _, rest = biggest.partition(b"<main>")
+    body, _, tail = rest.partition(b"</main>")
+    pages.append(("synthetic/large.html", head + b"<main>" + body * max(1, 150_000 // max(1, len(body))) + b"</main>" + tail))
+    return pages
+
+
+def time_per_page(fn, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, content in pages:
+            fn(content)
+    return (time.perf_counter() - start) / (repeat * len(pages)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = load_pages()
+    print(f"{len(pages)} pages, {sum(len(c) for _, c in pages) / 1024:.0f} KB total, {args.repeat} rounds\n")
+    print(f"{'pipeline':<28}{'ms/page':>10}{'speedup':>10}")
+
+    baseline = time_per_page(legacy_parse, pages, args.repeat)
+    print(f"{'legacy (html.parser x2)':<28}{baseline:>10.2f}{1.0:>9.1f}x")
+
+    for backend in ["html.parser", "lxml", "selectolax"]:
+        if available_backend(backend) != backend:
+            print(f"{'single-parse ' + backend:<28}{'not installed':>20}")
+            continue
+        cost = time_per_page(lambda content: parse_page(content, backend=backend), pages, args.repeat)
+        print(f"{'single-parse ' + backend:<28}{cost:>10.2f}{baseline / cost:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
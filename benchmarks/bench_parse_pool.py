@@ -0,0 +1,64 @@
+"""Scaling benchmark: pages/sec of the parse stage, inline in fetch threads vs a process pool.
+
+Usage: python benchmarks/bench_parse_pool.py [--pages 400] [--threads 8] [--workers 1,2,4]
+
+Simulates the crawl's fetch threads: --threads threads each parse their
+share of --pages fixture pages (already in memory, so no I/O). "inline" is
+the NGO_PARSE_WORKERS=0 path where every parse holds the GIL; the other
+rows hand the bytes to ngo_scraper.parse_pool with that many processes.
+Pool start-up is excluded (the pool is warmed before timing). Speedups need
+as many free cores as workers.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper.parse_pool import parse_html, shutdown_parse_pool  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_pages():
+    return [(path.read_bytes(), "text/html") for path in sorted(FIXTURES.glob("*/*.html"))]
+
+
+def run(pages, count, threads, workers):
+    work = [pages[i % len(pages)] for i in range(count)]
+    #warm the pool (process start + imports) outside the timed section
+    for _ in range(max(workers, 1)):
+        parse_html(*pages[0], workers=workers)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda page: parse_html(*page, workers=workers), work))
+    elapsed = time.perf_counter() - start
+    shutdown_parse_pool()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8, help="simulated fetch threads")
+    cores = os.cpu_count() or 1
+    default_workers = ",".join(str(n) for n in sorted({1, 2, 4, cores}) if n <= max(cores, 4))
+    parser.add_argument("--workers", default=default_workers, help="comma separated pool sizes")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    print(f"{cores} cores, {len(pages)} distinct fixture pages, {args.pages} parses, {args.threads} threads")
+    print(f"{'mode':12} {'pages/s':>8} {'speedup':>8}")
+    baseline = run(pages, args.pages, args.threads, 0)
+    print(f"{'inline':12} {baseline:8.1f} {1.0:8.2f}")
+    for workers in (int(n) for n in args.workers.split(",")):
+        rate = run(pages, args.pages, args.threads, workers)
+        print(f"{f'{workers} procs':12} {rate:8.1f} {rate / baseline:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
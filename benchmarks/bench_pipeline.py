@@ -0,0 +1,143 @@
+"""End-to-end offline benchmark: fixture web server + stub LLM through the real bulk pipeline.
+
+Usage: python benchmarks/bench_pipeline.py [--copies 25] [--latency-ms 80] [--llm-latency-ms 400]
+                                            [--error-rate 0.02] [--llm-error-rate 0.05 --llm-failure 429]
+                                            [--record bench_pipeline.jsonl]
+
+Starts benchmarks/fixture_server.py in a child process (so the server does
+not share this process's GIL or memory), points run_batch at every site
+copy with a StubModel-backed Gemini client, then exports the results. It
+reports latency percentiles per stage, sites/sec and peak RSS of the
+pipeline process. The stages are the pipeline's own ``metrics.span``
+timings for the run (percentiles are estimated within the span histogram
+buckets, max is exact):
+
+  fetch     main page download          subpages  subpage downloads per site
+  parse     HTML parse per page         prompt    content packing + prompt build
+  llm       model call                  crawl     whole crawl per site
+  extract   extraction per site         batch     multi-site extraction per group
+  export    writing all records, per format
+
+The HTTP, extraction and job caches are turned off so every run does the
+full work. ``--record`` appends the summary as a JSON line for tracking.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+#every run should do the full work
+os.environ["NGO_HTTP_CACHE"] = "off"
+os.environ["NGO_LLM_CACHE"] = "off"
+os.environ["NGO_JOB_STORE"] = "off"
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ngo_scraper import extraction, http_client, metrics, scraper, validation  # noqa: E402
+from ngo_scraper.batch import run_batch  # noqa: E402
+from ngo_scraper.export import export_records  # noqa: E402
+from ngo_scraper.gemini_client import set_client  # noqa: E402
+from stub_llm import FAILURES, make_stub_client  # noqa: E402
+
+#report name -> the metrics.span stage it reads
+STAGES = {"fetch": "fetch_main", "subpages": "fetch_subpages", "parse": "parse", "prompt": "prompt_build",
+          "llm": "llm_call", "crawl": "scrape", "extract": "extract", "batch": "extract_batch", "export": "export"}
+
+
+def mean_ms(registry, span):
+    count, seconds, _ = registry.totals("stage_seconds", stage=span)
+    return round(seconds / count * 1000, 1) if count else None
+
+
+def start_fixture_server(args):
+    command = [sys.executable, str(Path(__file__).resolve().parent / "fixture_server.py"),
+               "--copies", str(args.copies), "--latency-ms", str(args.latency_ms),
+               "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate),
+               "--drop-rate", str(args.drop_rate), "--seed", str(args.seed)]
+    server = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    urls = []
+    for line in server.stdout:
+        if line.strip() == "ready":
+            break
+        urls.append(line.split("\t")[0])
+    return server, urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=25, help="copies of each fixture site (one host each)")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-failure", choices=FAILURES, default="429")
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--extract-workers", type=int, default=4)
+    parser.add_argument("--combine", action="store_true", help="multi-site LLM requests")
+    parser.add_argument("--politeness", type=float, default=None, help="per-host delay in seconds (default 0.5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="append the summary as a JSON line to this file")
+    args = parser.parse_args()
+
+    client = make_stub_client(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, args.llm_failure,
+                              args.seed)
+    set_client(client)
+    if args.politeness is not None:
+        http_client.scheduler.delay = args.politeness
+
+    run_metrics = metrics.Registry()
+    server, urls = start_fixture_server(args)
+    try:
+        results, stats = run_batch(
+            urls, scraper.scrape_comprehensive_content, extraction.extract_required_fields_with_gemini,
+            fetch_workers=args.fetch_workers, extract_workers=args.extract_workers,
+            extract_many_fn=extraction.extract_batch_with_gemini if args.combine else None,
+            group_size=extraction.BATCH_MAX_SITES, run_metrics=run_metrics)
+    finally:
+        server.stdin.close()
+        server.wait(timeout=10)
+
+    with tempfile.TemporaryDirectory() as tmp, metrics.collect(run_metrics):
+        for fmt in ("xlsx", "csv", "jsonl"):
+            export_records(results, os.path.join(tmp, f"out.{fmt}"), fmt)
+
+    errors = sum(1 for record in results if record["NGO Name"].startswith("  ") or record["NGO Name"].startswith("Error"))
+    print(f"{len(urls)} sites in {stats.elapsed:.2f}s: {len(urls) / stats.elapsed:.2f} sites/s, "
+          f"{errors} error records, peak RSS {http_client.peak_memory_mb() or 0:.0f} MB")
+    print(f"LLM calls: {sum(model.calls for model in client.stub_models.values())} "
+          f"({client.router.summary(run_metrics)})")
+    print(validation.summary(run_metrics))
+    print(f"\n{'stage':10}{'count':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    summary = {}
+    for stage, span in STAGES.items():
+        h = run_metrics.merged("stage_seconds", stage=span)
+        if h is None:
+            continue
+        row = {"count": h.count, "p50": h.quantile(0.5) * 1000, "p90": h.quantile(0.9) * 1000,
+               "p99": h.quantile(0.99) * 1000, "max": h.max * 1000}
+        summary[stage] = {key: round(value, 1) for key, value in row.items()}
+        print(f"{stage:10}{row['count']:>7}{row['p50']:>9.1f}{row['p90']:>9.1f}{row['p99']:>9.1f}{row['max']:>9.1f}")
+    print("export: " + ", ".join(f"{fmt} {run_metrics.totals('stage_seconds', stage='export', format=fmt)[1] * 1000:.0f} ms"
+                                 for fmt in ("xlsx", "csv", "jsonl")))
+
+    if args.record:
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "sites": len(urls),
+                 "elapsed": round(stats.elapsed, 2), "sites_per_sec": round(len(urls) / stats.elapsed, 2),
+                 "errors": errors, "peak_rss_mb": round(http_client.peak_memory_mb() or 0),
+                 "mean_crawl_ms": mean_ms(run_metrics, "scrape"), "mean_extract_ms": mean_ms(run_metrics, "extract"),
+                 "stages": summary}
+        with open(args.record, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Cold-start benchmark: library import and CLI startup time in fresh interpreters.
+
+Usage: python benchmarks/bench_startup.py [--repeat 10] [--record startup.jsonl]
+
+Each row runs a new Python process so nothing is shared through
+sys.modules. "bare python" is the interpreter floor; the other rows are
+measured against it. ``--record`` appends the medians as one JSON line so
+startup regressions can be tracked across commits.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = [
+    ("bare python", [sys.executable, "-c", "pass"]),
+    ("import ngo_scraper", [sys.executable, "-c", "import ngo_scraper"]),
+    ("import ngo_scraper.scraper", [sys.executable, "-c", "import ngo_scraper.scraper"]),
+    ("import ngo_scraper.extraction", [sys.executable, "-c", "import ngo_scraper.extraction"]),
+    ("cli --help", [sys.executable, "-m", "ngo_scraper", "--help"]),
+]
+
+
+def time_command(command, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--record", help="append the results as a JSON line to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':32} {'median ms':>10} {'over bare':>10}")
+    for name, command in CASES:
+        results[name] = time_command(command, args.repeat)
+        overhead = results[name] - results["bare python"]
+        print(f"{name:32} {results[name]:10.1f} {overhead:10.1f}")
+
+    if args.record:
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": git_revision(),
+                 "python": sys.version.split()[0], "median_ms": {k: round(v, 1) for k, v in results.items()}}
+        with open(args.record, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
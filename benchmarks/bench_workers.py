@@ -0,0 +1,123 @@
+"""Benchmark: throughput of a fleet of queue workers against the local fixture server.
+
+Usage: python benchmarks/bench_workers.py [--workers 1,2,4] [--copies 10] [--threads 2]
+                                          [--latency-ms 50] [--llm-latency-ms 400] [--kill-one]
+
+For each fleet size a fresh SQLite work queue gets every fixture site copy
+(one host each), then that many worker processes (this script with
+``--worker``, running ``ngo_scraper.worker.Worker`` with the stub LLM) work
+until the queue is empty. Reported per fleet: wall time from starting the
+first worker to the last exit (process start-up included), sites/s, and
+speed-up and efficiency against the first fleet size.
+
+With ``--kill-one`` the first worker of every fleet larger than one is
+SIGKILLed once half the sites are done; its leased URLs come back after
+``--lease-seconds`` and the run reports how many were picked up again.
+"""
+import argparse
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+#every run should do the full work
+os.environ["NGO_HTTP_CACHE"] = "off"
+os.environ["NGO_LLM_CACHE"] = "off"
+os.environ["NGO_JOB_STORE"] = "off"
+os.environ["NGO_RENDER"] = "off"
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+
+def run_worker(args):
+    from ngo_scraper import worker
+    from ngo_scraper.gemini_client import set_client
+    from ngo_scraper.work_queue import SQLiteWorkQueue
+    from stub_llm import make_stub_client
+
+    set_client(make_stub_client(args.llm_latency_ms, args.llm_jitter_ms, seed=os.getpid()))
+    queue = SQLiteWorkQueue(args.worker, lease_seconds=args.lease_seconds)
+    fleet_worker = worker.Worker(queue, threads=args.threads, exit_when_empty=True)
+    fleet_worker.run()
+    print(worker.summary(fleet_worker.metrics), file=sys.stderr)
+
+
+def run_fleet(args, size, urls, workdir):
+    from ngo_scraper.work_queue import SQLiteWorkQueue
+
+    path = os.path.join(workdir, f"queue-{size}.sqlite")
+    queue = SQLiteWorkQueue(path, lease_seconds=args.lease_seconds)
+    job_id = queue.enqueue(urls)
+    command = [sys.executable, __file__, "--worker", path, "--threads", str(args.threads),
+               "--llm-latency-ms", str(args.llm_latency_ms), "--llm-jitter-ms", str(args.llm_jitter_ms),
+               "--lease-seconds", str(args.lease_seconds)]
+    start = time.perf_counter()
+    workers = [subprocess.Popen(command, stderr=subprocess.DEVNULL) for _ in range(size)]
+    killed = False
+    while any(process.poll() is None for process in workers):
+        if args.kill_one and size > 1 and not killed:
+            progress = queue.progress(job_id)
+            if progress["done"] + progress["failed"] >= len(urls) // 2:
+                workers[0].send_signal(signal.SIGKILL)
+                killed = True
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+
+    progress = queue.progress(job_id)
+    with sqlite3.connect(path) as conn:
+        retried = conn.execute("SELECT COUNT(*) FROM work_items WHERE attempts > 1").fetchone()[0]
+    return elapsed, progress, retried, killed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma list of fleet sizes")
+    parser.add_argument("--copies", type=int, default=10, help="copies of each fixture site (one host each)")
+    parser.add_argument("--threads", type=int, default=2, help="threads per worker")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--lease-seconds", type=float, default=5)
+    parser.add_argument("--kill-one", action="store_true", help="SIGKILL one worker halfway through each fleet")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", metavar="QUEUE", help=argparse.SUPPRESS)  #run as one worker of a fleet
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from bench_pipeline import start_fixture_server
+
+    sizes = [int(size) for size in args.workers.split(",")]
+    server, urls = start_fixture_server(args)
+    try:
+        print(f"{len(urls)} sites, {args.threads} threads per worker\n")
+        print(f"{'workers':>8}{'seconds':>9}{'sites/s':>9}{'speed-up':>10}{'efficiency':>12}{'done':>6}"
+              f"{'failed':>8}{'retried':>9}")
+        base = None
+        with tempfile.TemporaryDirectory() as workdir:
+            for size in sizes:
+                elapsed, progress, retried, killed = run_fleet(args, size, urls, workdir)
+                rate = len(urls) / elapsed
+                base = base or (rate, size)
+                speedup = rate / base[0]
+                efficiency = speedup / (size / base[1])
+                print(f"{size:>8}{elapsed:>9.1f}{rate:>9.2f}{speedup:>9.2f}x{efficiency:>11.0%}{progress['done']:>6}"
+                      f"{progress['failed']:>8}{retried:>9}" + ("  (one worker killed)" if killed else ""))
+    finally:
+        server.stdin.close()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Local web server for the recorded fixture sites, with latency and error injection.
+
+Usage: python benchmarks/fixture_server.py [--copies 10] [--latency-ms 50] [--error-rate 0.02]
+
+Each site directory under fixtures/ (times --copies) gets its own port, so
+root-relative links resolve inside the site and every copy counts as a
+separate host for the politeness scheduler. The base URL of every site is
+printed on stdout, one per line, followed by a "ready" line; the server
+runs until stdin closes or it is interrupted.
+
+Paths map to files like a static host would: "/" is index.html and
+"/who-we-are" falls back to who-we-are.html. Missing robots.txt and
+sitemap.xml are 404s. Every response waits --latency-ms plus up to
+--jitter-ms; --error-rate answers 503 and --drop-rate closes the
+connection without a response.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".txt": "text/plain", ".xml": "application/xml"}
+
+
+class Faults:
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, drop_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(delay seconds, outcome) for one request; outcome is "ok", "error" or "drop" """
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if roll < self.drop_rate:
+            return delay, "drop"
+        if roll < self.drop_rate + self.error_rate:
+            return delay, "error"
+        return delay, "ok"
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, site_dir, faults, **kwargs):
+        self.site_dir = site_dir
+        self.faults = faults
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def resolve(self):
+        name = self.path.split('?')[0].split('#')[0].strip('/') or "index.html"
+        for candidate in (self.site_dir / name, self.site_dir / f"{name}.html"):
+            if candidate.is_file() and candidate.resolve().is_relative_to(self.site_dir):
+                return candidate
+        return None
+
+    def do_GET(self):
+        delay, outcome = self.faults.draw()
+        if delay:
+            time.sleep(delay)
+        if outcome == "drop":
+            self.close_connection = True
+            self.connection.close()
+            return
+        if outcome == "error":
+            self.send_error(503, "Injected failure")
+            return
+        path = self.resolve()
+        if path is None:
+            self.send_error(404, "File not found")
+            return
+        body = path.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(path.suffix, "application/octet-stream"))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def site_dirs():
+    return sorted(path for path in FIXTURES.iterdir() if (path / "index.html").is_file())
+
+
+def start_servers(copies=1, faults=None, host="127.0.0.1"):
+    """Start one server per site copy; returns [(site name, base URL, server)]"""
+    faults = faults or Faults()
+    servers = []
+    for copy in range(copies):
+        for site_dir in site_dirs():
+            handler = partial(SiteHandler, site_dir=site_dir.resolve(), faults=faults)
+            server = ThreadingHTTPServer((host, 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append((site_dir.name, f"http://{host}:{server.server_port}/", server))
+    return servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=1, help="servers per fixture site")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of connections closed without a reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.drop_rate, args.seed)
+    servers = start_servers(args.copies, faults)
+    for name, url, _ in servers:
+        print(f"{url}\t{name}")
+    print("ready", flush=True)
+    try:
+        sys.stdin.read()
+    except KeyboardInterrupt:
+        pass
+    for _, _, server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
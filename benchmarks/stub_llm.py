@@ -0,0 +1,130 @@
+"""Deterministic stand-in for the Gemini SDK models, for offline benchmarks.
+
+``make_stub_client`` returns a real ``GeminiClient`` whose models are
+``StubModel`` instances, so calls still go through the router's quota,
+retry and circuit-breaker logic. A stub answers after ``latency_ms`` (plus
+up to ``jitter_ms``) with a JSON record for the fields the prompt asks for,
+or an array for multi-site prompts. With probability ``error_rate`` a call
+fails in the chosen ``failure`` mode:
+
+* ``"429"`` / ``"500"``: raises an error carrying that status code (retried by the router)
+* ``"blocked"``: a response stopped for safety, with no text
+* ``"invalid_json"``: text that is not JSON; with a ``response_schema`` in the
+  generation config the stub answers normally, as constrained decoding would
+* ``"empty"``: a record where every field is "Not found"
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ngo_scraper.gemini_client import MODELS, GeminiClient, ModelRouter  # noqa: E402
+
+FAILURES = ("429", "500", "blocked", "invalid_json", "empty")
+FIELD_RE = re.compile(r'^\s*"([^"]+)":\s*"', re.M)
+WEBSITE_RE = re.compile(r'^Website: (\S+)', re.M)
+SECTION_RE = re.compile(r'^URL: (\S+)\nNeeded fields: ([^\n]+)', re.M)
+UNLIMITED_QUOTAS = {model: {"rpm": 10 ** 6, "tpm": 10 ** 9} for model in MODELS}
+
+
+class StubApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"{code} stubbed API error")
+        self.code = code
+
+
+class StubCandidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class StubResponse:
+    def __init__(self, text=None, finish_reason="STOP"):
+        self._text = text
+        self.candidates = [StubCandidate(finish_reason)]
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("response has no text")
+        return self._text
+
+
+def stub_value(url, field):
+    digest = hashlib.sha1(f"{url}|{field}".encode()).hexdigest()[:6]
+    if field == "Contact Number":
+        return f"+91 98{int(digest, 16) % 10 ** 8:08d}"
+    return f"{field} {digest}"
+
+
+class StubModel:
+    def __init__(self, name, latency_ms=300, jitter_ms=0, error_rate=0.0, failure="429", seed=0):
+        if failure not in FAILURES:
+            raise ValueError(f"failure must be one of {', '.join(FAILURES)}")
+        self.name = name
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.failure = failure
+        self.calls = 0
+        self._random = random.Random(f"{seed}:{name}")
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self.latency + self._random.uniform(0, self.jitter), self._random.random() < self.error_rate
+
+    def _answer(self, prompt, failed, generation_config=None):
+        if failed and self.failure in ("429", "500"):
+            raise StubApiError(int(self.failure))
+        if failed and self.failure == "blocked":
+            return StubResponse(None, finish_reason="SAFETY")
+        if failed and self.failure == "invalid_json":
+            if not (generation_config or {}).get("response_schema"):
+                return StubResponse("Sorry, I could not find that information.")
+            failed = False
+
+        sections = SECTION_RE.findall(prompt)
+        if sections:
+            return StubResponse(json.dumps([
+                {"url": url, **{field.strip(): "Not found" if failed else stub_value(url, field.strip())
+                                for field in fields.split(",")}}
+                for url, fields in sections]))
+        match = WEBSITE_RE.search(prompt)
+        url = match.group(1) if match else ""
+        template = prompt[prompt.rfind("Return this EXACT JSON structure"):]
+        return StubResponse(json.dumps({field: "Not found" if failed else stub_value(url, field)
+                                        for field in FIELD_RE.findall(template)}))
+
+    def generate_content(self, prompt, generation_config=None):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        return self._answer(prompt, failed, generation_config)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        delay, failed = self._draw()
+        await asyncio.sleep(delay)
+        return self._answer(prompt, failed, generation_config)
+
+
+def make_stub_client(latency_ms=300, jitter_ms=0, error_rate=0.0, failure="429", seed=0, quotas=None,
+                     max_in_flight=32):
+    """A GeminiClient backed by StubModels; pass it to gemini_client.set_client"""
+    models = {}
+
+    def factory(model_name):
+        models[model_name] = StubModel(model_name, latency_ms, jitter_ms, error_rate, failure, seed)
+        return models[model_name]
+
+    router = ModelRouter(quotas=quotas or UNLIMITED_QUOTAS)
+    client = GeminiClient(router=router, max_in_flight=max_in_flight, model_factory=factory)
+    client.stub_models = models
+    return client
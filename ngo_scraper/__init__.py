@@ -0,0 +1,26 @@
+"""Reusable building blocks for the NGO web scraper.
+
+The public entry points are re-exported here but only imported on first
+access, so ``import ngo_scraper`` stays cheap for CLIs and workers.
+"""
+import importlib
+
+_EXPORTS = {
+    "scrape_and_extract_ngo_data": "ngo_scraper.scraper",
+    "scrape_comprehensive_content": "ngo_scraper.scraper",
+    "extract_required_fields_with_gemini": "ngo_scraper.extraction",
+    "extract_required_fields_async": "ngo_scraper.extraction",
+    "extract_all_concurrently": "ngo_scraper.extraction",
+    "extract_batch_with_gemini": "ngo_scraper.extraction",
+    "run_batch": "ngo_scraper.batch",
+    "read_url_list": "ngo_scraper.batch",
+    "create_excel_file": "ngo_scraper.export",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module 'ngo_scraper' has no attribute {name!r}")
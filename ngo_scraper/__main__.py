@@ -0,0 +1,5 @@
+import sys
+
+from ngo_scraper.cli import main
+
+sys.exit(main())
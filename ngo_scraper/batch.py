@@ -0,0 +1,276 @@
+"""Bulk URL mode: a two-stage, bounded-concurrency crawl-and-extract pipeline.
+
+Fetching (network bound) and extraction (LLM bound) run in separate thread
+pools so that page downloads for one site overlap with Gemini calls for
+another. A semaphore between the stages keeps fetched-but-not-yet-extracted
+content from piling up in memory when the LLM is the slower stage.
+"""
+import csv
+import io
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from ngo_scraper import metrics
+from ngo_scraper.canonical import duplicate_groups, site_key
+from ngo_scraper.incremental import is_error_record
+from ngo_scraper.rule_extract import REQUIRED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def error_record(message):
+    """Build a result row for a site that could not be processed"""
+    record = {field: "Not found" for field in REQUIRED_FIELDS}
+    record["NGO Name"] = message
+    return record
+
+
+def read_url_list(text):
+    """Parse an uploaded CSV/TXT list of URLs (first column, header and blanks skipped)"""
+    urls = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row:
+            continue
+        cell = row[0].strip()
+        if not cell or cell.startswith('#') or cell.lower() in ('url', 'urls', 'website', 'domain'):
+            continue
+        urls.append(cell)
+    return urls
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    fetched: int = 0
+    extracted: int = 0
+    failed: int = 0
+    resumed: int = 0       #sites restored already finished from a job checkpoint
+    deduplicated: int = 0  #rows that reused another row's result (same site, or redirected to it)
+    elapsed: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def completed(self):
+        return self.extracted + self.failed
+
+    @property
+    def sites_per_minute(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return (self.completed - self.resumed) / self.elapsed * 60
+
+    @property
+    def eta(self):
+        """Seconds until the remaining sites are done at the current rate, or None before the first one"""
+        if self.sites_per_minute <= 0:
+            return None
+        return (self.total - self.completed) / self.sites_per_minute * 60
+
+
+def run_batch(urls, fetch_fn, extract_fn, fetch_workers=8, extract_workers=4, on_result=None,
+              extract_many_fn=None, group_size=8, store=None, job_id=None, cancel=None, run_metrics=None):
+    """Crawl and extract a list of sites concurrently.
+
+    ``fetch_fn(url)`` must return ``(all_content, final_url, *extra)`` like
+    ``scrape_comprehensive_content`` and ``extract_fn(all_content, url, *extra)``
+    must return a record dict like ``extract_required_fields_with_gemini``.
+    When ``extract_many_fn`` is given, fetched sites are handed to it in groups
+    of up to ``group_size`` as ``[(all_content, url, *extra)]`` and it must
+    return the records in the same order (see ``extract_batch_with_gemini``).
+    ``on_result(index, record, stats)`` is called from the calling thread as
+    each site finishes, so it is safe to update Streamlit widgets from it.
+
+    With a ``store`` (see ``ngo_scraper.job_store``) and ``job_id`` the run is
+    checkpointed: ``urls`` is ignored in favour of the job's URLs, sites that
+    already finished are reported straight away, sites that were fetched go
+    straight to extraction, and every stage result is saved as it happens.
+
+    Rows naming the same site (see ``ngo_scraper.canonical``) are crawled and
+    extracted once and the record is copied to every one of them; so are
+    rows whose fetch redirects to a site another row already fetched.
+
+    Setting the ``cancel`` event stops the run: queued sites are dropped,
+    sites in flight finish, and the job's checkpoint stays resumable.
+
+    Everything the run records also goes to ``run_metrics`` (a
+    ``metrics.Registry``, see ``ngo_scraper.metrics``), so the module
+    summaries and reports can be read for this run alone.
+
+    Returns ``(results, stats)`` with results in input order, each record
+    prefixed with a ``Website`` column; rows a cancelled run did not reach
+    are None.
+    """
+    run_metrics = metrics.Registry() if run_metrics is None else run_metrics
+    items = store.items(job_id) if store is not None else None
+    if items is not None:
+        urls = [item.url for item in items]
+    else:
+        urls = [u.strip() for u in urls if u and u.strip()]
+    stats = BatchStats(total=len(urls))
+    results = [None] * len(urls)
+    if not urls:
+        return results, stats
+
+    group_size = max(1, group_size) if extract_many_fn else 1
+    events = queue.Queue()
+    #caps how much fetched content waits for the extract stage
+    pending = threading.BoundedSemaphore(max(1, extract_workers) * 2 * group_size)
+    #rows that share a site with an earlier row take its result instead of being crawled again
+    duplicates = {}  #index of the row doing the work -> indices of the rows copying it
+    claimed = {}     #site_key of a fetched final URL -> index of the row that owns it
+    outcomes = {}    #index -> (event kind, record) once a row that did the work has finished
+    stopping = threading.Event()
+    start = time.perf_counter()
+
+    def finish(index, kind, record):
+        outcomes[index] = (kind, record)
+        for row in [index] + duplicates.pop(index, []):
+            if kind == "extracted":
+                stats.extracted += 1
+            else:
+                stats.failed += 1
+            results[row] = {"Website": urls[row], **record}
+            results[row]["Website"] = urls[row]  #records copied from another row carry its Website
+            if store is not None and not items[row].finished:
+                store.save_result(job_id, row, results[row], failed=kind != "extracted")
+            stats.elapsed = time.perf_counter() - start
+            if on_result:
+                on_result(row, results[row], stats)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, fetch_workers), thread_name_prefix="fetch") as fetch_pool, \
+                ThreadPoolExecutor(max_workers=max(1, extract_workers), thread_name_prefix="extract") as extract_pool, \
+                metrics.collect(run_metrics):
+
+            def extract_stage(group):
+                try:
+                    if extract_many_fn:
+                        records = extract_many_fn([(all_content, final_url, *extra)
+                                                   for _, all_content, final_url, extra in group])
+                    else:
+                        _, all_content, final_url, extra = group[0]
+                        records = [extract_fn(all_content, final_url, *extra)]
+                    #error records (no API key, AI errors) are failures: counted as such and retried on resume
+                    for (index, *_), record in zip(group, records):
+                        events.put(("failed" if is_error_record(record) else "extracted", index, record))
+                except Exception as e:
+                    logger.error(f"Extraction failed for {', '.join(item[2] for item in group)}: {str(e)}")
+                    for index, *_ in group:
+                        events.put(("failed", index, error_record(f"  Extraction failed: {str(e)[:100]}")))
+                finally:
+                    for _ in group:
+                        pending.release()
+
+            def acquire_slot():
+                """Wait for room in the extract stage; False once the run is being abandoned"""
+                while not pending.acquire(timeout=0.2):
+                    if stopping.is_set():
+                        return False
+                return True
+
+            def fetch_stage(index, url):
+                if stopping.is_set():
+                    return
+                try:
+                    all_content, final_url, *extra = fetch_fn(url)
+                except Exception as e:
+                    logger.error(f"Fetch failed for {url}: {str(e)}")
+                    events.put(("fetch_failed", index, error_record(f"Error scraping website: {str(e)}")))
+                    return
+
+                if all_content and all_content[0][0] == "Error":
+                    events.put(("fetch_failed", index, error_record(all_content[0][1])))
+                    return
+
+                if acquire_slot():
+                    events.put(("fetched", index, (index, all_content, final_url, extra)))
+
+            def restore_stage(item):
+                if acquire_slot():
+                    events.put(("restored", item.position, (item.position, item.all_content, item.final_url, item.extra)))
+
+            fetches_expected = 0
+            for rows in duplicate_groups(urls):
+                done = [row for row in rows if items is not None and items[row].finished]
+                if done:  #an earlier run already settled this site
+                    stats.resumed += len(done)
+                    for row in done:
+                        events.put(("extracted" if items[row].state == "extracted" else "failed", row, items[row].record))
+                    rows = [row for row in rows if row not in done]
+                    source = items[done[0]]
+                    for row in rows:
+                        events.put(("extracted" if source.state == "extracted" else "failed", row, source.record))
+                    stats.deduplicated += len(rows)
+                    continue
+                fetched = [row for row in rows if items is not None and items[row].state == "fetched"]
+                index = fetched[0] if fetched else rows[0]
+                duplicates[index] = [row for row in rows if row != index]
+                stats.deduplicated += len(duplicates[index])
+                fetches_expected += 1
+                if fetched:
+                    metrics.submit(fetch_pool, restore_stage, items[index])
+                else:
+                    metrics.submit(fetch_pool, fetch_stage, index, urls[index])
+            if stats.deduplicated:
+                metrics.inc("batch_duplicates", stats.deduplicated, found="input")
+
+            def abandon():
+                stopping.set()
+                fetch_pool.shutdown(wait=False, cancel_futures=True)
+                extract_pool.shutdown(wait=False, cancel_futures=True)
+
+            group = []
+            fetches_done = 0
+            try:
+                while stats.completed < stats.total:
+                    if cancel is not None and cancel.is_set():
+                        stats.cancelled = True
+                        logger.info(f"Batch cancelled after {stats.completed}/{stats.total} sites")
+                        abandon()
+                        break
+                    try:
+                        kind, index, payload = events.get(timeout=0.2 if cancel is not None else None)
+                    except queue.Empty:
+                        continue
+                    if kind in ("fetched", "restored", "fetch_failed"):
+                        fetches_done += 1
+                    if kind in ("fetched", "restored"):
+                        owner = claimed.setdefault(site_key(payload[2]), index)
+                        if owner != index:
+                            #redirected onto a site another row already fetched: copy its result
+                            pending.release()
+                            copies = [index] + duplicates.pop(index, [])
+                            stats.deduplicated += len(copies)
+                            metrics.inc("batch_duplicates", len(copies), found="redirect")
+                            if owner in outcomes:
+                                duplicates[index] = copies[1:]
+                                finish(index, *outcomes[owner])
+                            else:
+                                duplicates.setdefault(owner, []).extend(copies)
+                        else:
+                            stats.fetched += 1
+                            group.append(payload)
+                            if kind == "fetched" and store is not None:
+                                store.save_fetched(job_id, index, *payload[1:3], payload[3])
+                    if group and (len(group) >= group_size or fetches_done == fetches_expected):
+                        metrics.submit(extract_pool, extract_stage, group)
+                        group = []
+                    if kind in ("fetched", "restored"):
+                        continue
+                    finish(index, kind, payload)
+            except BaseException:
+                #the caller gave up (e.g. Streamlit stopped the script): don't wait for queued sites
+                abandon()
+                raise
+    finally:
+        if store is not None:
+            store.flush()
+
+    stats.elapsed = time.perf_counter() - start
+    logger.info(f"Batch finished: {stats.completed}/{stats.total} sites in {stats.elapsed:.1f}s "
+                f"({stats.sites_per_minute:.1f} sites/min)")
+    return results, stats
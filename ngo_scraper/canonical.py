@@ -0,0 +1,65 @@
+"""Canonical site keys for input URLs, so one site is crawled and extracted once per batch.
+
+Lists collected by hand spell the same site many ways: ``www.x.org``,
+``x.org/``, ``http://x.org/index.html``, ``HTTPS://X.org/?utm_source=mail``.
+``site_key`` maps all of these to one key: scheme and ``www.`` ignored, host
+lowercased, default ports, fragments and tracking parameters dropped, and
+index documents folded into the directory they serve.
+
+``duplicate_groups`` groups a batch's input rows by that key before
+anything is fetched. Sites that only turn out to be the same after a
+redirect (``x.org`` -> ``x.org/en/``, an old domain moved to a new one) are
+folded in ``run_batch`` once the fetch reports the final URL.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+SCHEME_RE = re.compile(r'https?://', re.I)
+INDEX_PAGE_RE = re.compile(r'/(?:index|default|home)\.(?:html?|php|aspx?|jsp)$', re.I)
+TRACKING_PARAM_RE = re.compile(r'^(?:utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref)$', re.I)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Canonical form for deduplication: lowercase host, no fragment, default port or tracking params"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+    path = re.sub(r'/{2,}', '/', parsed.path or '/')
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = urlencode([(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                       if not TRACKING_PARAM_RE.match(k)])
+    return urlunparse((scheme, host, path, '', query, ''))
+
+
+def bare_host(netloc):
+    """Host of ``netloc`` lowercased, without port or a leading ``www.``"""
+    host = netloc.lower().split(':')[0]
+    return host[4:] if host.startswith('www.') else host
+
+
+def crawl_url(raw):
+    """The URL to fetch for an input cell: whitespace trimmed, https:// added when no scheme is given"""
+    raw = raw.strip()
+    if not SCHEME_RE.match(raw):
+        raw = 'https://' + raw.lstrip('/')
+    return raw
+
+
+def site_key(url):
+    """Key shared by every spelling of the same page; see the module docstring"""
+    parsed = urlparse(normalize_url(crawl_url(url)))
+    host = bare_host(parsed.netloc) + (f":{parsed.port}" if parsed.port else "")
+    path = INDEX_PAGE_RE.sub('', parsed.path).rstrip('/') or '/'
+    return host + path + (f"?{parsed.query}" if parsed.query else "")
+
+
+def duplicate_groups(urls):
+    """Group input rows by ``site_key``: ``[[first index, duplicate indices...]]`` in input order"""
+    groups = {}
+    for index, url in enumerate(urls):
+        groups.setdefault(site_key(url), []).append(index)
+    return list(groups.values())
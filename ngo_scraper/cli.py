@@ -0,0 +1,187 @@
+"""Headless command line entry point: ``python -m ngo_scraper urls.txt -o out.xlsx``.
+
+Heavy modules (pandas, the Gemini SDK, parsers) are imported only once the
+arguments have been parsed, so ``--help`` and argument errors return
+immediately.
+"""
+import argparse
+import logging
+import sys
+
+from ngo_scraper.export import EXPORT_FORMATS, export_format, export_records, open_writer
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="ngo_scraper",
+        description="Scrape NGO websites and extract contact details with Gemini.",
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file with one URL per line (or a CSV whose first column is the URL); '-' reads stdin")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file; the format follows the extension (.jsonl, .csv, .xlsx, .parquet). "
+                             "Default: JSONL on stdout")
+    parser.add_argument("--format", choices=EXPORT_FORMATS,
+                        help="override the format guessed from the output extension")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="concurrent site crawls")
+    parser.add_argument("--extract-workers", type=int, default=4, help="concurrent Gemini requests")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="processes for HTML parsing (default NGO_PARSE_WORKERS, 0 parses in the fetch threads)")
+    parser.add_argument("--combine", action="store_true",
+                        help="combine several sites into one Gemini request")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse last run's record for sites whose content has not changed (NGO_FINGERPRINTS)")
+    parser.add_argument("--change-report", metavar="PATH",
+                        help="with --incremental, write which sites were skipped, partially or fully re-extracted")
+    parser.add_argument("--validation-report", metavar="PATH",
+                        help="write the sites whose fields failed validation, the follow-ups and tokens saved")
+    parser.add_argument("--render", choices=["auto", "off"], default=None,
+                        help="render JavaScript-only pages in a headless browser (default: NGO_RENDER, auto)")
+    parser.add_argument("--render-report", metavar="PATH",
+                        help="write the pages rendered in a browser, why, the text gained and seconds per render")
+    parser.add_argument("--resume", type=int, metavar="JOB_ID",
+                        help="continue an interrupted job from its checkpoint instead of reading input; "
+                             "its failed sites are tried again")
+    parser.add_argument("--list-jobs", action="store_true", help="show recent jobs and their progress, then exit")
+    parser.add_argument("--metrics-out", metavar="PATH",
+                        help="write stage timings and counters when done (JSON for *.json, else Prometheus text)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve /metrics and /metrics.json on this port while running (default NGO_METRICS_PORT)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress or summary on stderr")
+    return parser
+
+
+def read_input(path):
+    if path == "-":
+        return sys.stdin.read()
+    with open(path, encoding="utf-8", errors="ignore") as handle:
+        return handle.read()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    fmt = export_format(args.output, args.format)
+    if args.output == "-" and fmt != "jsonl":
+        print("error: only JSONL can be written to stdout", file=sys.stderr)
+        return 2
+
+    from ngo_scraper.batch import read_url_list
+    from ngo_scraper.job_store import get_job_store
+
+    store = get_job_store()
+    if args.list_jobs or args.resume:
+        if store is None:
+            print("error: the job store is disabled (NGO_JOB_STORE=off)", file=sys.stderr)
+            return 2
+    if args.list_jobs:
+        for job in store.jobs():
+            print(f"{job['id']}\t{job['finished']}/{job['total']} done\t{job['failed']} failed\t{job['label'] or ''}")
+        return 0
+
+    job_id = args.resume
+    if job_id is None:
+        urls = read_url_list(read_input(args.input))
+        if not urls:
+            print("error: no URLs found in input", file=sys.stderr)
+            return 2
+        if store is not None:
+            job_id = store.create_job(urls, label=args.input if args.input != "-" else "stdin")
+    else:
+        urls = None
+        if not store.items(job_id):
+            print(f"error: no job {job_id}", file=sys.stderr)
+            return 2
+        retried = store.retry_failed(job_id)
+        if retried and not args.quiet:
+            print(f"{retried} failed sites queued again", file=sys.stderr)
+    if job_id is not None and not args.quiet:
+        print(f"Job {job_id} (resume with --resume {job_id})", file=sys.stderr)
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, stream=sys.stderr)
+
+    from ngo_scraper import discovery, http_client, metrics, render, rule_extract, validation
+    from ngo_scraper.batch import run_batch
+    from ngo_scraper.extraction import (
+        BATCH_MAX_SITES,
+        batch_call_summary,
+        extract_batch_with_gemini,
+        extract_required_fields_with_gemini,
+    )
+    from ngo_scraper.gemini_client import get_router
+    from ngo_scraper.parse_pool import set_parse_workers
+    from ngo_scraper.scraper import scrape_comprehensive_content
+
+    if args.parse_workers is not None:
+        set_parse_workers(args.parse_workers)
+    if args.render is not None:
+        render.set_render_mode(args.render)
+    metrics_port = metrics.METRICS_PORT if args.metrics_port is None else args.metrics_port
+    if metrics_port:
+        metrics_port = metrics.serve(metrics_port)
+        if not args.quiet:
+            print(f"Metrics on http://127.0.0.1:{metrics_port}/metrics", file=sys.stderr)
+
+    extract_fn = extract_required_fields_with_gemini
+    extract_many_fn = extract_batch_with_gemini if args.combine else None
+    incremental = None
+    if args.incremental:
+        from ngo_scraper.incremental import IncrementalExtractor, get_fingerprint_store
+
+        if get_fingerprint_store() is None:
+            print("error: fingerprints are disabled (NGO_FINGERPRINTS=off)", file=sys.stderr)
+            return 2
+        incremental = IncrementalExtractor(extract_fn, extract_many_fn)
+        extract_fn = incremental.extract
+        extract_many_fn = incremental.extract_many if extract_many_fn else None
+
+    #records are written as they finish (completion order), nothing is buffered for the output
+    writer = open_writer(sys.stdout.buffer if args.output == "-" else args.output, fmt)
+
+    def on_result(index, record, stats):
+        writer.write(record)
+        if args.output == "-":
+            sys.stdout.buffer.flush()
+        if not args.quiet:
+            print(f"[{stats.completed}/{stats.total}] {record['Website']}", file=sys.stderr)
+
+    run_metrics = metrics.Registry()
+    try:
+        with writer:
+            results, stats = run_batch(
+                urls,
+                fetch_fn=scrape_comprehensive_content,
+                extract_fn=extract_fn,
+                fetch_workers=args.fetch_workers,
+                extract_workers=args.extract_workers,
+                on_result=on_result,
+                extract_many_fn=extract_many_fn,
+                group_size=BATCH_MAX_SITES,
+                store=store,
+                job_id=job_id,
+                run_metrics=run_metrics,
+            )
+    finally:
+        render.shutdown_render_pool()
+    if not args.quiet:
+        print(f"{stats.completed} sites in {stats.elapsed:.1f}s ({stats.sites_per_minute:.1f} sites/min), "
+              f"{stats.failed} failed, {stats.deduplicated} duplicates reused", file=sys.stderr)
+        if args.combine:
+            print(batch_call_summary(run_metrics), file=sys.stderr)
+        print(http_client.summary(run_metrics), file=sys.stderr)
+        print(discovery.summary(run_metrics), file=sys.stderr)
+        print(render.summary(run_metrics), file=sys.stderr)
+        print(rule_extract.summary(run_metrics), file=sys.stderr)
+        print(validation.summary(run_metrics), file=sys.stderr)
+        print(get_router().summary(run_metrics), file=sys.stderr)
+        print(metrics.summary(run_metrics), file=sys.stderr)
+        if incremental is not None:
+            print(incremental.summary(), file=sys.stderr)
+    if incremental is not None and args.change_report:
+        export_records(incremental.report, args.change_report)
+    if args.validation_report:
+        export_records(run_metrics.report("validation"), args.validation_report)
+    if args.render_report:
+        export_records(run_metrics.report("render"), args.render_report)
+    if args.metrics_out:
+        metrics.dump(args.metrics_out)
+    return 1 if stats.failed == stats.total else 0
@@ -0,0 +1,122 @@
+"""Relevance-ranked packing of scraped page text into a prompt token budget.
+
+Instead of cutting every section at a fixed character count, page text is
+split into blocks, each block is scored for the signals the five output
+fields need (address, phone, services, leadership, name), repeated
+boilerplate such as menus and footers is dropped, and the best blocks are
+packed, in their original order, until the token budget is used up.
+"""
+import os
+import re
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("NGO_PROMPT_TOKEN_BUDGET", "1500"))
+PAGE_TEXT_LIMIT = 30000   #per-page text kept by the scraper; packing decides what reaches the prompt
+CHARS_PER_TOKEN = 4       #rough estimate for English/Latin text
+MIN_BLOCK_CHARS = 160     #short consecutive lines are merged up to this size
+MAX_BLOCK_CHARS = 700     #longer lines are split into pieces of about this size
+
+SIGNALS = {
+    "Address": (3.0, re.compile(
+        r'(?<!\d)[1-9]\d{2}\s?\d{3}(?!\d)|\b(?:road|rd\.|street|st\.|nagar|marg|lane|colony|sector|floor|'
+        r'building|near|opp\.?|district|dist\.|village|tehsil|taluk|block|pin|address|office)\b', re.I)),
+    "Contact Number": (3.0, re.compile(
+        r'\+?\d[\d\s\-()]{8,}\d|\b(?:phone|ph|tel|mobile|mob|call|whatsapp|helpline)\b', re.I)),
+    "Services Offered": (1.5, re.compile(
+        r'\b(?:programmes?|programs?|projects?|services?|we (?:work|provide|offer|run|support)|education|'
+        r'health|livelihoods?|women|children|empower\w*|training|relief|nutrition|welfare|scholarships?)\b', re.I)),
+    "Contact Person Details": (2.0, re.compile(
+        r'\b(?:founder|director|president|secretary|trustee|chair(?:man|person)|ceo|coordinator|manager|'
+        r'contact person|shri|smt|dr)\b|@', re.I)),
+    "NGO Name": (1.0, re.compile(
+        r'\b(?:foundation|trust|society|samiti|sangh|sanstha|ngo|registered|welfare|mission|association)\b', re.I)),
+}
+BOILERPLATE_RE = re.compile(
+    r'\b(?:home|login|register|sign ?in|subscribe|newsletter|cookies?|privacy|terms|copyright|all rights reserved|'
+    r'read more|share|follow us|facebook|twitter|instagram|youtube|posted on|visitors)\b', re.I)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_blocks(text):
+    """Group page lines into blocks of roughly MIN..MAX_BLOCK_CHARS characters"""
+    blocks = []
+    current = ""
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        while len(line) > MAX_BLOCK_CHARS:
+            cut = line.rfind(' ', 0, MAX_BLOCK_CHARS)
+            cut = cut if cut > 0 else MAX_BLOCK_CHARS
+            if current:
+                blocks.append(current)
+                current = ""
+            blocks.append(line[:cut])
+            line = line[cut:].strip()
+        current = f"{current}\n{line}" if current else line
+        if len(current) >= MIN_BLOCK_CHARS:
+            blocks.append(current)
+            current = ""
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def section_blocks(source, content):
+    """Blocks of one ``(source, text)`` section; structured data is already ' | '-separated"""
+    return content.split(' | ') if source == "Structured Data" else split_blocks(content)
+
+
+def score_block(block, fields):
+    score = 0.0
+    for field in fields:
+        weight, pattern = SIGNALS[field]
+        hits = len(pattern.findall(block))
+        score += weight * min(hits, 4)
+    boilerplate = len(BOILERPLATE_RE.findall(block))
+    score -= 1.5 * boilerplate
+    #density matters more than length: a short address block beats a long article
+    return score / (1 + len(block) / 400)
+
+
+def pack_content(all_content, budget_tokens=PROMPT_TOKEN_BUDGET, fields=None):
+    """Build the combined prompt content from ``[(source, text)]`` within ``budget_tokens``.
+
+    ``fields`` limits scoring to the signals of the fields still needed.
+    """
+    fields = [field for field in (fields or SIGNALS) if field in SIGNALS] or list(SIGNALS)
+    candidates = []  #(score, section index, block index, block)
+    seen = set()
+    for section_index, (source, content) in enumerate(all_content):
+        for block_index, block in enumerate(section_blocks(source, content)):
+            key = ' '.join(block.lower().split())
+            if not key or key in seen:  #nav/footer repeated on every subpage
+                continue
+            seen.add(key)
+            score = score_block(block, fields)
+            if section_index == 0 and block_index < 2:
+                score += 2.0  #page title and heading usually carry the NGO name
+            if score <= 0:
+                continue
+            candidates.append((score, section_index, block_index, block))
+
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    chosen = []
+    used = 0
+    for candidate in sorted(candidates, key=lambda c: c[0], reverse=True):
+        cost = len(candidate[3]) + 1
+        if used + cost > budget_chars:
+            continue
+        chosen.append(candidate)
+        used += cost
+
+    combined_content = "\n\n=== WEBSITE SECTIONS ===\n\n"
+    current_section = None
+    for _, section_index, _, block in sorted(chosen, key=lambda c: (c[1], c[2])):
+        if section_index != current_section:
+            combined_content += f"\n--- {all_content[section_index][0]} ---\n"
+            current_section = section_index
+        combined_content += block + "\n"
+    return combined_content
@@ -0,0 +1,221 @@
+"""Contact page discovery: ranked candidates from links, robots.txt and sitemaps.
+
+Candidate URLs come from the main page's links and, when those hold no
+strong contact link, from the site's sitemap. They are normalized and
+deduplicated, filtered through robots.txt, and scored by how likely they are
+to carry contact details (a "Contact us" link outranks "Our team", news and
+donation pages score negative). The scraper fetches the best candidates in
+waves and stops as soon as the required fields are covered.
+
+robots.txt and sitemap URLs are looked up once per domain and kept in memory
+(the HTTP cache also keeps the responses across runs). Configured with
+NGO_RESPECT_ROBOTS and NGO_SITEMAPS ("0" to disable either).
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+from ngo_scraper import metrics
+from ngo_scraper.canonical import bare_host, normalize_url
+from ngo_scraper.content_pack import SIGNALS
+
+logger = logging.getLogger(__name__)
+
+RESPECT_ROBOTS = os.getenv("NGO_RESPECT_ROBOTS", "1") not in ("0", "off", "false")
+USE_SITEMAPS = os.getenv("NGO_SITEMAPS", "1") not in ("0", "off", "false")
+MAX_PAGES = 3             #subpages fetched per site at most
+WAVES = (1, 2)            #pages fetched per wave; coverage is checked between waves
+MIN_SCORE = 3.0           #candidates below this are never fetched
+STRONG_SCORE = 10.0       #a link this good means the sitemap is not worth reading
+SITE_INFO_TTL = 3600
+SITE_INFO_ENTRIES = 4096
+SITEMAP_MAX_URLS = 2000
+SITEMAP_MAX_CHILDREN = 2  #child sitemaps followed from a sitemap index
+SERVICE_HITS_ENOUGH = 3   #service keywords in the collected text that count as "Services Offered" covered
+
+#(weight, pattern) over the URL path and link text
+KEYWORD_SCORES = [
+    (10.0, re.compile(r'contact|get[\s_-]?in[\s_-]?touch|reach[\s_-]?us|write[\s_-]?to[\s_-]?us', re.I)),
+    (6.0, re.compile(r'about|who[\s_-]?we[\s_-]?are|our[\s_-]?story|introduction|profile', re.I)),
+    (4.0, re.compile(r'address|office|locat|find[\s_-]?us|visit[\s_-]?us|reach', re.I)),
+    (3.0, re.compile(r'team|people|leadership|board|trustees?|governance|founders?|connect', re.I)),
+]
+NEGATIVE_RE = re.compile(
+    r'news|blog|event|gallery|photo|video|media|donat|career|job|vacanc|tender|login|register|sign[\s_-]?(?:in|up)|'
+    r'cart|shop|privacy|terms|polic|disclaimer|category|tag/|feed|search|wp-content|page/\d|\d{4}/\d{2}', re.I)
+LOC_RE = re.compile(r'<loc>\s*([^<\s]+)\s*</loc>', re.I)
+SITEMAP_LINE_RE = re.compile(r'^\s*sitemap:\s*(\S+)', re.I | re.M)
+#links with these extensions are documents or media, never worth a request
+NON_HTML_EXTENSIONS = {'.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.zip', '.jpg', '.jpeg',
+                       '.png', '.gif', '.webp', '.svg', '.mp3', '.mp4', '.avi', '.mov'}
+
+def record_site(candidates, fetched):
+    """Account one site: how many candidates were found and how many were actually fetched"""
+    metrics.inc("discovery_sites")
+    metrics.inc("discovery_candidates", fetched, result="fetched")
+    metrics.inc("discovery_candidates", candidates - fetched, result="skipped")
+
+
+def summary(registry=metrics.registry):
+    sites = registry.value("discovery_sites")
+    if not sites:
+        return "Page discovery: no sites yet"
+    return (f"Page discovery: {registry.value('discovery_candidates', result='fetched') / sites:.1f} subpages fetched/site, "
+            f"{registry.value('discovery_candidates', result='skipped')} ranked candidates skipped once fields were covered, "
+            f"{registry.value('sitemaps_read')} sitemaps read")
+
+
+def same_site(netloc, other):
+    return bare_host(netloc) == bare_host(other)
+
+
+def score_candidate(url, link_text=""):
+    """How likely a page is to hold contact details; <= 0 means not worth fetching"""
+    path = urlparse(url).path.lower()
+    score = 0.0
+    for weight, pattern in KEYWORD_SCORES:
+        if pattern.search(path):
+            score = max(score, weight)
+        if link_text and pattern.search(link_text):
+            score = max(score, weight + 1)  #navigation text is a clearer signal than a slug
+    if NEGATIVE_RE.search(path) or (link_text and NEGATIVE_RE.search(link_text)):
+        score -= 8
+    depth = len([part for part in path.split('/') if part])
+    score -= max(0, depth - 1) * 1.5
+    return score
+
+
+class SiteInfo:
+    """robots.txt rules and sitemap URLs of one domain"""
+
+    def __init__(self, robots=None, sitemaps=(), sitemap_urls=None):
+        self.robots = robots
+        self.sitemaps = list(sitemaps)
+        self.sitemap_urls = sitemap_urls  #None until the sitemap has been read
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allowed(self, url, user_agent="*"):
+        return self.robots is None or self.robots.can_fetch(user_agent, url)
+
+
+_sites = OrderedDict()
+_sites_lock = threading.Lock()
+
+
+def _fetch_text(url):
+    from ngo_scraper.http_client import fetch
+
+    try:
+        response = fetch(url, timeout=10)
+        if response.status_code != 200:
+            return None
+        return response.content.decode('utf-8', errors='ignore')
+    except Exception as e:
+        logger.info(f"Could not read {url}: {str(e)}")
+        return None
+
+
+def site_info(base_url):
+    """robots.txt of the domain of ``base_url``, fetched once per SITE_INFO_TTL"""
+    parsed = urlparse(base_url)
+    key = f"{parsed.scheme}://{parsed.netloc.lower()}"
+    with _sites_lock:
+        info = _sites.get(key)
+        if info is not None and time.monotonic() - info.loaded_at < SITE_INFO_TTL:
+            _sites.move_to_end(key)
+            return info
+
+    robots = None
+    sitemaps = []
+    if RESPECT_ROBOTS or USE_SITEMAPS:
+        text = _fetch_text(f"{key}/robots.txt")
+        if text:
+            robots = RobotFileParser()
+            robots.parse(text.splitlines())
+            sitemaps = SITEMAP_LINE_RE.findall(text)
+    info = SiteInfo(robots if RESPECT_ROBOTS else None, sitemaps or [f"{key}/sitemap.xml"])
+    with _sites_lock:
+        _sites[key] = info
+        while len(_sites) > SITE_INFO_ENTRIES:
+            _sites.popitem(last=False)
+    return info
+
+
+def sitemap_urls(info):
+    """Page URLs listed in the domain's sitemap(s), read on first use"""
+    with info.lock:
+        if info.sitemap_urls is not None:
+            return info.sitemap_urls
+        urls = []
+        queue = list(info.sitemaps)
+        children = 0
+        while queue and len(urls) < SITEMAP_MAX_URLS:
+            text = _fetch_text(queue.pop(0))
+            if not text:
+                continue
+            locs = LOC_RE.findall(text)
+            if '<sitemapindex' in text.lower():
+                for loc in locs:
+                    if children < SITEMAP_MAX_CHILDREN:
+                        queue.append(loc)
+                        children += 1
+                continue
+            urls.extend(locs[:SITEMAP_MAX_URLS - len(urls)])
+        info.sitemap_urls = urls
+        metrics.inc("sitemaps_read")
+        return urls
+
+
+def rank_candidates(base_url, links, extra_urls=(), info=None):
+    """Return ``[(score, url)]`` best first: same-site, deduplicated, robots-allowed, score >= MIN_SCORE.
+
+    ``links`` is ``[(href, link text)]`` from the main page; ``extra_urls``
+    (sitemap entries) are scored on their path alone.
+    """
+    base = normalize_url(base_url)
+    base_netloc = urlparse(base).netloc
+    best = {}
+    candidates = [(urljoin(base_url, href), text) for href, text in links]
+    candidates += [(url, "") for url in extra_urls]
+    for url, text in candidates:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not same_site(parsed.netloc, base_netloc):
+            continue
+        if os.path.splitext(parsed.path)[1].lower() in NON_HTML_EXTENSIONS:
+            continue
+        url = normalize_url(url)
+        if url == base:
+            continue
+        score = score_candidate(url, text.strip())
+        if score > best.get(url, float('-inf')):
+            best[url] = score
+
+    ranked = sorted(((score, url) for url, score in best.items() if score >= MIN_SCORE),
+                    key=lambda item: (-item[0], len(item[1])))
+    if info is not None:
+        ranked = [(score, url) for score, url in ranked if info.allowed(url)]
+    return ranked
+
+
+def discover_pages(base_url, page, limit=MAX_PAGES):
+    """Best contact-page candidates for a site, reading robots.txt and (if needed) the sitemap"""
+    info = site_info(base_url)
+    ranked = rank_candidates(base_url, page.links, info=info)
+    if USE_SITEMAPS and (not ranked or ranked[0][0] < STRONG_SCORE):
+        ranked = rank_candidates(base_url, page.links, sitemap_urls(info), info=info)
+    return [url for _, url in ranked[:limit]]
+
+
+def covered_fields(known_fields, all_content):
+    """Required fields that are already settled: resolved by rules, or services clearly described"""
+    covered = set(known_fields)
+    text = ' '.join(content for _, content in all_content)
+    if len(SIGNALS["Services Offered"][1].findall(text)) >= SERVICE_HITS_ENOUGH:
+        covered.add("Services Offered")
+    return covered
@@ -0,0 +1,267 @@
+"""Streaming export of scraped records to XLSX, CSV, JSONL and Parquet.
+
+Writers take one record at a time, so a batch can be written as results
+arrive without holding a DataFrame of every row. openpyxl and pyarrow are
+imported on first use so that importing the scraper core (or starting the
+CLI) does not pay for them.
+
+openpyxl's write-only mode has to emit column widths before the first row,
+so the XLSX writer spools rows to a temporary file while it tracks the
+widest value per column, then streams them into the workbook on close.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from io import BytesIO
+
+from ngo_scraper import metrics
+
+EXPORT_FORMATS = ("xlsx", "csv", "jsonl", "parquet")
+SHEET_NAME = "NGO Data"
+COLUMN_MAX_WIDTH = 50
+PARQUET_ROW_GROUP = 5000  #rows buffered per Parquet row group
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def available_formats():
+    """Export formats whose optional dependencies are installed"""
+    import importlib.util
+
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or importlib.util.find_spec("pyarrow")]
+
+
+def export_format(path, override=None, default="jsonl"):
+    """Format named by ``override`` or guessed from the file extension"""
+    if override:
+        return override
+    extension = os.path.splitext(str(path))[1].lower().lstrip(".")
+    return extension if extension in EXPORT_FORMATS else default
+
+
+class RecordWriter:
+    """Base class: ``write(record)`` per row, then ``close()``.
+
+    ``target`` is a path or a binary file object. Columns default to the keys
+    of the first record; later records are written in that column order and
+    missing keys are left empty.
+    """
+
+    def __init__(self, target, columns=None):
+        self.target = target
+        self.columns = list(columns) if columns else None
+        self.rows = 0
+        self._handle = None
+        self._owns_handle = False
+
+    def _open(self, mode="wb"):
+        if hasattr(self.target, "write"):
+            self._handle = self.target
+        else:
+            self._handle = open(self.target, mode)
+            self._owns_handle = True
+        return self._handle
+
+    def write(self, record):
+        if self.columns is None:
+            self.columns = list(record)
+        self._write_row([_cell_value(record.get(column)) for column in self.columns])
+        self.rows += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def _write_row(self, values):
+        raise NotImplementedError
+
+    def close(self):
+        if self._owns_handle and self._handle is not None:
+            self._handle.close()
+        self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _cell_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class JsonlWriter(RecordWriter):
+    format = "jsonl"
+
+    def write(self, record):
+        if self._handle is None:
+            self._open()
+        self._handle.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.rows += 1
+
+
+class CsvWriter(RecordWriter):
+    format = "csv"
+
+    def _write_row(self, values):
+        if self._handle is None:
+            self._text = io.TextIOWrapper(self._open(), encoding="utf-8", newline="")
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(self.columns)
+        self._csv.writerow(values)
+
+    def close(self):
+        if self._handle is not None:
+            self._text.flush()
+            self._text.detach()
+        super().close()
+
+
+class XlsxWriter(RecordWriter):
+    format = "xlsx"
+
+    def __init__(self, target, columns=None):
+        super().__init__(target, columns)
+        self._spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8", newline="")
+        self._spool_csv = csv.writer(self._spool)
+        self._widths = None
+
+    def _write_row(self, values):
+        if self._widths is None:
+            self._widths = [len(str(column)) for column in self.columns]
+        for i, value in enumerate(values):
+            if len(value) > self._widths[i]:
+                self._widths[i] = len(value)
+        self._spool_csv.writerow(values)
+
+    def close(self):
+        if self._spool is None:
+            return
+        try:
+            if self.columns is not None:
+                self._save()
+        finally:
+            self._spool.close()
+            self._spool = None
+            super().close()
+
+    def _save(self):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(SHEET_NAME)
+        for i, width in enumerate(self._widths or [len(str(c)) for c in self.columns], start=1):
+            worksheet.column_dimensions[get_column_letter(i)].width = min(width + 2, COLUMN_MAX_WIDTH)
+
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="1e88e5", end_color="1e88e5", fill_type="solid")
+        alignment = Alignment(horizontal="center", vertical="center")
+        header = []
+        for column in self.columns:
+            cell = WriteOnlyCell(worksheet, value=column)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = alignment
+            header.append(cell)
+        worksheet.append(header)
+
+        self._spool.seek(0)
+        for row in csv.reader(self._spool):
+            worksheet.append(row)
+        workbook.save(self._open())
+
+
+class ParquetWriter(RecordWriter):
+    format = "parquet"
+
+    def __init__(self, target, columns=None):
+        super().__init__(target, columns)
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from exc
+        self._buffer = []
+        self._writer = None
+
+    def _write_row(self, values):
+        self._buffer.append(values)
+        if len(self._buffer) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            schema = pa.schema([(column, pa.string()) for column in self.columns])
+            self._writer = pq.ParquetWriter(self._open(), schema)
+        table = pa.Table.from_arrays(
+            [pa.array([row[i] for row in self._buffer], pa.string()) for i in range(len(self.columns))],
+            names=self.columns,
+        )
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        if self.columns is not None and (self._buffer or self._writer is None):
+            self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        super().close()
+
+
+WRITERS = {
+    "xlsx": XlsxWriter,
+    "csv": CsvWriter,
+    "jsonl": JsonlWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def open_writer(target, fmt=None, columns=None):
+    """Return a streaming writer for ``target`` (a path or binary file object)"""
+    fmt = export_format(target, fmt) if not hasattr(target, "write") else (fmt or "jsonl")
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    return WRITERS[fmt](target, columns)
+
+
+def export_records(records, target, fmt=None, columns=None):
+    """Write an iterable of records to ``target`` and return the row count"""
+    writer = open_writer(target, fmt, columns)
+    with metrics.span("export", format=writer.format):
+        with writer:
+            writer.write_many(records)
+    metrics.inc("export_rows", writer.rows, format=writer.format)
+    return writer.rows
+
+
+def export_bytes(records, fmt, columns=None):
+    """Export records to an in-memory file, or None when there are none"""
+    if not records:
+        return None
+    output = BytesIO()
+    export_records(records, output, fmt, columns)
+    output.seek(0)
+    return output
+
+
+def create_excel_file(data):
+    """Create a formatted Excel file from the scraped data"""
+    return export_bytes(data, "xlsx")
@@ -0,0 +1,579 @@
+"""Extraction side of the scraper: turn scraped page text into the five output fields with Gemini.
+
+Covers the single-site path (sync and async), multi-site batched requests,
+prompt building and parsing/normalizing the model's JSON.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+
+from ngo_scraper import metrics, rule_extract, validation
+from ngo_scraper.content_pack import estimate_tokens, pack_content
+from ngo_scraper.extraction_cache import get_extraction_cache, make_key
+from ngo_scraper.gemini_client import client_configured, get_client, get_router
+from ngo_scraper.incremental import is_error_record
+from ngo_scraper.json_scan import decode as decode_json
+from ngo_scraper.json_scan import find_json, iter_json
+from ngo_scraper.rule_extract import REQUIRED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+#"key": "value" pairs, for salvaging a response whose JSON never closes (cut off by the token limit)
+PAIR_RE = re.compile(r'"((?:[^"\\\n]|\\.){1,80})"\s*:\s*"((?:[^"\\\n]|\\.)*)"|'
+                     r"'([^'\n]{1,80})'\s*:\s*'([^'\n]*)'")
+
+
+def salvage_pairs(response_text):
+    """Complete key/value pairs found anywhere in the text, or None"""
+    result = {}
+    for match in PAIR_RE.finditer(response_text):
+        if match.group(1) is not None:
+            key, value = decode_json(f'"{match.group(1)}"'), decode_json(f'"{match.group(2)}"')
+        else:
+            key, value = match.group(3), match.group(4)
+        if isinstance(key, str) and isinstance(value, str) and key.strip() and value.strip():
+            result[key.strip()] = value.strip()
+    return result or None
+
+
+def clean_json_response(response_text):
+    """Extract the JSON object from an AI response.
+
+    One pass of ``json_scan`` over the text handles code fences, prose around
+    the object and stray braces; pairs are salvaged from truncated output as
+    a last resort.
+    """
+    parsed = find_json(response_text, dict)
+    if parsed is not None:
+        metrics.inc("llm_json_parse", result="json")
+        return parsed
+    parsed = salvage_pairs(response_text)
+    metrics.inc("llm_json_parse", result="salvaged" if parsed else "failed")
+    return parsed
+
+
+PROMPT_VERSION = 3  #bump whenever the extraction prompt changes, invalidates cached results
+STRUCTURED_OUTPUT = os.getenv("NGO_STRUCTURED_OUTPUT", "on").lower() not in ("off", "0", "false")
+
+FIELD_PROMPTS = {
+    "NGO Name": ("official organization name", "Extract official name only, no extra words"),
+    "Address": ("complete physical address with city, state, pincode", "Must have street, area, city, state, PIN code if available"),
+    "Services Offered": ("service1; service2; service3", "List 3-5 main services separated by semicolons"),
+    "Contact Person Details": ("name or email of contact person", "Name of founder/director OR email address"),
+    "Contact Number": ("phone with country code like +91 XXXXX XXXXX", "Format as +91 XXXXX XXXXX for Indian numbers"),
+}
+
+
+def response_schema(fields):
+    """Schema for a single-site response: one string per requested field, all required"""
+    if not STRUCTURED_OUTPUT:
+        return None
+    return {"type": "object", "properties": {field: {"type": "string"} for field in fields},
+            "required": list(fields)}
+
+
+def batch_response_schema(fields):
+    """Schema for a multi-site response: an array of objects with "url" and any of ``fields``"""
+    if not STRUCTURED_OUTPUT:
+        return None
+    properties = {field: {"type": "string"} for field in ["url", *fields]}
+    return {"type": "array", "items": {"type": "object", "properties": properties, "required": ["url"]}}
+
+
+def build_extraction_prompt(url, combined_content, fields, known_fields=None, problems=None):
+    """Prompt asking only for ``fields``; already resolved values are given as context.
+
+    ``problems`` (``{field: (previous value, reason)}``) tells a follow-up what was wrong last time.
+    """
+    template = ",\n".join(f'  "{field}": "{FIELD_PROMPTS[field][0]}"' for field in fields)
+    rules = "\n".join(f"- {field}: {FIELD_PROMPTS[field][1]}" for field in fields)
+    known = ""
+    if known_fields:
+        known = "\nAlready known (do not return these):\n" + "\n".join(
+            f"- {field}: {value}" for field, value in known_fields.items()) + "\n"
+    if problems:
+        known += "\nYour previous answer was rejected, look again:\n" + "\n".join(
+            f'- {field}: "{value}" ({reason})' for field, (value, reason) in problems.items()) + "\n"
+    
+    return f"""Extract NGO information and return ONLY valid JSON. No explanations, no markdown.
+
+Website: {url}
+{known}
+Content:
+{combined_content}
+
+Return this EXACT JSON structure (copy these field names exactly):
+{{
+{template}
+}}
+
+Rules:
+{rules}
+- Use "Not found" ONLY if truly not present in any section
+
+Return ONLY the JSON object, nothing else."""
+
+
+def normalize_extracted_fields(extracted_data, known_fields):
+    """Map the model's keys onto the five standard fields and fill in the gaps"""
+    field_mapping = {
+        "ngo name": "NGO Name",
+        "name": "NGO Name",
+        "organization name": "NGO Name",
+        "address": "Address",
+        "location": "Address",
+        "services offered": "Services Offered",
+        "services": "Services Offered",
+        "contact person details": "Contact Person Details",
+        "contact person": "Contact Person Details",
+        "contact": "Contact Person Details",
+        "contact number": "Contact Number",
+        "phone": "Contact Number",
+        "phone number": "Contact Number",
+        "telephone": "Contact Number"
+    }
+    
+    normalized_data = {}
+    for key, value in extracted_data.items():
+        normalized_key = key.strip()
+        # Find matching standard field name
+        for alt_key, standard_key in field_mapping.items():
+            if normalized_key.lower() == alt_key:
+                normalized_key = standard_key
+                break
+        normalized_data[normalized_key] = value
+    
+    #Ensures all required fields are present
+    normalized_data.update(known_fields)
+    for field in REQUIRED_FIELDS:
+        if field not in normalized_data:
+            normalized_data[field] = "Not found"
+        elif not normalized_data[field] or str(normalized_data[field]).strip().lower() in ["null", "none", "", "n/a", "na", "nil", "not available"]:
+            normalized_data[field] = "Not found"
+        else:
+            normalized_data[field] = str(normalized_data[field]).strip()
+    
+    return normalized_data
+
+
+def error_fields(message, detail="Not found"):
+    """Record shown when extraction fails; the leading spaces mark it as an error in the UI"""
+    return {
+        "NGO Name": message,
+        "Address": detail,
+        "Services Offered": "Not found",
+        "Contact Person Details": "Not found",
+        "Contact Number": "Not found"
+    }
+
+
+def response_text_or_reason(response):
+    """Text of a Gemini response, or (None, finish_reason) when generation stopped early"""
+    try:
+        return response.text, None
+    except Exception:
+        pass
+    if getattr(response, 'candidates', None):
+        candidate = response.candidates[0]
+        if candidate.finish_reason not in [1, "STOP"]:
+            return None, candidate.finish_reason
+        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts') and candidate.content.parts:
+            return candidate.content.parts[0].text, None
+    return None, None
+
+
+MAX_EXTRACTION_ATTEMPTS = 3
+EXTRACTION_OUTPUT_TOKENS = 1500  #answer tokens allowed for a whole record
+RETRY_TOKEN_BUDGET = int(os.getenv("NGO_RETRY_TOKEN_BUDGET", "500"))  #content tokens in a follow-up prompt
+RETRY_OUTPUT_TOKENS = 500        #answer tokens allowed for a follow-up's few fields
+
+
+class ExtractionJob:
+    """Everything one site's extraction needs between attempts"""
+    
+    def __init__(self, url, prompt, known_fields, cache, cache_key, all_content=(), fields=()):
+        self.url = url
+        self.prompt = prompt
+        self.estimated_tokens = estimate_tokens(prompt) + EXTRACTION_OUTPUT_TOKENS
+        self.schema = None
+        self.known_fields = known_fields
+        self.cache = cache
+        self.cache_key = cache_key
+        self.all_content = list(all_content)
+        self.fields = list(fields)
+        self.result = None
+        self.failures = {}
+        self.fixed = []
+        self.retry_tokens = 0       #prompt tokens sent in follow-ups
+        self.full_retry_tokens = 0  #what the same follow-ups would have sent with the whole prompt
+    
+    def retry_request(self, fields, known_fields, problems=None):
+        """(prompt, estimated tokens, schema) asking for ``fields`` with only the blocks most relevant to them"""
+        content = pack_content(self.all_content, budget_tokens=RETRY_TOKEN_BUDGET, fields=fields)
+        prompt = build_extraction_prompt(self.url, content, fields, known_fields, problems)
+        self.retry_tokens += estimate_tokens(prompt)
+        self.full_retry_tokens += estimate_tokens(self.prompt)
+        return prompt, estimate_tokens(prompt) + RETRY_OUTPUT_TOKENS, response_schema(fields)
+    
+    def request(self):
+        """Every attempt asks for the whole record with the full prompt; a blocked, empty or
+        unparseable answer says nothing about which content mattered, so it is not narrowed"""
+        return self.prompt, self.estimated_tokens, self.schema
+    
+    def followup_request(self):
+        """Validate the record; a request for just the failed fields, or None when nothing failed"""
+        self.failures = validation.validate_record(self.result, self.all_content, self.fields)
+        if not self.failures:
+            return None
+        known = {**self.known_fields, **{field: self.result[field] for field in self.fields
+                                         if field not in self.failures and self.result[field] != "Not found"}}
+        problems = {field: (self.result[field], reason) for field, reason in self.failures.items()}
+        return self.retry_request(list(self.failures), known, problems)
+    
+    def apply_followup(self, response):
+        """Take the follow-up's values for the failed fields that now pass validation"""
+        response_text, _ = response_text_or_reason(response)
+        extracted_data = clean_json_response(response_text) if response_text else None
+        if not extracted_data:
+            return
+        values = normalize_extracted_fields(extracted_data, {})
+        for field in self.failures:
+            value = values.get(field, "Not found")
+            if value != "Not found" and validation.check_field(field, value, self.all_content) is None:
+                self.result[field] = value
+                self.fixed.append(field)
+        validation.validate_record(self.result, self.all_content, self.fixed)  #formats fixed phone numbers
+    
+    def finish(self):
+        if not is_error_record(self.result) and self.cache is not None:
+            self.cache.put(self.cache_key, self.result)
+        validation.record_site(self.url, self.failures, self.fixed, self.retry_tokens, self.full_retry_tokens)
+        return self.result
+
+
+@metrics.span("prompt_build")
+def prepare_extraction(all_content, url, known_fields=None):
+    """Return (record, None) when no API call is needed, otherwise (None, ExtractionJob)"""
+    known_fields = {field: value for field, value in (known_fields or {}).items() if field in REQUIRED_FIELDS}
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in known_fields]
+    
+    rule_extract.record_outcome(known_fields, llm_called=bool(missing_fields))
+    if not missing_fields:
+        return {field: known_fields[field] for field in REQUIRED_FIELDS}, None
+    
+    #best-scoring blocks for the missing fields, packed into the token budget
+    combined_content = pack_content(all_content, fields=missing_fields)
+    
+    # prompt, only for the fields the rule-based pass could not resolve
+    prompt = build_extraction_prompt(url, combined_content, missing_fields, known_fields)
+    
+    #unchanged prompt -> reuse the previous record, no API call; the key covers the
+    #rule-resolved fields too, since the packed content may leave out their source
+    cache = get_extraction_cache()
+    cache_key = make_key(get_router().models[0], PROMPT_VERSION, prompt)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached, None
+    
+    if not client_configured():
+        return {
+            "NGO Name": "  Gemini API key not configured",
+            "Address": "Add GEMINI_API_KEY to .env file",
+            "Services Offered": "Not available",
+            "Contact Person Details": "Not available",
+            "Contact Number": "Not available"
+        }, None
+    
+    job = ExtractionJob(url, prompt, known_fields, cache, cache_key, all_content, missing_fields)
+    job.schema = response_schema(missing_fields)
+    metrics.observe("llm_prompt_tokens", job.estimated_tokens - EXTRACTION_OUTPUT_TOKENS, buckets=metrics.TOKEN_BUCKETS)
+    return None, job
+
+
+def interpret_extraction_response(job, response, attempt):
+    """Check one model response; returns the normalized record, or None to try again"""
+    response_text, finish_reason = response_text_or_reason(response)
+    if finish_reason is not None:
+        logger.warning(f"Retry {attempt + 1}: finish_reason={finish_reason}")
+        metrics.inc("extraction_retries", reason="blocked")
+        job.result = error_fields(f"  Generation blocked (reason: {finish_reason})")
+        return None
+    if not response_text:
+        logger.warning(f"Retry {attempt + 1}: No response text")
+        metrics.inc("extraction_retries", reason="empty")
+        job.result = error_fields("  No response from AI")
+        return None
+    
+    extracted_data = clean_json_response(response_text)
+    if not extracted_data:
+        logger.warning(f"Retry {attempt + 1}: JSON parsing failed")
+        metrics.inc("extraction_retries", reason="invalid_json")
+        logger.debug(f"Unparseable response for {job.url}: {response_text[:200]}")
+        job.result = error_fields(f"  AI returned invalid JSON after {attempt + 1} attempts")
+        return None
+    
+    job.result = normalize_extracted_fields(extracted_data, job.known_fields)
+    return job.result
+
+
+def followup_call(job):
+    """generate() arguments asking again for the fields of ``job.result`` that fail validation, or None"""
+    request = job.followup_request()
+    if request is None:
+        return None
+    metrics.inc("extraction_retries", reason="followup")
+    prompt, estimated_tokens, schema = request
+    return {"prompt": prompt, "estimated_tokens": estimated_tokens, "max_output_tokens": RETRY_OUTPUT_TOKENS,
+            "prefer_fallback": True, "response_schema": schema}
+
+
+def follow_up(job, client):
+    """Blocking follow-up for the fields of ``job.result`` that fail validation"""
+    call = followup_call(job)
+    if call is None:
+        return
+    try:
+        response, _ = client.generate(**call)
+    except Exception as e:
+        logger.warning(f"Follow-up for {job.url} failed: {str(e)}")
+        return
+    job.apply_followup(response)
+
+
+async def follow_up_async(job, client):
+    """follow_up on generate_async"""
+    call = followup_call(job)
+    if call is None:
+        return
+    try:
+        response, _ = await client.generate_async(**call)
+    except Exception as e:
+        logger.warning(f"Follow-up for {job.url} failed: {str(e)}")
+        return
+    job.apply_followup(response)
+
+
+@metrics.span("extract")
+def extract_required_fields_with_gemini(all_content, url, known_fields=None):
+    """Use Gemini AI with enhanced multi-page content and retry logic"""
+    record, job = prepare_extraction(all_content, url, known_fields)
+    if job is None:
+        return record
+    
+    try:
+        client = get_client()
+    except ImportError:
+        return error_fields("  google-generativeai not installed", "Run: pip install google-generativeai")
+    
+    #blocked, empty or unparseable answers are asked again on the fallback model;
+    #transport errors, 429s and backoff are handled inside the router.
+    #a usable record is validated and only the fields that fail are asked for again
+    for attempt in range(MAX_EXTRACTION_ATTEMPTS):
+        prompt, estimated_tokens, schema = job.request()
+        try:
+            response, _ = client.generate(prompt, estimated_tokens, max_output_tokens=EXTRACTION_OUTPUT_TOKENS,
+                                          prefer_fallback=attempt > 0, response_schema=schema)
+        except Exception as e:
+            logger.error(f"Extraction failed for {url}: {str(e)}")
+            return error_fields(f"  AI Error: {str(e)[:100]}")
+        if interpret_extraction_response(job, response, attempt) is not None:
+            follow_up(job, client)
+            break
+    
+    return job.finish()
+
+
+async def extract_required_fields_async(all_content, url, known_fields=None):
+    """Async version of extract_required_fields_with_gemini built on generate_content_async"""
+    with metrics.span("extract"):
+        return await _extract_required_fields_async(all_content, url, known_fields)
+
+
+async def _extract_required_fields_async(all_content, url, known_fields=None):
+    record, job = prepare_extraction(all_content, url, known_fields)
+    if job is None:
+        return record
+    
+    try:
+        client = get_client()
+    except ImportError:
+        return error_fields("  google-generativeai not installed", "Run: pip install google-generativeai")
+    
+    for attempt in range(MAX_EXTRACTION_ATTEMPTS):
+        prompt, estimated_tokens, schema = job.request()
+        try:
+            response, _ = await client.generate_async(prompt, estimated_tokens,
+                                                      max_output_tokens=EXTRACTION_OUTPUT_TOKENS,
+                                                      prefer_fallback=attempt > 0, response_schema=schema)
+        except Exception as e:
+            logger.error(f"Extraction failed for {url}: {str(e)}")
+            return error_fields(f"  AI Error: {str(e)[:100]}")
+        if interpret_extraction_response(job, response, attempt) is not None:
+            await follow_up_async(job, client)
+            break
+    
+    return job.finish()
+
+
+def extract_all_concurrently(items):
+    """Extract ``[(all_content, url, known_fields)]`` concurrently on one event loop.
+
+    The number of requests in flight is capped by the client
+    (NGO_GEMINI_MAX_IN_FLIGHT); usable as ``extract_many_fn`` in run_batch.
+    """
+    async def run():
+        return await asyncio.gather(*(extract_required_fields_async(*item) for item in items))
+    return list(asyncio.run(run()))
+
+
+BATCH_TOKEN_LIMIT = int(os.getenv("NGO_BATCH_TOKEN_LIMIT", "12000"))  #input tokens per multi-site request
+BATCH_MAX_SITES = int(os.getenv("NGO_BATCH_MAX_SITES", "10"))
+BATCH_OUTPUT_TOKENS_PER_SITE = 300
+
+
+def parse_json_array(response_text):
+    """Pull a list of objects out of a multi-site response.
+
+    A response cut off mid-array still yields the objects that were complete.
+    """
+    values = iter_json(response_text)
+    for value in values:
+        if isinstance(value, dict):
+            value = next((v for v in value.values() if isinstance(v, list)), value)
+        if isinstance(value, list):
+            return [item for item in value if isinstance(item, dict)]
+    return [value for value in values if isinstance(value, dict) and "url" in value] or None
+
+
+def build_batch_prompt(sites):
+    """One prompt for several sites; ``sites`` is [(url, combined_content, missing_fields, known_fields)]"""
+    rules = "\n".join(f"- {field}: {rule}" for field, (_, rule) in FIELD_PROMPTS.items())
+    sections = []
+    for number, (url, combined_content, missing_fields, known_fields) in enumerate(sites, 1):
+        known = "".join(f"\nAlready known: {field}: {value}" for field, value in known_fields.items())
+        sections.append(f"=== WEBSITE {number} ===\nURL: {url}\nNeeded fields: {', '.join(missing_fields)}{known}\n{combined_content}")
+    websites = "\n\n".join(sections)
+    
+    return f"""Extract NGO information for each website below and return ONLY a valid JSON array. No explanations, no markdown.
+
+Return exactly one object per website, in this form:
+[
+  {{"url": "website URL exactly as given", "<needed field>": "value"}}
+]
+Each object must contain "url" and only the fields listed as "Needed fields" for that website.
+
+Rules:
+{rules}
+- Use "Not found" ONLY if truly not present in that website's content
+- Never mix information between websites
+
+{websites}
+
+Return ONLY the JSON array, nothing else."""
+
+
+@metrics.span("extract_batch")
+def extract_batch_with_gemini(items):
+    """Extract several sites with multi-site requests.
+
+    ``items`` is a list of ``(all_content, url, known_fields)``; returns the
+    records in the same order. Sites are grouped greedily until the packed
+    content hits BATCH_TOKEN_LIMIT or BATCH_MAX_SITES. Sites missing from a
+    response or whose entry cannot be used fall back to
+    ``extract_required_fields_with_gemini`` on their own.
+    """
+    router = get_router()
+    cache = get_extraction_cache()
+    records = [None] * len(items)
+    pending = []  #(index, url, combined_content, missing_fields, known_fields, cache_key)
+    
+    for index, (all_content, url, *extra) in enumerate(items):
+        known_fields = {f: v for f, v in (extra[0] if extra else {}).items() if f in REQUIRED_FIELDS}
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in known_fields]
+        if not missing_fields:
+            rule_extract.record_outcome(known_fields, llm_called=False)
+            records[index] = {field: known_fields[field] for field in REQUIRED_FIELDS}
+            continue
+        combined_content = pack_content(all_content, fields=missing_fields)
+        cache_key = make_key(router.models[0], PROMPT_VERSION,
+                             build_extraction_prompt(url, combined_content, missing_fields, known_fields))
+        cached = cache.get(cache_key) if cache is not None else None
+        if cached is not None:
+            rule_extract.record_outcome(known_fields, llm_called=True)
+            records[index] = cached
+            continue
+        pending.append((index, url, combined_content, missing_fields, known_fields, cache_key))
+    
+    #group sites so each request stays inside the token limit
+    groups, group, group_tokens = [], [], 0
+    for entry in pending:
+        tokens = estimate_tokens(entry[2])
+        if group and (group_tokens + tokens > BATCH_TOKEN_LIMIT or len(group) >= BATCH_MAX_SITES):
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(entry)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    
+    metrics.inc("llm_batch_sites", len(pending))
+    
+    fallback = []
+    for group in groups:
+        if len(group) == 1 or not client_configured():
+            fallback.extend(group)
+            continue
+        started = time.perf_counter()
+        try:
+            prompt = build_batch_prompt([(url, content, missing, known) for _, url, content, missing, known, _ in group])
+            max_output_tokens = BATCH_OUTPUT_TOKENS_PER_SITE * len(group) + 200
+            fields = [field for field in REQUIRED_FIELDS if any(field in entry[3] for entry in group)]
+            response, _ = get_client().generate(prompt, estimate_tokens(prompt) + max_output_tokens,
+                                                max_output_tokens=max_output_tokens,
+                                                response_schema=batch_response_schema(fields))
+            results = parse_json_array(response.text) or []
+        except Exception as e:
+            logger.warning(f"Multi-site request for {len(group)} sites failed: {str(e)}")
+            results = []
+        metrics.observe("llm_batch_call_seconds", time.perf_counter() - started, kind="batched")
+        
+        by_url = {str(result.pop("url", "")).strip().rstrip('/').lower(): result for result in results}
+        for index, url, content, missing_fields, known_fields, cache_key in group:
+            result = by_url.get(url.strip().rstrip('/').lower())
+            if not result:
+                fallback.append((index, url, None, missing_fields, known_fields, cache_key))
+                continue
+            record = normalize_extracted_fields(result, known_fields)
+            if sum(1 for field in REQUIRED_FIELDS if record[field] == "Not found") > 3:
+                fallback.append((index, url, None, missing_fields, known_fields, cache_key))
+                continue
+            #fields that fail validation get a follow-up of their own, not the whole site again
+            job = ExtractionJob(url, build_extraction_prompt(url, content, missing_fields, known_fields),
+                                known_fields, cache, cache_key, items[index][0], missing_fields)
+            job.result = record
+            follow_up(job, get_client())
+            rule_extract.record_outcome(known_fields, llm_called=True)
+            records[index] = job.finish()
+    
+    #anything the multi-site call did not cover is retried on its own
+    for index, url, _, _, known_fields, _ in fallback:
+        started = time.perf_counter()
+        records[index] = extract_required_fields_with_gemini(items[index][0], url, known_fields)
+        metrics.observe("llm_batch_call_seconds", time.perf_counter() - started, kind="single")
+    
+    return records
+
+
+def batch_call_summary(registry=metrics.registry):
+    calls, call_seconds, _ = registry.totals("llm_batch_call_seconds")
+    if not calls:
+        return "Multi-site AI requests: no calls yet"
+    sites = registry.value("llm_batch_sites")
+    saved = sites - calls
+    per_call = call_seconds / calls
+    return (f"Multi-site AI requests: {sites} sites in {calls} calls "
+            f"({saved} calls saved, ~{saved * per_call:.0f}s of call time saved)")
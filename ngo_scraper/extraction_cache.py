@@ -0,0 +1,143 @@
+"""Content-hash keyed memoization of Gemini extraction results.
+
+The key is a SHA-256 of (model name, prompt template version, normalized
+combined content), so a site whose scraped text has not changed returns its
+previous record without an API call. A small in-memory LRU sits in front of
+the SQLite store so repeated lookups in one process cost microseconds.
+
+Configured with NGO_LLM_CACHE (path, or "off"), NGO_LLM_CACHE_TTL (seconds
+per entry) and NGO_LLM_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ngo_scraper import metrics
+
+CACHE_PATH = os.getenv("NGO_LLM_CACHE", os.path.join(".cache", "extraction_cache.sqlite"))
+CACHE_TTL = int(os.getenv("NGO_LLM_CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("NGO_LLM_CACHE_MAX_ENTRIES", "100000"))
+MEMORY_ENTRIES = 1024
+EVICT_EVERY = 500  #puts between two sweeps for expired entries
+
+
+def make_key(model_name, prompt_version, content):
+    normalized = ' '.join(content.split())
+    digest = hashlib.sha256()
+    for part in (model_name, str(prompt_version), normalized):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, memory_entries=MEMORY_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  #key -> (expires_at, record)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                record TEXT,
+                expires_at REAL,
+                last_access REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_access ON extractions(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_expires_at ON extractions(expires_at)")
+        self._conn.commit()
+        #upper bound on the rows stored (replacements count as new), so puts need not count the table
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        self._puts_since_evict = 0
+
+    def _remember(self, key, expires_at, record):
+        self._memory[key] = (expires_at, record)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return a copy of the cached record for ``key``, or None if absent or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            from_disk = entry is None
+            if from_disk:
+                row = self._conn.execute(
+                    "SELECT expires_at, record FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, *entry)
+            else:
+                self._memory.move_to_end(key)
+
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._memory.pop(key, None)
+                    self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                    self._conn.commit()
+                metrics.inc("llm_cache", result="misses")
+                return None
+
+            if from_disk:  #memory hits stay off the disk; the LRU there tracks recency
+                self._conn.execute("UPDATE extractions SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            metrics.inc("llm_cache", result="hits")
+            return dict(entry[1])
+
+    def put(self, key, record, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, dict(record))
+            self._conn.execute("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(record), expires_at, now))
+            self._entries += 1
+            self._puts_since_evict += 1
+            if self._entries > self.max_entries or self._puts_since_evict >= EVICT_EVERY:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM extractions WHERE expires_at < ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        self._puts_since_evict = 0
+        if count > self.max_entries:
+            #trim to 90% so a full cache is not swept again on the very next put
+            keep = self.max_entries * 9 // 10
+            self._conn.execute(
+                "DELETE FROM extractions WHERE key IN (SELECT key FROM extractions ORDER BY last_access LIMIT ?)",
+                (count - keep,))
+            count = keep
+        self._entries = count
+
+    def summary(self, registry=metrics.registry):
+        return (f"AI cache: {registry.value('llm_cache', result='hits')} hits, "
+                f"{registry.value('llm_cache', result='misses')} misses")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Return the process-wide extraction cache, or None when NGO_LLM_CACHE=off"""
+    global _cache
+    if CACHE_PATH.lower() in ("off", "0", "false", ""):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache()
+    return _cache
@@ -0,0 +1,360 @@
+"""Resilient access to Gemini shared by every extraction.
+
+``ModelRouter`` wraps each ``generate_content`` call with:
+
+* a token bucket per model for requests/minute and tokens/minute, so
+  concurrent workers queue for quota instead of collecting 429s;
+* exponential backoff with full jitter for retryable errors (429, 5xx,
+  timeouts), done in a loop rather than by recursion;
+* a circuit breaker per model: after repeated failures the model is taken
+  out of rotation and traffic moves to the fallback model; when every model
+  is open, callers pause until the first breaker lets a probe through.
+
+Quotas default to the free-tier limits and can be overridden with
+NGO_GEMINI_QUOTAS, e.g. ``{"gemini-2.5-flash": {"rpm": 1000, "tpm": 1000000}}``.
+
+``GeminiClient`` is the long-lived object the scraper talks to: it configures
+the SDK once, keeps one ``GenerativeModel`` per model name and offers both a
+blocking ``generate`` and an async ``generate_async`` (built on
+``generate_content_async``) with a cap on in-flight requests. Both can ask
+for schema-constrained JSON output (``response_schema``).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+from ngo_scraper import metrics
+from ngo_scraper.content_pack import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MODELS = ["gemini-2.5-flash", "gemini-2.5-flash-lite"]
+MODEL_QUOTAS = {
+    "gemini-2.5-flash": {"rpm": 10, "tpm": 250000},
+    "gemini-2.5-flash-lite": {"rpm": 15, "tpm": 250000},
+}
+MODEL_QUOTAS.update(json.loads(os.getenv("NGO_GEMINI_QUOTAS", "{}")))
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0     #seconds
+BACKOFF_CAP = 30.0
+BREAKER_THRESHOLD = 5  #consecutive failures before a model is taken out of rotation
+BREAKER_RESET = 60.0   #seconds before a half-open probe is allowed
+MAX_IN_FLIGHT = int(os.getenv("NGO_GEMINI_MAX_IN_FLIGHT", "32"))
+
+GENERATION_SETTINGS = {"temperature": 0.05, "top_p": 0.85, "top_k": 40}
+SAFETY_SETTINGS = {
+    'HATE': 'BLOCK_NONE',
+    'HARASSMENT': 'BLOCK_NONE',
+    'SEXUAL': 'BLOCK_NONE',
+    'DANGEROUS': 'BLOCK_NONE'
+}
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                   "DeadlineExceeded", "GatewayTimeout", "Aborted", "ConnectionError", "Timeout", "ReadTimeout"}
+
+
+def is_retryable(error):
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate_per_minute``"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take ``amount`` tokens (going into debt if needed) and return how long to wait"""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_after=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """0 when calls may go through (closed, or half-open probe), else seconds until they may"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Returns True when this failure opened the breaker"""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                newly_open = self.opened_at is None or time.monotonic() >= self.opened_at + self.reset_after
+                self.opened_at = time.monotonic()
+                return newly_open
+            return False
+
+
+class ModelRouter:
+    """Routes calls across models with rate limiting, backoff and circuit breaking"""
+
+    def __init__(self, models=None, quotas=None, max_retries=MAX_RETRIES):
+        self.models = list(models or MODELS)
+        quotas = quotas or MODEL_QUOTAS
+        self.request_buckets = {m: TokenBucket(quotas.get(m, {}).get("rpm", 10)) for m in self.models}
+        self.token_buckets = {m: TokenBucket(quotas.get(m, {}).get("tpm", 250000)) for m in self.models}
+        self.breakers = {m: CircuitBreaker() for m in self.models}
+        self.max_retries = max_retries
+
+    def pick_model(self, prefer_fallback=False):
+        """First model whose breaker is closed, or (None, seconds until one reopens)"""
+        order = self.models[1:] + self.models[:1] if prefer_fallback else self.models
+        waits = []
+        for model_name in order:
+            wait = self.breakers[model_name].retry_in()
+            if wait == 0:
+                return model_name, 0.0
+            waits.append(wait)
+        return None, min(waits)
+
+    def reserve_quota(self, model_name, estimated_tokens):
+        """Book quota for one call and return how long the caller must wait for it"""
+        wait = max(self.request_buckets[model_name].reserve(1),
+                   self.token_buckets[model_name].reserve(estimated_tokens))
+        if wait > 0:
+            metrics.inc("llm_throttled_seconds", wait)
+        return wait
+
+    def record(self, model_name, error=None):
+        """Update the breaker for ``model_name``; returns True if ``error`` is worth retrying"""
+        if error is None:
+            self.breakers[model_name].record_success()
+            metrics.inc("llm_calls", model=model_name)
+            return False
+        if not is_retryable(error):
+            return False
+        if self.breakers[model_name].record_failure():
+            metrics.inc("llm_breaker_trips", model=model_name)
+            logger.warning(f"Circuit breaker opened for {model_name}, routing to fallback")
+        metrics.inc("llm_retries", model=model_name)
+        return True
+
+    def call(self, send, estimated_tokens=1000, prefer_fallback=False):
+        """Run ``send(model_name)`` with quota, backoff and fallback; returns (response, model_name)"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            model_name, wait = self.pick_model(prefer_fallback)
+            if model_name is None:
+                logger.warning(f"All Gemini models unavailable, pausing {wait:.0f}s")
+                time.sleep(wait)
+                continue
+            wait = self.reserve_quota(model_name, estimated_tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = send(model_name)
+            except Exception as e:
+                if not self.record(model_name, e):
+                    raise
+                last_error = e
+                delay = backoff_delay(attempt)
+                logger.warning(f"{model_name} call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self.record(model_name)
+            return response, model_name
+        raise last_error or RuntimeError("Gemini unavailable")
+
+    async def call_async(self, send, estimated_tokens=1000, prefer_fallback=False):
+        """Async twin of ``call``: ``send(model_name)`` is a coroutine and waits don't block the loop"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            model_name, wait = self.pick_model(prefer_fallback)
+            if model_name is None:
+                logger.warning(f"All Gemini models unavailable, pausing {wait:.0f}s")
+                await asyncio.sleep(wait)
+                continue
+            wait = self.reserve_quota(model_name, estimated_tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await send(model_name)
+            except Exception as e:
+                if not self.record(model_name, e):
+                    raise
+                last_error = e
+                delay = backoff_delay(attempt)
+                logger.warning(f"{model_name} call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.record(model_name)
+            return response, model_name
+        raise last_error or RuntimeError("Gemini unavailable")
+
+    def summary(self, registry=metrics.registry):
+        calls = registry.value("llm_calls")
+        fallback_calls = calls - registry.value("llm_calls", model=self.models[0])
+        return (f"Gemini client: {calls} calls, {registry.value('llm_retries')} retries, "
+                f"{fallback_calls} on fallback model, {registry.value('llm_breaker_trips')} breaker trips, "
+                f"{registry.value('llm_throttled_seconds'):.0f}s waiting for quota")
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def record_tokens(response, prompt):
+    """Count a response's tokens, from its usage metadata or estimated from the text"""
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    output_tokens = getattr(usage, 'candidates_token_count', None)
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    if output_tokens is None:
+        try:
+            output_tokens = estimate_tokens(response.text)
+        except Exception:  #blocked or empty responses have no text
+            output_tokens = 0
+    metrics.inc("llm_tokens", prompt_tokens, kind="prompt")
+    metrics.inc("llm_tokens", output_tokens, kind="output")
+
+
+class GeminiClient:
+    """Configured once, reused for every extraction in the process"""
+
+    def __init__(self, api_key=None, router=None, max_in_flight=MAX_IN_FLIGHT, model_factory=None):
+        """``model_factory(model_name)`` replaces the SDK's GenerativeModel, e.g. with a stub for benchmarks"""
+        if model_factory is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key.strip())
+            self._genai = genai
+
+            def model_factory(model_name):
+                return genai.GenerativeModel(model_name, safety_settings=SAFETY_SETTINGS)
+        else:
+            self._genai = None
+        self._model_factory = model_factory
+        self.router = router or get_router()
+        self.max_in_flight = max_in_flight
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._semaphores = weakref.WeakKeyDictionary()  #one per event loop
+
+    def model(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    model = self._model_factory(model_name)
+                    self._models[model_name] = model
+        return model
+
+    def _generation_config(self, max_output_tokens, response_schema=None):
+        settings = dict(max_output_tokens=max_output_tokens, **GENERATION_SETTINGS)
+        if response_schema is not None:
+            #constrained decoding: the model can only emit JSON matching the schema
+            settings.update(response_mime_type="application/json", response_schema=response_schema)
+        if self._genai is None:
+            return settings
+        return self._genai.GenerationConfig(**settings)
+
+    def generate(self, prompt, estimated_tokens, max_output_tokens=1500, prefer_fallback=False, response_schema=None):
+        """Blocking call through the router; returns (response, model_name).
+
+        ``response_schema`` (an OpenAPI-style dict) asks for JSON output that follows it.
+        """
+        config = self._generation_config(max_output_tokens, response_schema)
+        with metrics.span("llm_call"):
+            response, model_name = self.router.call(
+                lambda model_name: self.model(model_name).generate_content(prompt, generation_config=config),
+                estimated_tokens, prefer_fallback)
+        record_tokens(response, prompt)
+        return response, model_name
+
+    async def generate_async(self, prompt, estimated_tokens, max_output_tokens=1500, prefer_fallback=False,
+                             response_schema=None):
+        """Async call via generate_content_async, at most ``max_in_flight`` at a time per loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        config = self._generation_config(max_output_tokens, response_schema)
+        async with semaphore:
+            with metrics.span("llm_call"):
+                response, model_name = await self.router.call_async(
+                    lambda model_name: self.model(model_name).generate_content_async(prompt, generation_config=config),
+                    estimated_tokens, prefer_fallback)
+        record_tokens(response, prompt)
+        return response, model_name
+
+
+_client = None
+_client_key = None
+_client_override = None
+_client_lock = threading.Lock()
+
+
+def set_client(client):
+    """Use ``client`` for every extraction instead of the GEMINI_API_KEY one (None restores it)"""
+    global _client_override
+    _client_override = client
+
+
+def client_configured():
+    return _client_override is not None or bool(os.getenv("GEMINI_API_KEY"))
+
+
+def get_client():
+    """Process-wide client for GEMINI_API_KEY, or None when no key is set"""
+    global _client, _client_key
+    if _client_override is not None:
+        return _client_override
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    if _client is None or _client_key != api_key:
+        with _client_lock:
+            if _client is None or _client_key != api_key:
+                _client = GeminiClient(api_key)
+                _client_key = api_key
+    return _client
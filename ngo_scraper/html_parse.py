@@ -0,0 +1,181 @@
+"""Single-parse HTML pipeline.
+
+Each downloaded page is parsed exactly once. One walk over the tree collects
+everything the scraper needs: the links for ``discovery.discover_pages``, the
+footer/contact blocks for ``extract_structured_data`` and the visible text,
+one line per block element.
+
+The backend is pluggable through ``NGO_PARSER`` (or the ``backend``
+argument): ``lxml`` (default), ``html.parser``, ``html5lib`` or
+``selectolax`` for the fast lexbor-based selector engine.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+PARSER_BACKEND = os.getenv("NGO_PARSER", "lxml")
+
+REMOVED_TAGS = ["script", "style", "nav", "header", "aside", "img"]
+#tags that end a block of text; page text keeps one line per block so it can be ranked later
+BLOCK_TAGS = ["p", "div", "section", "article", "li", "tr", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6",
+              "br", "address", "footer", "main", "table", "ul", "ol", "dl", "dt", "dd", "blockquote", "form", "title"]
+CONTACT_CLASS_RE = re.compile(r'contact|address|info', re.I)
+CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.I)
+ORGANIZATION_TYPE_RE = re.compile(r'Organization|NGO|Corporation|LocalBusiness', re.I)
+
+
+@dataclass
+class ParsedPage:
+    text: str
+    links: list = field(default_factory=list)              #[(href, link text)]
+    footer_text: str = None
+    contact_sections: list = field(default_factory=list)   #first 3 contact/address/info blocks
+    title: str = None
+    site_name: str = None                                  #og:site_name
+    jsonld: list = field(default_factory=list)             #raw application/ld+json blocks
+    microdata: list = field(default_factory=list)          #[{itemprop: value}] for Organization items
+
+
+def collapse_whitespace(text):
+    return ' '.join(text.split())
+
+
+def block_text(text):
+    """Collapse whitespace inside each line and drop empty lines"""
+    return '\n'.join(line for line in (collapse_whitespace(raw) for raw in text.split('\n')) if line)
+
+
+def declared_encoding(content_type):
+    """Charset from a Content-Type header, or None when the server did not declare one"""
+    if not content_type:
+        return None
+    match = CHARSET_RE.search(content_type)
+    return match.group(1) if match else None
+
+
+def available_backend(backend=None):
+    """Resolve the requested backend, falling back to html.parser if it is not installed"""
+    backend = backend or PARSER_BACKEND
+    try:
+        if backend == "lxml":
+            import lxml  # noqa: F401
+        elif backend == "html5lib":
+            import html5lib  # noqa: F401
+        elif backend == "selectolax":
+            import selectolax  # noqa: F401
+    except ImportError:
+        return "html.parser"
+    return backend
+
+
+def parse_page(content, content_type=None, backend=None):
+    """Parse raw response bytes once and return a ParsedPage.
+
+    A charset declared in the Content-Type header is trusted as-is; otherwise
+    the parser honours the document's own <meta charset> before guessing.
+    """
+    backend = available_backend(backend)
+    encoding = declared_encoding(content_type)
+    if backend == "selectolax":
+        return _parse_selectolax(content, encoding)
+    return _parse_bs4(content, encoding, backend)
+
+
+def _parse_bs4(content, encoding, backend):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, backend, from_encoding=encoding if isinstance(content, bytes) else None)
+
+    links = [(link['href'], link.get_text()) for link in soup.find_all('a', href=True)]
+
+    footer = soup.find('footer')
+    footer_text = collapse_whitespace(footer.get_text(' ')) if footer else None
+
+    contact_sections = [collapse_whitespace(section.get_text(' '))
+                        for section in soup.find_all(['div', 'section'], class_=CONTACT_CLASS_RE, limit=3)]
+
+    title = soup.title.get_text() if soup.title else None
+    site_name = soup.find('meta', attrs={'property': 'og:site_name'})
+    jsonld = [script.get_text() for script in soup.find_all('script', type='application/ld+json')]
+    microdata = []
+    for item in soup.find_all(itemscope=True, itemtype=ORGANIZATION_TYPE_RE, limit=3):
+        props = {}
+        for prop in item.find_all(itemprop=True):
+            props.setdefault(prop['itemprop'], prop.get('content') or collapse_whitespace(prop.get_text(' ')))
+        microdata.append(props)
+
+    for tag in soup(REMOVED_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.append('\n')
+
+    return ParsedPage(
+        text=block_text(soup.get_text(' ')),
+        links=links,
+        footer_text=footer_text,
+        contact_sections=contact_sections,
+        title=collapse_whitespace(title) if title else None,
+        site_name=site_name.get('content') if site_name else None,
+        jsonld=jsonld,
+        microdata=microdata,
+    )
+
+
+def _parse_selectolax(content, encoding):
+    from selectolax.lexbor import LexborHTMLParser
+
+    if isinstance(content, bytes) and not encoding:
+        #lexbor assumes UTF-8, so honour a <meta charset> declaration ourselves
+        match = META_CHARSET_RE.search(content[:4096])
+        encoding = match.group(1).decode('ascii') if match else None
+    if isinstance(content, bytes) and encoding:
+        try:
+            content = content.decode(encoding, errors='replace')
+        except LookupError:
+            pass
+    tree = LexborHTMLParser(content)
+
+    links = [(node.attributes.get('href') or '', node.text(deep=True))
+             for node in tree.css('a[href]')]
+
+    footer = tree.css_first('footer')
+    footer_text = collapse_whitespace(footer.text(separator=' ')) if footer else None
+
+    contact_sections = []
+    for node in tree.css('div[class], section[class]'):
+        if CONTACT_CLASS_RE.search(node.attributes.get('class') or ''):
+            contact_sections.append(collapse_whitespace(node.text(separator=' ')))
+            if len(contact_sections) == 3:
+                break
+
+    title = tree.css_first('title')
+    site_name = tree.css_first('meta[property="og:site_name"]')
+    jsonld = [node.text() for node in tree.css('script[type="application/ld+json"]')]
+    microdata = []
+    for item in tree.css('[itemscope][itemtype]'):
+        if not ORGANIZATION_TYPE_RE.search(item.attributes.get('itemtype') or ''):
+            continue
+        props = {}
+        for prop in item.css('[itemprop]'):
+            props.setdefault(prop.attributes.get('itemprop'),
+                             prop.attributes.get('content') or collapse_whitespace(prop.text(separator=' ')))
+        microdata.append(props)
+        if len(microdata) == 3:
+            break
+
+    tree.strip_tags(REMOVED_TAGS)
+    for node in tree.css(','.join(BLOCK_TAGS)):
+        node.insert_after('\n')
+    text = tree.root.text(separator=' ') if tree.root else ''
+
+    return ParsedPage(
+        text=block_text(text),
+        links=links,
+        footer_text=footer_text,
+        contact_sections=contact_sections,
+        title=collapse_whitespace(title.text()) if title else None,
+        site_name=site_name.attributes.get('content') if site_name else None,
+        jsonld=jsonld,
+        microdata=microdata,
+    )
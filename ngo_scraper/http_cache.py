@@ -0,0 +1,177 @@
+"""Persistent on-disk HTTP response cache with conditional revalidation.
+
+Bodies are stored in SQLite together with their ETag/Last-Modified
+validators. Entries younger than ``ttl`` are served without touching the
+network; older ones are revalidated with If-None-Match/If-Modified-Since so
+an unchanged page costs a 304 instead of a full download. When the cache
+grows past ``max_bytes`` the least recently used bodies are evicted.
+
+Configured with NGO_HTTP_CACHE (path, or "off"), NGO_HTTP_CACHE_TTL
+(seconds) and NGO_HTTP_CACHE_MAX_MB.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from ngo_scraper import metrics
+
+CACHE_PATH = os.getenv("NGO_HTTP_CACHE", os.path.join(".cache", "http_cache.sqlite"))
+CACHE_TTL = int(os.getenv("NGO_HTTP_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("NGO_HTTP_CACHE_MAX_MB", "500")) * 1024 * 1024
+
+
+class CachedResponse:
+    """The subset of ``requests.Response`` the scraper uses, rebuilt from a cache entry"""
+
+    def __init__(self, url, content, content_type, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        from requests.structures import CaseInsensitiveDict
+
+        self.headers = CaseInsensitiveDict({'Content-Type': content_type or ''})
+        self.from_cache = True
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        pass
+
+
+class HttpCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                final_url TEXT,
+                body BLOB,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                last_access REAL,
+                size INTEGER
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        #running size of the stored bodies, so a store does not have to sum the table
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _count(self, key, amount=1):
+        if key == "bytes_saved":
+            metrics.inc("http_cache_bytes_saved", amount)
+        else:
+            metrics.inc("http_cache", amount, result=key)
+
+    def _row(self, url):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT final_url, body, content_type, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,)).fetchone()
+
+    def _touch(self, url, refreshed=False):
+        now = time.time()
+        with self._lock:
+            if refreshed:
+                self._conn.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+            else:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+            self._conn.commit()
+
+    def lookup_fresh(self, url):
+        """Return a CachedResponse if ``url`` is cached and still inside its TTL"""
+        row = self._row(url)
+        if not row or time.time() - row[5] > self.ttl:
+            return None
+        self._touch(url)
+        self._count("hits")
+        self._count("bytes_saved", len(row[1]))
+        return CachedResponse(row[0], row[1], row[2])
+
+    def get(self, send, url, timeout, **kwargs):
+        """GET through the cache, revalidating a stale entry with its validators.
+
+        ``send(url, timeout=..., headers=..., **kwargs)`` performs the request
+        (``session.get`` or the bounded reader in ``http_client``).
+        """
+        row = self._row(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if row:
+            if row[3]:
+                headers['If-None-Match'] = row[3]
+            if row[4]:
+                headers['If-Modified-Since'] = row[4]
+
+        response = send(url, timeout=timeout, headers=headers, **kwargs)
+
+        if response.status_code == 304 and row:
+            self._touch(url, refreshed=True)
+            self._count("revalidated")
+            self._count("bytes_saved", len(row[1]))
+            return CachedResponse(row[0], row[1], row[2])
+
+        self._count("misses")
+        if response.status_code == 200 and 'no-store' not in response.headers.get('Cache-Control', ''):
+            self.store(url, response)
+        return response
+
+    def store(self, url, response):
+        body = response.content
+        now = time.time()
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._total_bytes += len(body) - (replaced[0] if replaced else 0)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, response.url, body, response.headers.get('Content-Type'),
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now, len(body)))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        #other processes may share the file: recount before deleting anything
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self._total_bytes <= self.max_bytes:
+            return
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._total_bytes -= size
+            if self._total_bytes <= self.max_bytes:
+                break
+
+    def summary(self, registry=metrics.registry):
+        return (f"HTTP cache: {registry.value('http_cache', result='hits')} hits, "
+                f"{registry.value('http_cache', result='revalidated')} revalidated (304), "
+                f"{registry.value('http_cache', result='misses')} misses, "
+                f"{registry.value('http_cache_bytes_saved') / 1024:.0f} KB not re-downloaded")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, or None when NGO_HTTP_CACHE=off"""
+    global _cache
+    if CACHE_PATH.lower() in ("off", "0", "false", ""):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HttpCache()
+    return _cache
@@ -0,0 +1,257 @@
+"""Shared HTTP layer: one connection-pooled session plus a per-host politeness scheduler.
+
+Reusing a single ``requests.Session`` keeps TCP/TLS connections alive across
+pages and sites. The scheduler replaces the old global ``time.sleep(0.5)``
+between pages: the delay is tracked per host, so a worker only waits when it
+is about to hit the same host again too soon, and ``fetch_many`` picks pages
+from other hosts while one is inside its politeness window.
+
+Responses also go through the on-disk cache in ``http_cache`` when it is
+enabled; fresh hits skip both the network and the politeness delay.
+
+Bodies are streamed rather than loaded whole. A response whose headers
+announce a non-HTML type (PDFs, images, media linked as "About us") is
+rejected before its body is read, and reading stops at ``MAX_PAGE_BYTES``
+or once the page holds far more text than the scraper keeps, so an
+oversized page costs at most the cap. Configured with NGO_MAX_PAGE_KB.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from ngo_scraper import metrics
+from ngo_scraper.content_pack import PAGE_TEXT_LIMIT
+from ngo_scraper.http_cache import get_cache
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+POLITENESS_DELAY = 0.5  #seconds between two requests to the same host
+POOL_CONNECTIONS = 100  #number of hosts kept in the pool
+POOL_MAXSIZE = 16       #keep-alive connections per host
+
+MAX_PAGE_BYTES = int(os.getenv("NGO_MAX_PAGE_KB", "2048")) * 1024
+CHUNK_SIZE = 64 * 1024
+#page text is cut to PAGE_TEXT_LIMIT chars before prompting; stop once the markup holds several times that,
+#the margin keeps footers (where addresses live) on ordinary pages
+TEXT_BYTES_ENOUGH = 4 * PAGE_TEXT_LIMIT
+TEXT_CHECK_EVERY = 256 * 1024  #bytes between two visible-text estimates
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml")
+
+SCRIPT_STYLE_RE = re.compile(rb'<(script|style)\b.*?</\1\s*>', re.I | re.S)
+TAG_RE = re.compile(rb'<[^>]*>')
+WHITESPACE_RE = re.compile(rb'\s+')
+
+
+class ContentRejected(Exception):
+    """The response is not an HTML page"""
+
+
+def record_site(downloaded):
+    """Account the bytes one site's pages took (called once per scraped site)"""
+    metrics.observe("http_site_bytes", downloaded, buckets=metrics.BYTES_BUCKETS)
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process, or None where it cannot be read"""
+    try:
+        import resource
+    except ImportError:  #windows
+        return None
+    import sys
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summary(registry=metrics.registry):
+    if not registry.value("http_pages"):
+        return "Downloads: no pages yet"
+    pages, downloaded, _ = registry.totals("http_page_bytes")
+    sites, site_bytes, site_bytes_max = registry.totals("http_site_bytes")
+    per_site = site_bytes / sites / 1024 if sites else 0
+    text = (f"Downloads: {pages} pages, {downloaded / 1024 / 1024:.1f} MB "
+            f"({per_site:.0f} KB/site avg, {(site_bytes_max or 0) / 1024:.0f} KB max), "
+            f"{registry.value('http_pages', result='rejected')} non-HTML rejected, "
+            f"{registry.value('http_pages', result='truncated')} truncated")
+    peak = peak_memory_mb()
+    if peak is not None:
+        text += f", peak memory {peak:.0f} MB"
+    return text
+
+
+def visible_text_bytes(body):
+    """Rough size of the text a page will yield: markup, scripts and styles stripped"""
+    return len(WHITESPACE_RE.sub(b' ', TAG_RE.sub(b' ', SCRIPT_STYLE_RE.sub(b'', body))))
+
+
+def check_headers(response):
+    """Raise ContentRejected for a successful response that is not an HTML page"""
+    if response.status_code != 200:
+        return
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and content_type not in HTML_CONTENT_TYPES:
+        raise ContentRejected(f"not an HTML page ({content_type})")
+
+
+def read_bounded(response, max_bytes=MAX_PAGE_BYTES):
+    """Read a streamed body into ``response.content``, stopping at ``max_bytes`` or enough text"""
+    body = bytearray()
+    next_check = TEXT_CHECK_EVERY
+    truncated = False
+    for chunk in response.iter_content(CHUNK_SIZE):
+        body += chunk
+        if len(body) >= max_bytes:
+            del body[max_bytes:]
+            truncated = True
+            break
+        if len(body) >= next_check:
+            next_check += TEXT_CHECK_EVERY
+            if visible_text_bytes(body) >= TEXT_BYTES_ENOUGH:
+                truncated = True
+                break
+    if truncated:
+        response.close()  #a partly read connection cannot go back to the pool
+    response._content = bytes(body)
+    response._content_consumed = True
+    metrics.inc("http_pages", result="truncated" if truncated else "complete")
+    return response
+
+
+def _send_bounded(url, timeout, max_bytes=MAX_PAGE_BYTES, **kwargs):
+    response = get_session().get(url, timeout=timeout, stream=True, **kwargs)
+    #elapsed stops at the headers: DNS, connect, TLS and the server's think time
+    metrics.observe("http_ttfb_seconds", response.elapsed.total_seconds())
+    metrics.inc("http_requests", status=response.status_code)
+    try:
+        check_headers(response)
+    except ContentRejected:
+        response.close()
+        metrics.inc("http_pages", result="rejected")
+        raise
+    started = time.perf_counter()
+    read_bounded(response, max_bytes)
+    metrics.observe("http_body_seconds", time.perf_counter() - started)
+    metrics.observe("http_page_bytes", len(response.content), buckets=metrics.BYTES_BUCKETS)
+    return response
+
+
+class HostScheduler:
+    """Hands out request slots per host, spaced ``delay`` seconds apart"""
+
+    def __init__(self, delay=POLITENESS_DELAY):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def ready_in(self, host):
+        """Seconds until ``host`` may be contacted again (0 if it is free now)"""
+        with self._lock:
+            return max(0.0, self._next_slot.get(host, 0.0) - time.monotonic())
+
+    def reserve(self, host):
+        """Book the next free slot for ``host`` and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.delay
+            return slot - now
+
+    def wait(self, host):
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+
+scheduler = HostScheduler()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def _get(url, timeout, **kwargs):
+    cache = get_cache()
+    if cache is None:
+        return _send_bounded(url, timeout, **kwargs)
+    return cache.get(_send_bounded, url, timeout, **kwargs)
+
+
+def _fresh_from_cache(url):
+    cache = get_cache()
+    return cache.lookup_fresh(url) if cache is not None else None
+
+
+def fetch(url, timeout=15, **kwargs):
+    """GET ``url`` through the shared session, respecting the host's politeness window.
+
+    Raises ``ContentRejected`` for non-HTML or oversized responses; pass
+    ``max_bytes`` to change the download cap.
+    """
+    cached = _fresh_from_cache(url)
+    if cached is not None:
+        return cached
+    scheduler.wait(urlparse(url).netloc)
+    return _get(url, timeout, **kwargs)
+
+
+def fetch_many(urls, timeout=10, max_workers=4, **kwargs):
+    """Fetch several URLs, interleaving hosts so no worker idles on a politeness delay.
+
+    Returns ``[(url, response, error)]`` in input order; exactly one of
+    ``response``/``error`` is set. ``raise_for_status`` is applied.
+    """
+    futures = [None] * len(urls)
+    cached = [_fresh_from_cache(url) for url in urls]
+    by_host = {}
+    for index, url in enumerate(urls):
+        if cached[index] is not None:
+            continue
+        by_host.setdefault(urlparse(url).netloc, []).append((index, url))
+
+    def get(url):
+        response = _get(url, timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while by_host:
+            host = min(by_host, key=scheduler.ready_in)
+            wait = scheduler.ready_in(host)
+            if wait > 0:  #every remaining host is inside its window
+                time.sleep(wait)
+            scheduler.wait(host)
+            index, url = by_host[host].pop(0)
+            if not by_host[host]:
+                del by_host[host]
+            futures[index] = metrics.submit(pool, get, url)
+
+    results = []
+    for url, hit, future in zip(urls, cached, futures):
+        if hit is not None:
+            results.append((url, hit, None))
+            continue
+        error = future.exception()
+        results.append((url, None if error else future.result(), error))
+    return results
@@ -0,0 +1,253 @@
+"""Incremental re-crawls: reuse last run's record for sites whose content has not meaningfully changed.
+
+After a site is scraped, its text is fingerprinted twice with 64-bit
+simhashes over word shingles:
+
+* per section ("Main Page", each contact/about page, "Structured Data"),
+  for the report, and
+* per output field and section, over just the blocks of the section that
+  carry that field's signals (addresses, phone numbers, leadership,
+  services, name; the same signals ``content_pack`` ranks blocks by).
+
+A simhash moves only a few bits for small edits (a visitor counter, a new
+date in the footer), so fingerprints within ``SIMILAR_BITS`` of last run's
+count as unchanged; a section that appears or disappears changes the fields
+it carries. When no field moved, the stored record is reused and
+Gemini is skipped. When some did, only those fields are re-extracted: the
+unchanged values are passed to the prompt as already known, just like
+rule-resolved fields. Sites seen for the first time, or whose name moved,
+are extracted in full.
+
+Fingerprints and records are kept in SQLite, keyed by ``canonical.site_key``
+of the site's final URL. Configured with NGO_FINGERPRINTS (path, or "off").
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from ngo_scraper import metrics
+from ngo_scraper.canonical import site_key
+from ngo_scraper.content_pack import BOILERPLATE_RE, SIGNALS, section_blocks
+from ngo_scraper.rule_extract import REQUIRED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.getenv("NGO_FINGERPRINTS", os.path.join(".cache", "fingerprints.sqlite"))
+FINGERPRINT_VERSION = 1  #bump when the fingerprint recipe changes; older entries then count as new
+SHINGLE_WORDS = 3
+SIMILAR_BITS = 3         #simhashes at most this many bits apart are the same content
+
+NEW, SKIPPED, PARTIAL, FULL = "new", "skipped", "partial", "full"
+
+#dates, times and years change on every visit without the site changing; phone numbers are longer digit runs
+VOLATILE_RE = re.compile(
+    r'\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b|\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:am|pm)?\b|\b(?:19|20)\d{2}\b|'
+    r'\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b', re.I)
+BOILERPLATE_LINE_CHARS = 80  #shorter lines with menu/counter/copyright words are left out of fingerprints
+
+
+def stable_blocks(source, content):
+    """Blocks of a section with boilerplate lines (counters, copyright, share links) and dates removed.
+
+    Lines are dropped before blocks are formed so that a new footer line does
+    not shift every block boundary after it.
+    """
+    if source != "Structured Data":
+        content = '\n'.join(line for line in content.split('\n')
+                             if not (len(line) < BOILERPLATE_LINE_CHARS and BOILERPLATE_RE.search(line)))
+    blocks = (VOLATILE_RE.sub(' ', block) for block in section_blocks(source, content))
+    return [block for block in blocks if block.strip()]
+
+
+def simhash(texts):
+    """64-bit simhash over the word shingles of ``texts``; 0 for no text"""
+    hashes = []
+    for text in texts:
+        words = text.lower().split()
+        for start in range(max(1, len(words) - SHINGLE_WORDS + 1)):
+            shingle = ' '.join(words[start:start + SHINGLE_WORDS])
+            if shingle:
+                hashes.append(format(int.from_bytes(
+                    hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big'), '064b'))
+    if not hashes:
+        return 0
+    #bit i of the result is the majority vote of bit i over all shingle hashes
+    half = len(hashes) / 2
+    value = 0
+    for column in zip(*hashes):
+        value = (value << 1) | (column.count('1') > half)
+    return value
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+@metrics.span("fingerprint")
+def fingerprint(all_content):
+    """``{"sections": {source: simhash}, "fields": {field: {source: simhash}}}`` for a scraped site"""
+    sections = {}
+    fields = {field: {} for field in REQUIRED_FIELDS}
+    seen = set()
+    for source, content in all_content:
+        blocks = stable_blocks(source, content)
+        sections[source] = simhash(blocks)
+        field_blocks = {field: [] for field in REQUIRED_FIELDS}
+        for block in blocks:
+            key = ' '.join(block.lower().split())
+            if key in seen:  #nav and footers repeated on every page count once
+                continue
+            seen.add(key)
+            for field in REQUIRED_FIELDS:
+                if SIGNALS[field][1].search(block):
+                    field_blocks[field].append(block)
+        for field, matched in field_blocks.items():
+            if matched:
+                fields[field][source] = simhash(matched)
+    return {"version": FINGERPRINT_VERSION, "sections": sections, "fields": fields}
+
+
+def changed(before, after):
+    """Names in ``before``/``after`` whose simhash moved more than SIMILAR_BITS, or that came or went"""
+    return sorted(name for name in set(before) | set(after)
+                  if name not in before or name not in after or distance(before[name], after[name]) > SIMILAR_BITS)
+
+
+def changed_fields(old, new):
+    """Fields with signal-bearing text that changed in any section"""
+    return [field for field in REQUIRED_FIELDS
+            if changed(old["fields"].get(field, {}), new["fields"].get(field, {}))]
+
+
+def is_error_record(record):
+    return any(str(value).startswith("  ") for value in record.values())
+
+
+class FingerprintStore:
+    def __init__(self, path=STORE_PATH):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sites (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                fingerprint TEXT,
+                record TEXT,
+                updated_at REAL
+            )""")
+        self._conn.commit()
+
+    def get(self, key):
+        """(fingerprint, record) from the last run, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT fingerprint, record FROM sites WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, key, url, fingerprint, record):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sites VALUES (?, ?, ?, ?, ?)",
+                               (key, url, json.dumps(fingerprint), json.dumps(record), time.time()))
+            self._conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fingerprint_store():
+    """Return the process-wide fingerprint store, or None when NGO_FINGERPRINTS=off"""
+    global _store
+    if STORE_PATH.lower() in ("off", "0", "false", ""):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FingerprintStore()
+    return _store
+
+
+class IncrementalExtractor:
+    """Wraps the extraction stage of ``run_batch`` so unchanged sites skip Gemini.
+
+    Use ``extract`` as ``extract_fn`` (and ``extract_many`` as
+    ``extract_many_fn`` for multi-site requests). ``report`` collects one
+    entry per site: its status (new, skipped, partial or full), the
+    sections that changed and the fields that were extracted again.
+    """
+
+    def __init__(self, extract_fn, extract_many_fn=None, store=None):
+        self.extract_fn = extract_fn
+        self.extract_many_fn = extract_many_fn
+        self.store = store or get_fingerprint_store()
+        self.report = []
+        self._lock = threading.Lock()
+
+    def plan(self, all_content, url, known_fields=None):
+        """Decide what a site needs: ``(status, record or None, known fields for the prompt, entry)``"""
+        new = fingerprint(all_content)
+        known_fields = dict(known_fields or {})
+        entry = {"url": url, "key": site_key(url), "fingerprint": new, "changed_sections": [], "refreshed_fields": []}
+        previous = self.store.get(entry["key"]) if self.store is not None else None
+        if previous is None or previous[0].get("version") != FINGERPRINT_VERSION:
+            entry["refreshed_fields"] = list(REQUIRED_FIELDS)
+            return NEW, None, known_fields, entry
+        old, record = previous
+        entry["changed_sections"] = changed(old["sections"], new["sections"])
+        fields = changed_fields(old, new)
+        entry["refreshed_fields"] = fields
+        if not fields:
+            #fresh rule-resolved values still win over last run's
+            return SKIPPED, {**record, **{f: v for f, v in known_fields.items() if f in record}}, known_fields, entry
+        if "NGO Name" in fields or len(fields) == len(REQUIRED_FIELDS):
+            entry["refreshed_fields"] = list(REQUIRED_FIELDS)
+            return FULL, None, known_fields, entry
+        reused = {field: record[field] for field in REQUIRED_FIELDS if field not in fields and field in record}
+        return PARTIAL, None, {**reused, **known_fields}, entry
+
+    def finish(self, status, entry, record):
+        #a skipped site keeps the fingerprint of its last extraction, so small edits cannot add up unnoticed
+        if self.store is not None and status != SKIPPED and not is_error_record(record):
+            self.store.put(entry["key"], entry["url"], entry["fingerprint"], record)
+        metrics.inc("incremental_sites", status=status)
+        with self._lock:
+            self.report.append({"Website": entry["url"], "Status": status,
+                                "Changed sections": ", ".join(entry["changed_sections"]),
+                                "Re-extracted fields": ", ".join(entry["refreshed_fields"]) if status != SKIPPED else ""})
+        return record
+
+    def extract(self, all_content, url, known_fields=None):
+        status, record, known, entry = self.plan(all_content, url, known_fields)
+        if record is None:
+            record = self.extract_fn(all_content, url, known)
+        return self.finish(status, entry, record)
+
+    def extract_many(self, items):
+        plans = [self.plan(all_content, url, *extra) for all_content, url, *extra in items]
+        todo = [index for index, (_, record, _, _) in enumerate(plans) if record is None]
+        records = [record for _, record, _, _ in plans]
+        if todo:
+            extracted = self.extract_many_fn([(items[i][0], items[i][1], plans[i][2]) for i in todo])
+            for index, record in zip(todo, extracted):
+                records[index] = record
+        return [self.finish(plan[0], plan[3], record) for plan, record in zip(plans, records)]
+
+    def counts(self):
+        with self._lock:
+            statuses = [row["Status"] for row in self.report]
+        return {status: statuses.count(status) for status in (SKIPPED, PARTIAL, FULL, NEW)}
+
+    def summary(self):
+        counts = self.counts()
+        return (f"Incremental run: {counts[SKIPPED]} unchanged sites reused, {counts[PARTIAL]} partially "
+                f"re-extracted, {counts[FULL]} fully re-extracted, {counts[NEW]} new")
@@ -0,0 +1,190 @@
+"""Durable bulk-job checkpoints so an interrupted batch resumes where it stopped.
+
+Every URL of a job has a row that moves queued -> fetched -> extracted (or
+failed). A fetched row keeps the scraped ``all_content`` and the extra fetch
+results (``known_fields``) so a resumed job goes straight to extraction; a
+finished row keeps its record and drops the content. Checkpoint writes are
+buffered and committed in batched transactions (every FLUSH_ROWS updates or
+FLUSH_SECONDS, whichever comes first) so the store stays off the hot path.
+
+Configured with NGO_JOB_STORE (path, or "off").
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+STORE_PATH = os.getenv("NGO_JOB_STORE", os.path.join(".cache", "jobs.sqlite"))
+FLUSH_ROWS = 200
+FLUSH_SECONDS = 2.0
+
+QUEUED, FETCHED, EXTRACTED, FAILED = "queued", "fetched", "extracted", "failed"
+
+
+@dataclass
+class JobItem:
+    position: int
+    url: str
+    state: str
+    all_content: list = None
+    final_url: str = None
+    extra: list = None
+    record: dict = None
+
+    @property
+    def finished(self):
+        return self.state in (EXTRACTED, FAILED)
+
+
+class JobStore:
+    def __init__(self, path=STORE_PATH, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._pending = []  #(sql, params) waiting for the next batched commit
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                label TEXT,
+                created_at REAL,
+                total INTEGER
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id INTEGER,
+                position INTEGER,
+                url TEXT,
+                state TEXT,
+                content TEXT,
+                final_url TEXT,
+                extra TEXT,
+                record TEXT,
+                updated_at REAL,
+                PRIMARY KEY (job_id, position)
+            )""")
+        self._conn.commit()
+
+    def create_job(self, urls, label=None):
+        """Register a new job with every URL queued and return its id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute("INSERT INTO jobs (label, created_at, total) VALUES (?, ?, ?)",
+                                        (label, now, len(urls)))
+            job_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, position, url, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((job_id, position, url, QUEUED, now) for position, url in enumerate(urls)))
+            self._conn.commit()
+        return job_id
+
+    def jobs(self, limit=20):
+        """Most recent jobs with their progress, newest first"""
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute("""
+                SELECT jobs.id, jobs.label, jobs.created_at, jobs.total,
+                       SUM(job_items.state IN (?, ?)), SUM(job_items.state = ?)
+                FROM jobs JOIN job_items ON job_items.job_id = jobs.id
+                GROUP BY jobs.id ORDER BY jobs.id DESC LIMIT ?""",
+                                      (EXTRACTED, FAILED, FAILED, limit)).fetchall()
+        return [{"id": row[0], "label": row[1], "created_at": row[2], "total": row[3],
+                 "finished": row[4] or 0, "failed": row[5] or 0} for row in rows]
+
+    def unfinished_jobs(self, limit=20):
+        return [job for job in self.jobs(limit) if job["finished"] < job["total"]]
+
+    def items(self, job_id):
+        """Every URL of a job in input order, with whatever has been checkpointed"""
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                "SELECT position, url, state, content, final_url, extra, record FROM job_items "
+                "WHERE job_id = ? ORDER BY position", (job_id,)).fetchall()
+        items = []
+        for position, url, state, content, final_url, extra, record in rows:
+            items.append(JobItem(
+                position, url, state,
+                all_content=[tuple(part) for part in json.loads(content)] if content else None,
+                final_url=final_url,
+                extra=json.loads(extra) if extra else [],
+                record=json.loads(record) if record else None,
+            ))
+        return items
+
+    def results(self, job_id):
+        """Records of the finished URLs of a job, in input order"""
+        return [item.record for item in self.items(job_id) if item.finished]
+
+    def save_fetched(self, job_id, position, all_content, final_url, extra=()):
+        self._queue("UPDATE job_items SET state = ?, content = ?, final_url = ?, extra = ?, updated_at = ? "
+                    "WHERE job_id = ? AND position = ?",
+                    (FETCHED, json.dumps(all_content), final_url, json.dumps(list(extra)), time.time(),
+                     job_id, position))
+
+    def save_result(self, job_id, position, record, failed=False):
+        self._queue("UPDATE job_items SET state = ?, content = NULL, record = ?, updated_at = ? "
+                    "WHERE job_id = ? AND position = ?",
+                    (FAILED if failed else EXTRACTED, json.dumps(record), time.time(), job_id, position))
+
+    def retry_failed(self, job_id):
+        """Queue a job's failed URLs again; returns how many were reset"""
+        with self._lock:
+            self._flush()
+            cursor = self._conn.execute(
+                "UPDATE job_items SET state = ?, record = NULL, updated_at = ? WHERE job_id = ? AND state = ?",
+                (QUEUED, time.time(), job_id, FAILED))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._flush()
+            self._conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+    def _queue(self, sql, params):
+        with self._lock:
+            self._pending.append((sql, params))
+            if (len(self._pending) >= self.flush_rows
+                    or time.monotonic() - self._last_flush >= self.flush_seconds):
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            with self._conn:
+                for sql, params in self._pending:
+                    self._conn.execute(sql, params)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Commit buffered checkpoints now"""
+        with self._lock:
+            self._flush()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Return the process-wide job store, or None when NGO_JOB_STORE=off"""
+    global _store
+    if STORE_PATH.lower() in ("off", "0", "false", ""):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
@@ -0,0 +1,131 @@
+"""Single-pass scanner for JSON values embedded in model output.
+
+Model responses wrap the JSON in code fences, prose or both, and are
+sometimes cut off by the output token limit. ``JsonScanner`` walks the text
+once, jumping between the only characters that matter (brackets, quotes and
+backslashes), tracks string and nesting state, and decodes each balanced
+top-level ``{...}``/``[...]`` exactly once. Nothing is retried from every
+opening brace, so long or adversarial responses (thousands of unmatched
+braces, huge strings) cost linear time.
+
+Text can be fed in chunks as it streams in; complete values are returned as
+soon as their closing bracket arrives.
+"""
+import json
+import re
+
+TOKEN_RE = re.compile(r'[{\[]+|[}\]"\\]')  #runs of opening brackets come as one token
+TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+CLOSERS = {'}': '{', ']': '['}
+VALUE_START_RE = re.compile(r'\{\s*["}]|\[')  #an object opens with a key; skips "{see below}" in prose
+
+
+def decode(text):
+    """``json.loads`` with one lenient retry for trailing commas; None when it is not JSON.
+
+    Nesting too deep for the json module (RecursionError) counts as not JSON.
+    """
+    try:
+        return json.loads(text)
+    except (ValueError, RecursionError):
+        pass
+    try:
+        return json.loads(TRAILING_COMMA_RE.sub(r'\1', text))
+    except (ValueError, RecursionError):
+        return None
+
+
+class JsonScanner:
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0         #next buffer index to scan
+        self._stack = []      #(bracket, buffer index) of the open brackets
+        self._in_string = False
+        self._skip = -1       #buffer index of a backslash-escaped character
+        self._closed = []     #(depth, start, end) of values closed inside a still-open bracket
+
+    def feed(self, text):
+        """Scan another chunk; returns the top-level JSON values it completed"""
+        self._buffer += text
+        found = []
+        for match in TOKEN_RE.finditer(self._buffer, self._pos):
+            index = match.start()
+            char = match.group()
+            if index == self._skip:
+                if len(char) == 1:
+                    continue
+                index, char = index + 1, char[1:]
+            if self._in_string:
+                if char == '\\':
+                    self._skip = index + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                #quotes in the prose around the JSON are not strings
+                self._in_string = bool(self._stack)
+            elif char[0] in '{[':
+                self._stack.extend(zip(char, range(index, index + len(char))))
+            elif char in CLOSERS and self._stack:
+                opener, start = self._stack.pop()
+                if opener != CLOSERS[char]:  #mismatched: this was not JSON, start over
+                    self._stack.clear()
+                    self._closed.clear()
+                elif self._stack:
+                    self._closed.append((len(self._stack), start, index + 1))
+                else:
+                    value = self._decode(start, index + 1)
+                    if value is not None:
+                        found.append(value)
+                    self._closed.clear()
+        self._pos = len(self._buffer)
+        if not self._stack:  #nothing open refers back into the buffer
+            self._buffer = ""
+            self._pos = 0
+            self._skip = -1
+        return found
+
+    def _decode(self, start, end):
+        if not VALUE_START_RE.match(self._buffer, start):
+            return None
+        return decode(self._buffer[start:end])
+
+    def close(self):
+        """Values recoverable once the text has ended with brackets still open.
+
+        The outermost values that did close are returned when they sit in an
+        array cut off by the token limit, or behind a stray ``{`` in the prose
+        that kept the real object from closing at the top level. Values inside
+        an unfinished object are fragments of it and are not returned.
+        """
+        if not self._closed:
+            return []
+        depth = min(item[0] for item in self._closed)
+        bracket, position = self._stack[depth - 1]
+        if bracket == '{' and VALUE_START_RE.match(self._buffer, position):
+            values = []
+        else:
+            values = [self._decode(start, end) for level, start, end in self._closed
+                      if level == depth and end - start > 2]  #"{}" and "[]" carry nothing
+        self._closed.clear()
+        return [value for value in values if value is not None]
+
+
+def iter_json(text):
+    """Every top-level JSON value in ``text``, in order"""
+    stripped = text.strip()
+    if stripped[:1] in ('{', '['):  #schema-constrained output is exactly one value: let json do it in C
+        try:
+            return [json.loads(stripped)]
+        except (ValueError, RecursionError):
+            pass
+    scanner = JsonScanner()
+    return scanner.feed(text) + scanner.close()
+
+
+def find_json(text, kind=dict):
+    """First JSON value of type ``kind`` (dict or list) in ``text`` that is not empty, or None"""
+    for value in iter_json(text):
+        if isinstance(value, kind) and value:
+            return value
+    return None
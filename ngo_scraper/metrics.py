@@ -0,0 +1,380 @@
+"""Process-wide metrics: timing spans per pipeline stage, counters and histograms.
+
+Stages are timed with ``span``::
+
+    with metrics.span("fetch_main"):
+        response = fetch(url)
+
+and land in the ``ngo_stage_seconds`` histogram labelled by stage. Counters
+(``inc``) and other histograms (``observe``) cover retries, cache hits,
+tokens and bytes. Everything is kept in memory; recording is a dict lookup
+under a lock, so it is cheap enough to leave on.
+
+The process registry only ever grows, so Prometheus can take rates of
+it. Each run (``run_batch``, a queue ``Worker``) also gets a registry of
+its own: inside ``collect(run_registry)`` everything recorded goes to
+both, and ``add_row`` keeps report rows (validation, browser renders) on
+the run only. Work handed to a thread pool goes through ``submit``, and
+callbacks fired on other threads through ``bind``, so they record into
+the same run. The modules' ``summary(registry)`` lines read a run's
+registry with ``value`` and ``totals``, so concurrent runs (two app
+sessions) never see each other's numbers.
+
+The data can be read as a JSON-able dict (``snapshot``), in the Prometheus
+text format (``prometheus_text``), or served over HTTP on
+``/metrics`` and ``/metrics.json`` with ``serve``. NGO_METRICS_PORT makes
+the CLI and the app start that endpoint.
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "ngo_"
+METRICS_PORT = int(os.getenv("NGO_METRICS_PORT", "0"))
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 512 * 1024, 1024 * 1024, 2 * 1024 * 1024, 8 * 1024 * 1024)
+
+#shown as # HELP lines; metrics without an entry still export
+DESCRIPTIONS = {
+    "stage_seconds": "Time spent in each pipeline stage",
+    "http_ttfb_seconds": "Time to response headers: DNS, connect, TLS and server time",
+    "http_body_seconds": "Time to read a response body",
+    "http_page_bytes": "Downloaded body size per page",
+    "http_pages": "Page bodies read or refused, by result (complete/truncated/rejected)",
+    "http_site_bytes": "Downloaded bytes per scraped site, main page and subpages",
+    "http_requests": "HTTP requests sent, by status code",
+    "http_cache": "HTTP cache lookups, by result",
+    "http_cache_bytes_saved": "Response bytes served from the HTTP cache instead of downloaded",
+    "llm_cache": "Extraction cache lookups, by result",
+    "llm_calls": "Gemini calls that returned a response, by model",
+    "llm_breaker_trips": "Circuit-breaker openings, by model",
+    "llm_retries": "Gemini calls retried after a transport error or 429, by model",
+    "llm_throttled_seconds": "Time spent waiting for Gemini quota",
+    "llm_tokens": "Gemini tokens, by kind (prompt/output); estimated when the response has no usage data",
+    "llm_prompt_tokens": "Estimated tokens per extraction prompt",
+    "llm_batch_sites": "Sites sent to multi-site extraction that needed the model",
+    "llm_batch_call_seconds": "Extraction calls made by multi-site extraction, by kind (batched/single fallback)",
+    "llm_json_parse": "Model responses parsed, by result (json/salvaged/failed)",
+    "discovery_sites": "Sites whose subpages were ranked",
+    "discovery_candidates": "Ranked subpage candidates, by result (fetched/skipped once the fields were covered)",
+    "sitemaps_read": "Sitemaps read during page discovery",
+    "rule_extract_sites": "Sites through the rule-based pass, by result (resolved/needs_llm)",
+    "rule_extract_fields": "Fields filled by the rule-based pass",
+    "extraction_retries": "Extraction attempts repeated because of the response, by reason",
+    "validation_failures": "Extracted fields that failed validation, by field and reason",
+    "validation_sites": "Extracted sites checked, by result (passed/failed)",
+    "validation_fields": "Fields of the final records that failed validation or were fixed by a follow-up, by result",
+    "retry_tokens_saved": "Prompt tokens saved by targeted follow-ups compared with re-sending the whole prompt",
+    "render_checks": "Parsed pages checked for the headless-browser fallback, by result (needed/static)",
+    "render_seconds": "Time per headless-browser render, failed renders included",
+    "render_browsers_started": "Headless browsers launched",
+    "render_pages": "Pages sent to the headless-browser fallback, by result (improved/no_gain/error/unavailable)",
+    "batch_duplicates": "Input rows that reused another row's result, by how the duplicate was found",
+    "incremental_sites": "Sites in incremental runs, by outcome (new/skipped/partial/full)",
+    "work_items": "URLs finished by queue workers, by result (done/failed/lost/abandoned)",
+    "work_item_seconds": "Time a queue worker spent on one URL, storing the record included",
+    "work_requeued": "Queued URLs taken back from expired worker leases",
+    "export_rows": "Rows written by the exporters, by format",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, plus sum and count"""
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  #last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated inside its bucket and capped at the observed max"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.counters = {}    #name -> {label key: value}
+        self.histograms = {}  #name -> {label key: Histogram}
+        self.reports = {}     #report name -> [row dict]; only runs keep rows
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Time the block into ``stage_seconds``; failed blocks count too"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def value(self, name, **labels):
+        """Total of counter ``name`` over the series carrying ``labels`` (all series without labels)"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for key, value in self.counters.get(name, {}).items() if wanted <= set(key))
+
+    def merged(self, name, **labels):
+        """One Histogram adding up the series of ``name`` carrying ``labels``, or None when none has data"""
+        wanted = set(_label_key(labels))
+        merged = None
+        with self._lock:
+            for key, h in self.histograms.get(name, {}).items():
+                if not wanted <= set(key) or not h.count:
+                    continue
+                if merged is None:
+                    merged = Histogram(h.buckets)
+                merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+                merged.sum += h.sum
+                merged.count += h.count
+                merged.max = h.max if merged.max is None else max(merged.max, h.max)
+        return merged
+
+    def totals(self, name, **labels):
+        """``(count, sum, max)`` of histogram ``name`` over the series carrying ``labels``"""
+        h = self.merged(name, **labels)
+        return (0, 0, None) if h is None else (h.count, h.sum, h.max)
+
+    def add_row(self, report, row):
+        with self._lock:
+            self.reports.setdefault(report, []).append(row)
+
+    def report(self, name):
+        """A copy of the rows of report ``name``"""
+        with self._lock:
+            return list(self.reports.get(name, ()))
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.reports.clear()
+
+    def snapshot(self):
+        """Counters and histograms as plain data, ready for json.dumps"""
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                        for name, series in self.counters.items()}
+            histograms = {}
+            for name, series in self.histograms.items():
+                histograms[name] = [{
+                    "labels": dict(key), "count": h.count, "sum": round(h.sum, 6), "max": h.max,
+                    "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                    "buckets": dict(zip([str(b) for b in h.buckets] + ["+Inf"], h.counts)),
+                } for key, h in series.items()]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self):
+        """The Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                full = f"{PREFIX}{name}_total"
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {full} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in series.items():
+                    lines.append(f"{full}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                full = f"{PREFIX}{name}"
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {full} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else f"{bound:g}"
+                        lines.append(f"{full}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {h.sum:g}")
+                    lines.append(f"{full}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def stage_table(self):
+        """One row per stage: count, total and mean seconds, p50/p95 in ms (for the UI and CLI)"""
+        with self._lock:
+            series = dict(self.histograms.get("stage_seconds", {}))
+            rows = []
+            for key, h in series.items():
+                labels = dict(key)
+                name = labels.pop("stage")
+                if labels:
+                    name += " (" + ", ".join(f"{k}={v}" for k, v in labels.items()) + ")"
+                rows.append({"stage": name, "count": h.count, "total_s": round(h.sum, 2),
+                             "mean_ms": round(h.sum / h.count * 1000, 1),
+                             "p50_ms": round(h.quantile(0.5) * 1000, 1), "p95_ms": round(h.quantile(0.95) * 1000, 1)})
+        return sorted(rows, key=lambda row: -row["total_s"])
+
+    def counter_values(self):
+        """``{"name{labels}": value}`` for every counter series"""
+        with self._lock:
+            return {f"{name}{_format_labels(key)}": value
+                    for name, series in sorted(self.counters.items()) for key, value in series.items()}
+
+
+registry = Registry()
+snapshot = registry.snapshot
+prometheus_text = registry.prometheus_text
+stage_table = registry.stage_table
+counter_values = registry.counter_values
+reset = registry.reset
+
+_run = contextvars.ContextVar("ngo_run_registry", default=None)
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+    run = _run.get()
+    if run is not None:
+        run.inc(name, amount, **labels)
+
+
+def observe(name, value, buckets=SECONDS_BUCKETS, **labels):
+    registry.observe(name, value, buckets, **labels)
+    run = _run.get()
+    if run is not None:
+        run.observe(name, value, buckets, **labels)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time the block into ``stage_seconds``; failed blocks count too (also usable as a decorator)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+
+def add_row(report, row):
+    """Add ``row`` to ``report`` of the current run; outside a run it is dropped"""
+    run = _run.get()
+    if run is not None:
+        run.add_row(report, row)
+
+
+@contextmanager
+def collect(run_registry):
+    """Record into ``run_registry`` as well as the process registry inside the block"""
+    token = _run.set(run_registry)
+    try:
+        yield run_registry
+    finally:
+        _run.reset(token)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """``pool.submit(fn, ...)`` running ``fn`` in the caller's context, so it records into the caller's run"""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def bind(fn):
+    """``fn`` running in the caller's context wherever it is called, for callbacks fired on other threads"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def summary(registry=registry):
+    rows = registry.stage_table()
+    if not rows:
+        return "Stage timings: nothing recorded yet"
+    return "Stage timings (p50/p95): " + ", ".join(
+        f"{row['stage']} {row['p50_ms']:.0f}/{row['p95_ms']:.0f} ms" for row in rows)
+
+
+def dump(path):
+    """Write the metrics to ``path``: JSON for *.json, Prometheus text otherwise"""
+    with open(path, "w", encoding="utf-8") as handle:
+        if path.endswith(".json"):
+            json.dump(snapshot(), handle, indent=2)
+        else:
+            handle.write(prometheus_text())
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port=METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.json in a daemon thread; returns the bound port.
+
+    Safe to call repeatedly (Streamlit reruns): only the first call starts a server.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server.server_port
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == "/metrics":
+                    body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, content_type = json.dumps(snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+        return _server.server_port
@@ -0,0 +1,108 @@
+"""Optional process pool for the CPU-bound HTML parsing stage.
+
+Tree building, tag removal and the text/regex passes in ``parse_page`` hold
+the GIL, so with many fetch threads parsing caps throughput at one core.
+With ``NGO_PARSE_WORKERS`` > 0 the raw response bytes are handed to a pool
+of worker processes and only the compact ``ParsedPage`` (text, links and
+structured data, no tree) comes back. The bytes object is pickled once
+into the call queue, which for pages of a few hundred KB is cheaper than
+setting up a shared-memory block per page.
+
+Workers are started with "spawn" so they never inherit the fetch threads or
+sockets of the parent. If the pool breaks (a worker crashed) it is dropped
+and pages are parsed inline from then on.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ngo_scraper import metrics
+from ngo_scraper.html_parse import parse_page
+
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = int(os.getenv("NGO_PARSE_WORKERS", "0"))  #0 parses in the calling thread
+
+_pool = None
+_pool_workers = 0
+_pool_broken = False
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool(workers=None):
+    """Return the process-wide parse pool, or None when parsing runs inline"""
+    global _pool, _pool_workers
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers <= 0 or _pool_broken:
+        return None
+    if _pool is None or _pool_workers != workers:
+        with _pool_lock:
+            if _pool is None or _pool_workers != workers:
+                if _pool is not None:
+                    _pool.shutdown(wait=False, cancel_futures=True)
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                _pool_workers = workers
+    return _pool
+
+
+def set_parse_workers(workers):
+    """Change the default worker count (the CLI's --parse-workers)"""
+    global PARSE_WORKERS
+    PARSE_WORKERS = max(0, int(workers))
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _drop_broken_pool(pool):
+    global _pool, _pool_broken
+    with _pool_lock:
+        if _pool is pool and pool is not None:
+            logger.warning("Parse pool broke, parsing pages inline from now on")
+            _pool = None
+            _pool_broken = True
+
+
+def submit_parse(content, content_type=None, workers=None):
+    """Future for ``parse_page(content, content_type)``, run in the pool when one is configured"""
+    pool = get_parse_pool(workers)
+    if pool is not None:
+        try:
+            future = pool.submit(parse_page, content, content_type)
+        except (BrokenProcessPool, RuntimeError):
+            _drop_broken_pool(pool)
+        else:
+            #pooled parses are timed from submit to result, queueing included
+            started = time.perf_counter()
+            #the callback runs on the pool's own thread: bind it to this run
+            observe = metrics.bind(metrics.observe)
+            future.add_done_callback(lambda _: observe("stage_seconds", time.perf_counter() - started, stage="parse"))
+            return future
+
+    future = Future()
+    with metrics.span("parse"):
+        try:
+            future.set_result(parse_page(content, content_type))
+        except Exception as e:
+            future.set_exception(e)
+    return future
+
+
+def parse_html(content, content_type=None, workers=None):
+    """Parse one page, in the pool when configured, falling back inline if the pool breaks"""
+    pool = get_parse_pool(workers)
+    try:
+        return submit_parse(content, content_type, workers).result()
+    except BrokenProcessPool:
+        _drop_broken_pool(pool)
+        with metrics.span("parse"):
+            return parse_page(content, content_type)
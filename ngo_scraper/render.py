@@ -0,0 +1,308 @@
+"""Headless-browser fallback for pages that only fill in with JavaScript.
+
+Most NGO sites are server-rendered and the static ``requests`` fetch gets
+all their text, so that stays the only path for almost every page. A page
+is rendered in a browser only when its static parse looks empty:
+
+* thin text: fewer than ``NGO_RENDER_MIN_TEXT`` characters; for the main
+  page only, or for subpages of a site whose main page needed the browser
+  (short contact and team pages are normal on static sites), or
+* an SPA shell: an empty ``#root``/``#app``/``#__next`` mount point,
+  ``<app-root>`` or a "please enable JavaScript" notice, with fewer than
+  ``NGO_RENDER_SPA_TEXT`` characters of text
+
+Renders go through a small pool of headless Chrome instances (at most
+``NGO_RENDER_POOL``) that stay open between pages, so only the first
+render per slot pays for the browser start; an instance is replaced after
+``NGO_RENDER_MAX_PAGES`` pages or any error. Page loads stop after
+``NGO_RENDER_TIMEOUT`` seconds and images, fonts and media are not
+downloaded (``NGO_RENDER_BLOCK``, a comma list of images/fonts/media/
+stylesheets, or "none"). The rendered HTML goes through the same parser and
+replaces the static page only if it has more text.
+
+``NGO_RENDER=off`` disables the fallback. Without selenium or a Chrome the
+fallback turns itself off with one warning and pages keep their static text.
+"""
+import atexit
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from ngo_scraper import metrics
+from ngo_scraper.parse_pool import parse_html
+
+logger = logging.getLogger(__name__)
+
+RENDER_MODE = os.getenv("NGO_RENDER", "auto")                      #auto renders thin/SPA pages, off never
+RENDER_POOL = int(os.getenv("NGO_RENDER_POOL", "2"))               #browsers open at once
+RENDER_TIMEOUT = float(os.getenv("NGO_RENDER_TIMEOUT", "20"))      #seconds per page load
+RENDER_SETTLE = float(os.getenv("NGO_RENDER_SETTLE", "3"))         #max wait for scripts to finish adding text
+RENDER_MAX_PAGES = int(os.getenv("NGO_RENDER_MAX_PAGES", "50"))    #pages before a browser is replaced
+RENDER_BLOCK = os.getenv("NGO_RENDER_BLOCK", "images,fonts,media")
+RENDER_MIN_TEXT = int(os.getenv("NGO_RENDER_MIN_TEXT", "300"))     #less static text than this is rendered
+RENDER_SPA_TEXT = int(os.getenv("NGO_RENDER_SPA_TEXT", "2000"))    #SPA shells with less than this are rendered
+
+#URL patterns for Network.setBlockedURLs, by resource type
+BLOCK_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "media": ["*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m4a", "*.mov", "*.m3u8"],
+    "stylesheets": ["*.css"],
+}
+SPA_MARKERS_RE = re.compile(
+    rb'<div[^>]*\bid=["\']?(?:root|app|__next|__nuxt|svelte)\b["\']?[^>]*>\s*</div>'
+    rb'|<app-root[^>]*>\s*</app-root>'
+    rb'|<noscript>[^<]{0,200}(?:enable|requires?|turn on) javascript', re.I)
+
+
+def needs_render(page, content, thin_text=True):
+    """Why the static parse of ``content`` should be rendered ("thin text", "SPA shell"), or None.
+
+    With ``thin_text`` False only an SPA shell counts.
+    """
+    chars = len(page.text.strip())
+    if thin_text and chars < RENDER_MIN_TEXT:
+        return "thin text"
+    if chars < RENDER_SPA_TEXT and SPA_MARKERS_RE.search(content if isinstance(content, bytes) else content.encode()):
+        return "SPA shell"
+    return None
+
+
+def blocked_types(block=None):
+    """Resource types named in the comma list ``block`` (NGO_RENDER_BLOCK by default)"""
+    block = RENDER_BLOCK if block is None else block
+    kinds = []
+    for kind in block.split(","):
+        kind = kind.strip().lower()
+        if kind and kind != "none":
+            if kind not in BLOCK_PATTERNS:
+                raise ValueError(f"NGO_RENDER_BLOCK: unknown resource type {kind!r}, "
+                                 f"use {', '.join(BLOCK_PATTERNS)} or none")
+            kinds.append(kind)
+    return kinds
+
+
+class BrowserUnavailable(Exception):
+    """No browser could be started (selenium or Chrome missing)"""
+
+
+class BrowserPool:
+    """Up to ``size`` warm headless Chrome instances, each reused for ``max_pages`` pages"""
+
+    def __init__(self, size=None, timeout=None, block=None, max_pages=None):
+        self.size = max(1, RENDER_POOL if size is None else size)
+        self.timeout = RENDER_TIMEOUT if timeout is None else timeout
+        self.max_pages = max(1, RENDER_MAX_PAGES if max_pages is None else max_pages)
+        self.blocked_types = blocked_types(block)
+        self.blocked = [pattern for kind in self.blocked_types for pattern in BLOCK_PATTERNS[kind]]
+        self._idle = queue.LifoQueue()  #(driver, pages rendered); most recently used first, it is the warmest
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._drivers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _launch(self):
+        try:
+            from selenium import webdriver
+            from selenium.common.exceptions import WebDriverException
+        except ImportError as e:
+            raise BrowserUnavailable(f"selenium is not installed ({e})")
+
+        options = webdriver.ChromeOptions()
+        for argument in ("--headless=new", "--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage",
+                         "--disable-extensions", "--mute-audio", "--window-size=1280,1024"):
+            options.add_argument(argument)
+        if "images" in self.blocked_types:
+            options.add_argument("--blink-settings=imagesEnabled=false")
+        options.page_load_strategy = "normal"
+        try:
+            #selenium finds (or downloads) a chromedriver matching the installed Chrome
+            driver = webdriver.Chrome(options=options)
+        except WebDriverException as e:
+            raise BrowserUnavailable(str(e).strip().removeprefix("Message:").strip().split(";")[0])
+        try:
+            driver.set_page_load_timeout(self.timeout)
+            driver.set_script_timeout(self.timeout)
+            if self.blocked:
+                driver.execute_cdp_cmd("Network.enable", {})
+                driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked})
+        except Exception:
+            driver.quit()
+            raise
+        with self._lock:
+            self._drivers.add(driver)
+        metrics.inc("render_browsers_started")
+        return driver
+
+    def _quit(self, driver):
+        with self._lock:
+            self._drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f"Browser did not quit cleanly: {e}")
+
+    @contextmanager
+    def browser(self):
+        """A driver for one page; it goes back to the pool afterwards unless the page failed"""
+        self._slots.acquire()
+        try:
+            try:
+                driver, pages = self._idle.get_nowait()
+            except queue.Empty:
+                driver, pages = self._launch(), 0
+            ok = False
+            try:
+                yield driver
+                ok = True
+            finally:
+                pages += 1
+                if ok and pages < self.max_pages and not self._closed:
+                    self._idle.put((driver, pages))
+                else:
+                    self._quit(driver)
+        finally:
+            self._slots.release()
+
+    def render(self, url):
+        """HTML of ``url`` once its scripts have run"""
+        with self.browser() as driver:
+            driver.get(url)
+            #scripts often fill the page after the load event: wait until the text stops growing
+            deadline = time.monotonic() + RENDER_SETTLE
+            last = -1
+            while time.monotonic() < deadline:
+                length = driver.execute_script("return document.body ? document.body.innerText.length : 0")
+                if length == last and length > 0:
+                    break
+                last = length
+                time.sleep(0.25)
+            return driver.page_source
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+        with self._lock:
+            drivers = list(self._drivers)
+        for driver in drivers:
+            self._quit(driver)
+
+
+_pool = None
+_pool_unavailable = None  #why no browser could be started, once that happened
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Return the process-wide browser pool, or None when rendering is off or impossible"""
+    global _pool
+    if RENDER_MODE == "off" or _pool_unavailable:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+                atexit.register(_pool.close)
+    return _pool
+
+
+def set_render_mode(mode):
+    """Change the render mode ("auto"/"off"), the CLI's --render"""
+    global RENDER_MODE
+    if mode not in ("auto", "off"):
+        raise ValueError("render mode must be auto or off")
+    RENDER_MODE = mode
+
+
+def shutdown_render_pool():
+    """Quit the pool's browsers at the end of a run instead of at interpreter exit"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            atexit.unregister(_pool.close)
+            _pool.close()
+            _pool = None
+
+
+def _disable(reason):
+    global _pool_unavailable
+    with _pool_lock:
+        if _pool_unavailable:
+            return
+        _pool_unavailable = reason
+    logger.warning(f"Browser rendering disabled, JavaScript-only pages keep their static text: {reason}")
+
+
+def render_if_needed(url, page, content, thin_text=True):
+    """``page``, or the parse of the browser-rendered ``url`` when the static one looks empty and rendering adds text"""
+    if RENDER_MODE == "off":
+        return page
+    reason = needs_render(page, content, thin_text)
+    metrics.inc("render_checks", result="needed" if reason else "static")
+    if not reason:
+        return page
+    try:
+        pool = get_render_pool()
+    except ValueError as e:  #a bad NGO_RENDER_BLOCK
+        _disable(str(e))
+        pool = None
+    if pool is None:
+        metrics.inc("render_pages", result="unavailable")
+        return page
+
+    started = time.perf_counter()
+    try:
+        with metrics.span("render"):
+            html = pool.render(url)
+            rendered = parse_html(html.encode("utf-8"), "text/html; charset=utf-8")
+    except BrowserUnavailable as e:
+        _disable(str(e))
+        metrics.inc("render_pages", result="unavailable")
+        return page
+    except Exception as e:
+        logger.warning(f"Could not render {url}: {type(e).__name__}: {str(e).strip()[:200]}")
+        _record(url, reason, page, None, time.perf_counter() - started)
+        return page
+
+    improved = len(rendered.text) > len(page.text)
+    _record(url, reason, page, rendered, time.perf_counter() - started)
+    return rendered if improved else page
+
+
+def _record(url, reason, page, rendered, seconds):
+    result = "error" if rendered is None else "improved" if len(rendered.text) > len(page.text) else "no_gain"
+    metrics.inc("render_pages", result=result)
+    metrics.observe("render_seconds", seconds)
+    metrics.add_row("render", {"Page": url,
+                               "Reason": reason,
+                               "Static chars": len(page.text),
+                               "Rendered chars": len(rendered.text) if rendered is not None else None,
+                               "Seconds": round(seconds, 2),
+                               "Result": result.replace("_", " ")})
+
+
+def summary(registry=metrics.registry):
+    if RENDER_MODE == "off":
+        return "Browser renders: off"
+    checked = registry.value("render_checks")
+    if not checked:
+        return "Browser renders: no pages yet"
+    attempts, seconds, _ = registry.totals("render_seconds")
+    errors = registry.value("render_pages", result="error")
+    text = (f"Browser renders: {attempts}/{checked} pages ({attempts / checked:.1%} fallback rate), "
+            f"{registry.value('render_pages', result='improved')} gained text, {errors} errors")
+    if attempts:
+        text += f", {seconds / attempts:.2f}s per render, {registry.value('render_browsers_started')} browsers started"
+    if _pool_unavailable:
+        text += (f"; {registry.value('render_checks', result='needed')} pages needed a browser "
+                 f"but none is available ({_pool_unavailable})")
+    return text
@@ -0,0 +1,202 @@
+"""Deterministic pre-extraction pass that runs before the LLM.
+
+Fills as many of the five output fields as possible from signals that do not
+need a model: schema.org JSON-LD/microdata Organization blocks,
+og:site_name/<title>, tel: links and phone numbers (via ``phonenumbers``) and
+Indian PIN-code addresses. Gemini is then only asked for what is left.
+"""
+import json
+import re
+
+from ngo_scraper import metrics
+
+REQUIRED_FIELDS = ["NGO Name", "Address", "Services Offered", "Contact Person Details", "Contact Number"]
+
+ORG_TYPES = {"organization", "ngo", "nonprofitorganization", "charity", "localbusiness",
+             "educationalorganization", "medicalorganization", "governmentorganization", "corporation"}
+
+ORG_NAME_WORDS = re.compile(
+    r'\b(foundation|trust|society|sangh|samiti|sanstha|sansthan|ngo|welfare|mission|association|'
+    r'seva|kendra|charitable|council|federation|forum|initiative|network|club)\b', re.I)
+
+INDIAN_STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat", "Haryana",
+    "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
+    "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Orissa", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu",
+    "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal", "Delhi", "New Delhi",
+    "Jammu and Kashmir", "Jammu & Kashmir", "Ladakh", "Chandigarh", "Puducherry", "Pondicherry",
+    "Andaman and Nicobar", "Dadra and Nagar Haveli", "Daman and Diu", "Lakshadweep",
+]
+STATE_RE = re.compile(r'\b(' + '|'.join(re.escape(state) for state in INDIAN_STATES) + r')\b', re.I)
+PIN_RE = re.compile(r'(?<!\d)([1-9]\d{2})\s?(\d{3})(?!\d)')
+#words that usually sit right before an address and should not be part of it
+ADDRESS_LEAD_RE = re.compile(r'\b(?:address|office|head ?quarters?|location|reach us|visit us|contact(?: us)?)\s*:?\s*', re.I)
+ADDRESS_STOP_RE = re.compile(r'\s(?:phone|ph|tel|mobile|mob|call|e-?mail|fax|website)\b', re.I)
+CONTACT_PERSON_RE = re.compile(
+    r'(?i:contact person)\s*[:\-]\s*'
+    r'((?:(?:Shri|Smt|Mr|Mrs|Ms|Dr|Prof)\.?\s+)?[A-Z][\w.]+(?:\s+[A-Z][\w.]+){0,3}'
+    r'(?:,\s*[A-Z][a-z]+(?:\s+(?!Copyright\b)[A-Z][a-z]+)?)?)')
+
+def record_outcome(known_fields, llm_called):
+    metrics.inc("rule_extract_sites", result="needs_llm" if llm_called else "resolved")
+    metrics.inc("rule_extract_fields", len(known_fields))
+
+
+def summary(registry=metrics.registry):
+    sites = registry.value("rule_extract_sites")
+    if not sites:
+        return "Rule-based pass: no sites yet"
+    resolved = registry.value("rule_extract_sites", result="resolved")
+    return (f"Rule-based pass: {resolved}/{sites} sites ({resolved / sites * 100:.0f}%) resolved "
+            f"with no AI call, {registry.value('rule_extract_fields') / sites:.1f} fields/site pre-filled")
+
+
+def _iter_jsonld_nodes(data):
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_jsonld_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        for key in ("@graph", "mainEntity", "publisher", "provider", "author"):
+            if key in data:
+                yield from _iter_jsonld_nodes(data[key])
+
+
+def _is_org(node):
+    types = node.get("@type", [])
+    if isinstance(types, str):
+        types = [types]
+    return any(str(t).lower() in ORG_TYPES for t in types)
+
+
+def _text(value):
+    if isinstance(value, dict):
+        return value.get("name") or value.get("email") or ""
+    if isinstance(value, list):
+        return "; ".join(filter(None, (_text(v) for v in value)))
+    return str(value).strip() if value else ""
+
+
+def _format_address(value):
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    if isinstance(value, dict):
+        parts = [value.get(key) for key in ("streetAddress", "addressLocality", "addressRegion")]
+        line = ", ".join(_text(p) for p in parts if p)
+        pin = _text(value.get("postalCode"))
+        return f"{line} {pin}".strip() if line else pin
+    return _text(value)
+
+
+def _organization_fields(page):
+    """Fields from schema.org JSON-LD and microdata Organization blocks"""
+    fields = {}
+    nodes = []
+    for block in page.jsonld:
+        try:
+            nodes.extend(node for node in _iter_jsonld_nodes(json.loads(block)) if _is_org(node))
+        except (ValueError, TypeError):
+            continue
+    nodes.extend(page.microdata)
+
+    for node in nodes:
+        candidates = {
+            "NGO Name": _text(node.get("legalName") or node.get("name")),
+            "Address": _format_address(node.get("address")),
+            "Services Offered": _text(node.get("knowsAbout") or node.get("makesOffer")),
+            "Contact Person Details": _text(node.get("founder") or node.get("contactPoint") or node.get("employee")),
+            "Contact Number": _text(node.get("telephone")),
+        }
+        for field, value in candidates.items():
+            if value and field not in fields:
+                fields[field] = value
+    return fields
+
+
+def _site_name(page):
+    if page.site_name:
+        return page.site_name.strip()
+    if page.title:
+        for part in re.split(r'\s+[|\-–—:]\s+', page.title):
+            if ORG_NAME_WORDS.search(part):
+                return part.strip()
+    return None
+
+
+def _phone_number(page):
+    import phonenumbers
+
+    candidates = [href[4:] for href, _ in page.links if href.startswith('tel:')]
+    candidates += [page.footer_text or ""] + page.contact_sections
+    for text in candidates:
+        for match in phonenumbers.PhoneNumberMatcher(text, "IN"):
+            if phonenumbers.is_valid_number(match.number):
+                return phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
+    return None
+
+
+def find_address(text, name=None):
+    """Pull an Indian address ending in a PIN code out of a block of text"""
+    for match in PIN_RE.finditer(text):
+        window = text[max(0, match.start() - 180):match.end()]
+        if not STATE_RE.search(window) or ',' not in window:
+            continue
+        stop = None
+        for stop in ADDRESS_STOP_RE.finditer(window[:-len(match.group(0))]):
+            pass
+        if stop:
+            window = window[stop.end():]
+        leads = list(ADDRESS_LEAD_RE.finditer(window))
+        if leads:
+            window = window[leads[-1].end():]
+        if name and window.lower().startswith(name.lower()):
+            window = window[len(name):]
+        window = window.strip(" ,:-|")
+        if len(window) >= 15:
+            return window
+    return None
+
+
+def _address(page, name):
+    for text in page.contact_sections + [page.footer_text or ""]:
+        address = find_address(text, name)
+        if address:
+            return address
+    return None
+
+
+def _contact_person(page):
+    for text in page.contact_sections + [page.footer_text or "", page.text]:
+        match = CONTACT_PERSON_RE.search(text)
+        if match:
+            return match.group(1).strip(" ,")
+    return None
+
+
+def extract_known_fields(pages):
+    """Resolve what we can without the LLM from a list of ParsedPage (main page first)"""
+    fields = {}
+    for page in pages:
+        for field, value in _organization_fields(page).items():
+            fields.setdefault(field, value)
+
+        if "NGO Name" not in fields:
+            name = _site_name(page)
+            if name:
+                fields["NGO Name"] = name
+        if "Contact Number" not in fields:
+            phone = _phone_number(page)
+            if phone:
+                fields["Contact Number"] = phone
+        if "Address" not in fields:
+            address = _address(page, fields.get("NGO Name"))
+            if address:
+                fields["Address"] = address
+        if "Contact Person Details" not in fields:
+            person = _contact_person(page)
+            if person:
+                fields["Contact Person Details"] = person
+
+        if len(fields) == len(REQUIRED_FIELDS):
+            break
+    return fields
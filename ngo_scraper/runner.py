@@ -0,0 +1,96 @@
+"""Background runs for the Streamlit app.
+
+``run_batch`` holds its caller until the last site is done, and a Streamlit
+script that is held shows nothing until then. ``BackgroundRun`` runs it in
+a daemon thread instead: finished records are collected as they arrive and
+the page polls ``snapshot()`` from a fragment, so only that fragment reruns
+while the rest of the page stays as it is. ``cancel()`` stops the run
+early; sites in flight finish and a checkpointed job stays resumable.
+"""
+import dataclasses
+import logging
+import threading
+import time
+
+from ngo_scraper import metrics
+from ngo_scraper.batch import BatchStats, run_batch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class RunSnapshot:
+    records: list          #finished records, in completion order
+    stats: BatchStats
+    running: bool
+    cancelling: bool
+    error: str = None
+    results: list = None   #records in input order, once the run is over
+
+
+class BackgroundRun:
+    """``run_batch(urls, **batch_kwargs)`` on a daemon thread; see the module docstring"""
+
+    def __init__(self, urls, **batch_kwargs):
+        self.urls = urls
+        self.batch_kwargs = batch_kwargs
+        self.metrics = metrics.Registry()  #this run's numbers and reports, for the summaries
+        self.started_at = None
+        self._records = []
+        self._stats = BatchStats(total=len(urls))
+        self._results = None
+        self._error = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="background-run")
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread.start()
+        return self
+
+    def _on_result(self, index, record, stats):
+        with self._lock:
+            self._records.append(record)
+            self._stats = dataclasses.replace(stats)
+
+    def _run(self):
+        try:
+            results, stats = run_batch(self.urls, on_result=self._on_result, cancel=self._cancel,
+                                      run_metrics=self.metrics, **self.batch_kwargs)
+            with self._lock:
+                self._results = [record for record in results if record is not None]
+                self._stats = stats
+        except Exception as e:
+            logger.exception("Background run failed")
+            with self._lock:
+                self._error = str(e)
+                self._results = list(self._records)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def snapshot(self):
+        """A consistent copy of the progress so far, safe to render from the script thread"""
+        running = self.running
+        with self._lock:
+            stats = dataclasses.replace(self._stats)
+            snapshot = RunSnapshot(records=list(self._records), stats=stats,
+                                   running=running, cancelling=self._cancel.is_set() and running,
+                                   error=self._error, results=None if running else self._results)
+        if running:  #rate and ETA keep moving between finished sites
+            stats.elapsed = time.time() - self.started_at
+        return snapshot
+
+
+def format_duration(seconds):
+    """``1:05:09`` / ``5:09``, or "–" when unknown"""
+    if seconds is None:
+        return "–"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
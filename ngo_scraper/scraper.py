@@ -0,0 +1,140 @@
+"""Crawl side of the scraper: fetch a site's main and contact pages and turn them into text.
+
+``scrape_and_extract_ngo_data`` is the one-call entry point; the batch
+pipeline uses ``scrape_comprehensive_content`` and the extraction functions
+as separate stages.
+"""
+import logging
+
+from ngo_scraper import metrics, render, rule_extract
+from ngo_scraper.canonical import crawl_url
+from ngo_scraper.content_pack import PAGE_TEXT_LIMIT
+from ngo_scraper import discovery
+from ngo_scraper.discovery import WAVES, covered_fields, discover_pages
+from ngo_scraper.extraction import extract_required_fields_with_gemini
+from ngo_scraper.http_client import fetch, fetch_many, record_site
+from ngo_scraper.parse_pool import parse_html, submit_parse
+
+logger = logging.getLogger(__name__)
+
+
+def downloaded_bytes(response):
+    return 0 if getattr(response, 'from_cache', False) else len(response.content)
+
+
+@metrics.span("scrape")
+def scrape_comprehensive_content(url):
+    """Scrape content from main page AND contact/about pages"""
+    all_content = []
+    
+    try:
+        url = crawl_url(url)   #https:// if missing
+        
+        with metrics.span("fetch_main"):
+            response = fetch(url, timeout=15)   #main Page, pooled session + per-host delay
+
+        response.raise_for_status()
+        #links resolve against (and the batch dedups on) where the site actually landed
+        url = response.url or url
+        downloaded = downloaded_bytes(response)
+        
+        #one parse serves link discovery, structured data and text
+        static_page = parse_html(response.content, response.headers.get('Content-Type'))
+        #JavaScript-only sites get their text (and links) from a headless browser
+        page = render.render_if_needed(url, static_page, response.content)
+        #a site built by scripts builds its subpages the same way; otherwise short subpages are just short
+        rendered_site = page is not static_page
+        
+        #ranked by how likely they hold contact details, robots.txt respected
+        with metrics.span("discover"):
+            additional_pages = discover_pages(url, page)
+        
+        all_content.append(("Main Page", page.text[:PAGE_TEXT_LIMIT]))
+        pages = [page]
+        
+        #fetch the best candidates in waves and stop once every required field is covered
+        remaining = list(additional_pages)
+        fetched = 0
+        for wave in WAVES:
+            if not remaining:
+                break
+            known_fields = rule_extract.extract_known_fields(pages)
+            if covered_fields(known_fields, all_content) >= set(rule_extract.REQUIRED_FIELDS):
+                break
+            batch, remaining = remaining[:wave], remaining[wave:]
+            fetched += len(batch)
+            
+            parses = []
+            with metrics.span("fetch_subpages"):
+                responses = fetch_many(batch, timeout=10)
+            for page_url, page_response, error in responses:
+                if error:
+                    logger.warning(f"Could not scrape {page_url}: {str(error)}")
+                    continue
+                downloaded += downloaded_bytes(page_response)
+                #with a parse pool the subpages are parsed in parallel
+                parses.append((page_url, page_response.content,
+                               submit_parse(page_response.content, page_response.headers.get('Content-Type'))))
+
+            for page_url, content, parsed in parses:
+                try:
+                    subpage = render.render_if_needed(page_url, parsed.result(), content, thin_text=rendered_site)
+                    all_content.append((page_url.rstrip('/').split('/')[-1], subpage.text[:PAGE_TEXT_LIMIT]))
+                    pages.append(subpage)
+                    
+                except Exception as e:
+                    logger.warning(f"Could not scrape {page_url}: {str(e)}")
+        discovery.record_site(len(additional_pages), fetched)
+        
+        structured_data = extract_structured_data(page)
+        if structured_data:
+            all_content.append(("Structured Data", structured_data))
+        
+        #fields we can resolve without the LLM (schema.org, tel: links, PIN addresses...)
+        with metrics.span("rule_extract"):
+            known_fields = rule_extract.extract_known_fields(pages)
+        record_site(downloaded)
+        
+        return all_content, url, known_fields
+        
+    except Exception as e:
+        logger.error(f"Error scraping {url}: {str(e)}")
+        return [("Error", f"Error scraping website: {str(e)}")], url, {}
+
+
+def extract_structured_data(page):
+    """Extract contact info from footer, contact sections, and metadata"""
+    structured_info = []
+    
+    #forfooter
+    if page.footer_text:
+        structured_info.append(f"FOOTER: {page.footer_text}")
+    
+    #get contact
+    for section_text in page.contact_sections:
+        structured_info.append(f"CONTACT SECTION: {section_text}")
+
+    for href, _ in page.links:
+        if href.startswith('tel:'):
+            structured_info.append(f"PHONE: {href.replace('tel:', '')}")
+        elif href.startswith('mailto:'):
+            structured_info.append(f"EMAIL: {href.replace('mailto:', '')}")
+    
+    return ' | '.join(structured_info) if structured_info else None
+
+
+def scrape_and_extract_ngo_data(url):
+    """Main function: Comprehensive scraping + AI extraction with retries"""
+    all_content, final_url, known_fields = scrape_comprehensive_content(url)
+    
+    if all_content and all_content[0][0] == "Error":
+        return {
+            "NGO Name": all_content[0][1],
+            "Address": "Not found",
+            "Services Offered": "Not found",
+            "Contact Person Details": "Not found",
+            "Contact Number": "Not found"
+        }
+    
+    extracted_data = extract_required_fields_with_gemini(all_content, final_url, known_fields)
+    return extracted_data
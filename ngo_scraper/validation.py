@@ -0,0 +1,178 @@
+"""Checks on an extracted record, so a retry can ask for just the fields that failed.
+
+Each field the model returned is checked against what it should look like
+and against the scraped text:
+
+* Contact Number: at least one number that ``phonenumbers`` accepts as valid
+  (Indian numbers by default); valid numbers are reformatted as +91 XXXXX XXXXX
+* Contact Person Details: every email in it passes ``validators.email``, and
+  it is not just a number
+* Address: long enough to be an address, and when it has both a PIN code and
+  a state, the PIN code's postal zone covers that state
+* Services Offered: not empty or a single word
+* NGO Name: not a generic page name ("Home", "Welcome") and backed by the
+  page: it shares a word with the page title or appears in the text
+* "Not found" counts as a failure only when the text has evidence for the
+  field (a phone-shaped number, a PIN-code address, leadership words...),
+  otherwise asking again cannot help
+
+``extraction`` sends a follow-up request for the failed fields only, with
+just the blocks most relevant to them, instead of re-running the whole
+prompt. ``record_site`` adds a row per site to the run's "validation"
+report (``metrics.add_row``) comparing the tokens of those follow-ups with
+re-sending the full prompt.
+"""
+import re
+
+from ngo_scraper import metrics
+from ngo_scraper.content_pack import SIGNALS
+from ngo_scraper.rule_extract import PIN_RE, STATE_RE, find_address
+
+NOT_FOUND = "Not found"
+
+#first digit of a PIN code -> states served by that postal zone
+PIN_ZONES = {
+    "1": {"delhi", "new delhi", "haryana", "punjab", "himachal pradesh", "jammu and kashmir", "jammu & kashmir",
+          "ladakh", "chandigarh"},
+    "2": {"uttar pradesh", "uttarakhand"},
+    "3": {"rajasthan", "gujarat", "daman and diu", "dadra and nagar haveli"},
+    "4": {"maharashtra", "madhya pradesh", "chhattisgarh", "goa"},
+    "5": {"andhra pradesh", "telangana", "karnataka"},
+    "6": {"tamil nadu", "kerala", "puducherry", "pondicherry", "lakshadweep"},
+    "7": {"west bengal", "odisha", "orissa", "assam", "arunachal pradesh", "manipur", "meghalaya", "mizoram",
+          "nagaland", "tripura", "sikkim", "andaman and nicobar"},
+    "8": {"bihar", "jharkhand"},
+}
+EMAIL_RE = re.compile(r'\S+@\S+')
+#Indian mobile and landline shapes; enough to say a number is on the page
+PHONE_EVIDENCE_RE = re.compile(r'(?<!\d)(?:\+?91[\s-]?)?(?:[6-9]\d{4}[\s-]?\d{5}|0\d{2,4}[\s-]?\d{6,8})(?!\d)')
+GENERIC_NAME_RE = re.compile(r'^(?:home|home ?page|welcome|about|about us|contact|contact us|index|untitled|'
+                             r'ngo|not found|n/?a)$', re.I)
+NAME_STOPWORDS = {"the", "and", "for", "of", "ngo", "india", "home", "welcome", "official", "website", "site"}
+MIN_ADDRESS_CHARS = 15
+
+
+def _words(text):
+    return {word for word in re.findall(r'[a-z0-9]+', text.lower()) if len(word) > 2 and word not in NAME_STOPWORDS}
+
+
+def page_title(all_content):
+    """First line of the main page text, which the parser takes from <title>"""
+    for source, content in all_content:
+        if source == "Main Page":
+            return next((line.strip() for line in content.split('\n') if line.strip()), "")
+    return ""
+
+
+def format_phone_numbers(value):
+    """``value`` with its valid numbers in international format, or None when none is valid"""
+    import phonenumbers
+
+    numbers = []
+    for match in phonenumbers.PhoneNumberMatcher(value, "IN"):
+        if phonenumbers.is_valid_number(match.number):
+            formatted = phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
+            if formatted not in numbers:
+                numbers.append(formatted)
+    return "; ".join(numbers) or None
+
+
+def has_evidence(field, all_content):
+    """Whether the scraped text holds something the field could be extracted from"""
+    if field == "NGO Name":
+        return True
+    for _, content in all_content:
+        if field == "Contact Number" and PHONE_EVIDENCE_RE.search(content):
+            return True
+        if field == "Address" and find_address(content):
+            return True
+        if field == "Contact Person Details" and SIGNALS[field][1].search(content):
+            return True
+        if field == "Services Offered" and len(SIGNALS[field][1].findall(content)) >= 3:
+            return True
+    return False
+
+
+def check_field(field, value, all_content):
+    """Why ``value`` is not acceptable for ``field`` ("missing", "invalid phone"...), or None when it is"""
+    value = str(value).strip()
+    if not value or value == NOT_FOUND:
+        return "missing" if has_evidence(field, all_content) else None
+    if field == "Contact Number":
+        return None if format_phone_numbers(value) else "invalid phone number"
+    if field == "Contact Person Details":
+        import validators
+
+        if any(not validators.email(email.strip('.,;:()<>')) for email in EMAIL_RE.findall(value)):
+            return "invalid email"
+        if not re.search(r'[^\W\d_]', value):
+            return "not a name or email"
+        return None
+    if field == "Address":
+        if len(value) < MIN_ADDRESS_CHARS:
+            return "incomplete address"
+        pin = PIN_RE.search(value)
+        states = {state.lower() for state in STATE_RE.findall(value)}
+        if pin and states and not states & PIN_ZONES.get(pin.group(1)[0], set()):
+            return "PIN code does not match state"
+        return None
+    if field == "Services Offered":
+        return None if len(value.split()) > 1 else "too short"
+    if field == "NGO Name":
+        if GENERIC_NAME_RE.match(value):
+            return "generic page name"
+        if _words(value) & _words(page_title(all_content)):
+            return None
+        if any(value.lower() in content.lower() for _, content in all_content):
+            return None
+        return "not on the page"
+    return None
+
+
+def validate_record(record, all_content, fields):
+    """``{field: reason}`` for the ``fields`` of ``record`` that fail their check.
+
+    Valid phone numbers are reformatted in place.
+    """
+    failures = {}
+    for field in fields:
+        reason = check_field(field, record.get(field, NOT_FOUND), all_content)
+        if reason:
+            failures[field] = reason
+            metrics.inc("validation_failures", field=field, reason=reason)
+        elif field == "Contact Number" and record.get(field, NOT_FOUND) != NOT_FOUND:
+            record[field] = format_phone_numbers(str(record[field]))
+    return failures
+
+
+def record_site(url, failures, fixed, retry_tokens, full_retry_tokens):
+    """Add a site to the report: the fields that failed, those a follow-up fixed, and retry token costs.
+
+    ``full_retry_tokens`` is what the same retries would have cost re-sending the whole prompt.
+    """
+    if not failures and not retry_tokens:
+        metrics.inc("validation_sites", result="passed")
+        return
+    metrics.inc("validation_sites", result="failed")
+    metrics.inc("validation_fields", len(failures), result="failed")
+    metrics.inc("validation_fields", len(fixed), result="fixed")
+    metrics.inc("retry_tokens_saved", full_retry_tokens - retry_tokens)
+    metrics.add_row("validation", {"Website": url,
+                                   "Failed fields": "; ".join(f"{field} ({reason})" for field, reason in failures.items()),
+                                   "Fixed by follow-up": ", ".join(fixed),
+                                   "Retry tokens": retry_tokens,
+                                   "Full-prompt retry tokens": full_retry_tokens,
+                                   "Tokens saved": full_retry_tokens - retry_tokens})
+
+
+def summary(registry=metrics.registry):
+    sites = registry.value("validation_sites")
+    if not sites:
+        return "Validation: no sites yet"
+    failed = registry.value("validation_sites", result="failed")
+    saved = registry.value("retry_tokens_saved")
+    per_site = saved / failed if failed else 0
+    return (f"Validation: {failed}/{sites} sites had failed fields, "
+            f"{registry.value('validation_fields', result='fixed')}/{registry.value('validation_fields', result='failed')} "
+            f"fixed by {registry.value('extraction_retries', reason='followup')} targeted follow-ups; "
+            f"{saved} tokens saved vs whole-prompt retries ({per_site:.0f}/site)")
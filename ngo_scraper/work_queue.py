@@ -0,0 +1,327 @@
+"""Shared work queue for a fleet of worker processes, sharded by domain.
+
+``python -m ngo_scraper.worker enqueue urls.txt`` puts a job's URLs in the
+queue and any number of ``python -m ngo_scraper.worker run`` processes, on
+this machine or any machine that shares the queue, pull them until the job
+is done. The queue moves each URL queued -> leased -> done (or failed).
+
+Work is handed out by domain: ``lease`` gives a worker up to
+``NGO_LEASE_ITEMS`` queued URLs of one domain that no other worker holds,
+so every request to a host still comes from one process and that process's
+politeness delay holds. When the worker releases the domain it stays
+blocked for the politeness delay, so the next worker to take it does not
+hit the host straight away.
+
+Leases expire after ``NGO_LEASE_SECONDS`` unless the worker's heartbeat
+renews them. The next ``lease`` call from any worker returns the URLs of
+an expired lease (a crashed or hung worker) to the queue; a URL whose
+lease has expired ``MAX_ATTEMPTS`` times is failed instead of crashing
+workers forever. ``complete`` only accepts a result from the worker that
+holds the URL, so a worker that comes back after losing its lease cannot
+overwrite the result of the worker that took over.
+
+``WorkQueue`` is the interface workers use. ``SQLiteWorkQueue`` implements
+it on one SQLite file (WAL mode), good for every process on one box or a
+shared disk. A networked broker (Redis, a database server...) plugs in with
+``register_broker("redis", RedisWorkQueue)`` and ``NGO_WORK_QUEUE=redis://...``.
+
+Configured with NGO_WORK_QUEUE (path or URL).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from ngo_scraper import metrics
+from ngo_scraper.batch import error_record
+from ngo_scraper.canonical import site_key
+from ngo_scraper.http_client import POLITENESS_DELAY
+
+QUEUE_PATH = os.getenv("NGO_WORK_QUEUE", os.path.join(".cache", "work_queue.sqlite"))
+LEASE_SECONDS = float(os.getenv("NGO_LEASE_SECONDS", "60"))  #a lease not renewed for this long is taken back
+LEASE_ITEMS = int(os.getenv("NGO_LEASE_ITEMS", "20"))        #URLs of one domain handed out per lease
+MAX_ATTEMPTS = 3
+
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+
+def domain_of(url):
+    """Shard key: the host (and port) shared by every spelling of a site's URLs"""
+    return site_key(url).split('/', 1)[0]
+
+
+@dataclass
+class WorkItem:
+    id: int
+    job_id: int
+    position: int
+    url: str
+    attempts: int = 0
+
+
+@dataclass
+class Lease:
+    domain: str
+    worker: str
+    items: list = field(default_factory=list)  #[WorkItem]
+    lost: bool = False  #set by the holder once a heartbeat finds the lease gone
+
+
+class WorkQueue:
+    """What a worker needs from a broker; see the module docstring for the semantics"""
+
+    def enqueue(self, urls, label=None):
+        """Add a job with ``urls`` queued and return its id"""
+        raise NotImplementedError
+
+    def lease(self, worker):
+        """A ``Lease`` on queued URLs of one free domain, or None when none is free right now"""
+        raise NotImplementedError
+
+    def heartbeat(self, worker):
+        """Renew every lease ``worker`` holds; returns how many it still holds"""
+        raise NotImplementedError
+
+    def complete(self, item, worker, record, failed=False):
+        """Store the record of a leased URL; False when ``worker`` no longer holds it"""
+        raise NotImplementedError
+
+    def release(self, lease):
+        """Give a domain back, returning URLs of it that were not completed to the queue"""
+        raise NotImplementedError
+
+    def pending(self, job_id=None):
+        """URLs still queued or leased"""
+        raise NotImplementedError
+
+    def progress(self, job_id):
+        """``{state: count}`` for a job"""
+        raise NotImplementedError
+
+    def results(self, job_id):
+        """Records of a job's finished URLs, in input order"""
+        raise NotImplementedError
+
+    def jobs(self, limit=20):
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    def __init__(self, path=QUEUE_PATH, lease_seconds=LEASE_SECONDS, lease_items=LEASE_ITEMS,
+                 cooldown=POLITENESS_DELAY):
+        self.lease_seconds = lease_seconds
+        self.lease_items = lease_items
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        #transactions are explicit; BEGIN IMMEDIATE makes lease hand-out atomic across processes
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    label TEXT,
+                    created_at REAL,
+                    total INTEGER
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER,
+                    position INTEGER,
+                    url TEXT,
+                    domain TEXT,
+                    state TEXT,
+                    worker TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    record TEXT,
+                    updated_at REAL
+                )""")
+            #one row per domain a worker holds, or that is cooling down after a release (worker NULL)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS domain_leases (
+                    domain TEXT PRIMARY KEY,
+                    worker TEXT,
+                    expires_at REAL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS work_items_state ON work_items (state, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS work_items_domain ON work_items (domain, state)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS work_items_job ON work_items (job_id, position)")
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def enqueue(self, urls, label=None):
+        now = time.time()
+        with self._transaction():
+            job_id = self._conn.execute("INSERT INTO work_jobs (label, created_at, total) VALUES (?, ?, ?)",
+                                        (label, now, len(urls))).lastrowid
+            self._conn.executemany(
+                "INSERT INTO work_items (job_id, position, url, domain, state, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                ((job_id, position, url, domain_of(url), QUEUED, now) for position, url in enumerate(urls)))
+        return job_id
+
+    def _reclaim(self, now):
+        """Requeue the URLs of expired leases and fail those that have used up their attempts"""
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT domain FROM domain_leases WHERE expires_at < ? AND worker IS NOT NULL", (now,))]
+        self._conn.execute("DELETE FROM domain_leases WHERE expires_at < ?", (now,))
+        requeued = 0
+        for domain in expired:
+            for item_id, attempts, url in self._conn.execute(
+                    "SELECT id, attempts, url FROM work_items WHERE domain = ? AND state = ?",
+                    (domain, LEASED)).fetchall():
+                if attempts >= MAX_ATTEMPTS:
+                    record = {"Website": url, **error_record(f"  Gave up after {attempts} expired worker leases")}
+                    self._conn.execute("UPDATE work_items SET state = ?, worker = NULL, record = ?, updated_at = ? "
+                                       "WHERE id = ?", (FAILED, json.dumps(record), now, item_id))
+                    metrics.inc("work_items", result="abandoned")
+                else:
+                    self._conn.execute("UPDATE work_items SET state = ?, worker = NULL, updated_at = ? WHERE id = ?",
+                                       (QUEUED, now, item_id))
+                    requeued += 1
+        if requeued:
+            metrics.inc("work_requeued", requeued)
+
+    def lease(self, worker):
+        now = time.time()
+        with self._transaction():
+            self._reclaim(now)
+            row = self._conn.execute(
+                "SELECT domain FROM work_items WHERE state = ? "
+                "AND domain NOT IN (SELECT domain FROM domain_leases) ORDER BY id LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            domain = row[0]
+            self._conn.execute("INSERT INTO domain_leases (domain, worker, expires_at) VALUES (?, ?, ?)",
+                               (domain, worker, now + self.lease_seconds))
+            rows = self._conn.execute(
+                "SELECT id, job_id, position, url, attempts FROM work_items WHERE domain = ? AND state = ? "
+                "ORDER BY id LIMIT ?", (domain, QUEUED, self.lease_items)).fetchall()
+            self._conn.executemany(
+                "UPDATE work_items SET state = ?, worker = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                ((LEASED, worker, now, item_id) for item_id, *_ in rows))
+        return Lease(domain, worker, [WorkItem(item_id, job_id, position, url, attempts + 1)
+                                      for item_id, job_id, position, url, attempts in rows])
+
+    def heartbeat(self, worker):
+        with self._transaction():
+            return self._conn.execute("UPDATE domain_leases SET expires_at = ? WHERE worker = ?",
+                                      (time.time() + self.lease_seconds, worker)).rowcount
+
+    def complete(self, item, worker, record, failed=False):
+        with self._transaction():
+            updated = self._conn.execute(
+                "UPDATE work_items SET state = ?, worker = NULL, record = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (FAILED if failed else DONE, json.dumps(record), time.time(), item.id, worker, LEASED)).rowcount
+        return bool(updated)
+
+    def release(self, lease):
+        now = time.time()
+        with self._transaction():
+            self._conn.execute("UPDATE work_items SET state = ?, worker = NULL, attempts = attempts - 1, updated_at = ? "
+                               "WHERE domain = ? AND worker = ? AND state = ?",
+                               (QUEUED, now, lease.domain, lease.worker, LEASED))
+            #the domain cools down for the politeness delay before another worker may take it
+            self._conn.execute("UPDATE domain_leases SET worker = NULL, expires_at = ? WHERE domain = ? AND worker = ?",
+                               (now + self.cooldown, lease.domain, lease.worker))
+
+    def pending(self, job_id=None):
+        with self._lock:
+            if job_id is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM work_items WHERE state IN (?, ?)",
+                                         (QUEUED, LEASED)).fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM work_items WHERE job_id = ? AND state IN (?, ?)",
+                                         (job_id, QUEUED, LEASED)).fetchone()
+        return row[0]
+
+    def progress(self, job_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM work_items WHERE job_id = ? GROUP BY state",
+                                      (job_id,)).fetchall()
+        return {state: 0 for state in (QUEUED, LEASED, DONE, FAILED)} | dict(rows)
+
+    def results(self, job_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM work_items WHERE job_id = ? AND state IN (?, ?) "
+                                      "ORDER BY position", (job_id, DONE, FAILED)).fetchall()
+        return [json.loads(record) for record, in rows]
+
+    def jobs(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT work_jobs.id, work_jobs.label, work_jobs.created_at, work_jobs.total,
+                       SUM(work_items.state IN (?, ?)), SUM(work_items.state = ?)
+                FROM work_jobs JOIN work_items ON work_items.job_id = work_jobs.id
+                GROUP BY work_jobs.id ORDER BY work_jobs.id DESC LIMIT ?""",
+                                      (DONE, FAILED, FAILED, limit)).fetchall()
+        return [{"id": row[0], "label": row[1], "created_at": row[2], "total": row[3],
+                 "finished": row[4] or 0, "failed": row[5] or 0} for row in rows]
+
+
+class _Transaction:
+    """``with`` block around BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error), serialized within the process"""
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+
+
+BROKERS = {"sqlite": SQLiteWorkQueue}
+
+
+def register_broker(scheme, factory):
+    """Use ``factory(location)`` for NGO_WORK_QUEUE values starting with ``scheme://``"""
+    BROKERS[scheme] = factory
+
+
+def open_work_queue(location=None):
+    """The queue at ``location``: a SQLite path, ``sqlite:///path`` or a URL of a registered broker"""
+    location = location or QUEUE_PATH
+    if "://" not in location:
+        return BROKERS["sqlite"](location)
+    scheme = urlparse(location).scheme
+    if scheme not in BROKERS:
+        raise ValueError(f"no work queue broker registered for {scheme}:// (known: {', '.join(BROKERS)})")
+    if scheme == "sqlite":  #sqlite:///relative.sqlite, sqlite:////absolute.sqlite
+        return BROKERS["sqlite"](location[len("sqlite:///"):])
+    return BROKERS[scheme](location)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_work_queue():
+    """Return the process-wide work queue (NGO_WORK_QUEUE)"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = open_work_queue()
+    return _queue
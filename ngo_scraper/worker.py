@@ -0,0 +1,216 @@
+"""Queue worker: scrape and extract the URLs of a shared work queue.
+
+    python -m ngo_scraper.worker enqueue urls.txt        #prints the job id
+    python -m ngo_scraper.worker run --threads 4         #start as many as the machines allow
+    python -m ngo_scraper.worker status [JOB_ID]
+    python -m ngo_scraper.worker export JOB_ID -o results.xlsx
+
+Each ``run`` process leases a domain at a time per thread (see
+``ngo_scraper.work_queue``), runs ``scrape_and_extract_ngo_data`` on its
+URLs and stores every record as soon as it is done. A heartbeat thread
+renews the leases; if the process dies they expire and another worker
+picks the URLs up. SIGTERM/Ctrl-C finish the sites in progress and hand
+the rest of the leased URLs back.
+
+Gemini quotas are tracked per process, so with several workers split
+NGO_GEMINI_QUOTAS between them.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from ngo_scraper import metrics, render
+from ngo_scraper.batch import error_record
+from ngo_scraper.incremental import is_error_record
+from ngo_scraper.work_queue import DONE, FAILED, LEASE_SECONDS, LEASED, QUEUED, open_work_queue
+
+logger = logging.getLogger(__name__)
+
+WORKER_THREADS = int(os.getenv("NGO_WORKER_THREADS", "4"))
+IDLE_SECONDS = 1.0  #wait before asking again when every queued domain is taken
+
+
+def is_failed(record):
+    return is_error_record(record) or str(record.get("NGO Name", "")).startswith("Error scraping")
+
+
+def default_process_fn(url):
+    from ngo_scraper.scraper import scrape_and_extract_ngo_data
+
+    return scrape_and_extract_ngo_data(url)
+
+
+class Worker:
+    """``threads`` loops leasing domains from ``queue`` and running ``process_fn(url)`` on their URLs"""
+
+    def __init__(self, queue, threads=None, process_fn=None, name=None, exit_when_empty=False):
+        self.queue = queue
+        self.threads = max(1, WORKER_THREADS if threads is None else threads)
+        self.process_fn = process_fn or default_process_fn
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.exit_when_empty = exit_when_empty
+        self.stop = threading.Event()
+        #one lease holder per thread, so a thread can never release a domain another thread took over
+        self.worker_ids = [f"{self.name}:{n}" for n in range(self.threads)]
+        self._leases = {}  #worker id -> the lease its thread is working on
+        self.metrics = metrics.Registry()  #what this worker recorded, for summary()
+
+    def run(self):
+        """Work until ``stop`` is set (or the queue is empty, with ``exit_when_empty``)"""
+        threads = [threading.Thread(target=self._work, args=(worker_id,), name=f"worker-{n}")
+                   for n, worker_id in enumerate(self.worker_ids)]
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True, name="worker-heartbeat")
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stop.set()
+
+    def _heartbeat(self):
+        interval = getattr(self.queue, "lease_seconds", LEASE_SECONDS) / 3
+        while not self.stop.wait(interval):
+            for worker_id in self.worker_ids:
+                #taken before renewing, so a lease granted after the renewal is not judged by it
+                lease = self._leases.get(worker_id)
+                try:
+                    held = self.queue.heartbeat(worker_id)
+                except Exception as e:
+                    logger.warning(f"Heartbeat failed for {worker_id}: {e}")
+                    continue
+                if lease is not None and not held:
+                    lease.lost = True
+
+    def _work(self, worker_id):
+        with metrics.collect(self.metrics):
+            while not self.stop.is_set():
+                lease = self.queue.lease(worker_id)
+                if lease is None:
+                    if self.exit_when_empty and not self.queue.pending():
+                        return
+                    self.stop.wait(IDLE_SECONDS)
+                    continue
+                self._leases[worker_id] = lease
+                try:
+                    for item in lease.items:
+                        if self.stop.is_set():
+                            break
+                        #another worker owns the rest of the domain's URLs once the lease is gone
+                        if lease.lost or not self._process(item, worker_id):
+                            logger.warning(f"Lease on {lease.domain} expired; its remaining URLs are left to the next worker")
+                            break
+                finally:
+                    self._leases.pop(worker_id, None)
+                    self.queue.release(lease)
+
+    def _process(self, item, worker_id):
+        """Run ``process_fn`` on one URL and store its record; False when the lease was lost meanwhile"""
+        start = time.perf_counter()
+        try:
+            record = self.process_fn(item.url)
+        except Exception as e:
+            logger.error(f"Worker failed on {item.url}: {str(e)}")
+            record = error_record(f"  Worker error: {str(e)[:100]}")
+        record = {"Website": item.url, **record}
+        record["Website"] = item.url
+        failed = is_failed(record)
+        kept = self.queue.complete(item, worker_id, record, failed=failed)
+        result = "lost" if not kept else "failed" if failed else "done"
+        metrics.inc("work_items", result=result)
+        metrics.observe("work_item_seconds", time.perf_counter() - start)
+        if not kept:
+            logger.warning(f"Lease on {item.url} expired before it finished; the result was dropped")
+        else:
+            logger.info(f"{result}: {item.url}")
+        return kept
+
+
+def summary(registry=metrics.registry):
+    processed, seconds, _ = registry.totals("work_item_seconds")
+    if not processed:
+        return "Worker: no sites yet"
+    lost = registry.value("work_items", result="lost")
+    return (f"Worker: {processed - lost} sites ({registry.value('work_items', result='failed')} failed), "
+            f"{seconds / processed:.2f}s per site, {lost} results dropped after a lost lease")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ngo_scraper.worker", description=__doc__.splitlines()[0])
+    parser.add_argument("--queue", default=None, help="work queue path or broker URL (default NGO_WORK_QUEUE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="add a job with the URLs of a file ('-' reads stdin)")
+    enqueue.add_argument("input")
+    enqueue.add_argument("--label", default=None)
+    run = commands.add_parser("run", help="work on queued URLs")
+    run.add_argument("--threads", type=int, default=None, help="domains worked on at once (default NGO_WORKER_THREADS)")
+    run.add_argument("--exit-when-empty", action="store_true", help="stop once nothing is queued or leased")
+    run.add_argument("-q", "--quiet", action="store_true")
+    status = commands.add_parser("status", help="show jobs, or the states of one job's URLs")
+    status.add_argument("job_id", type=int, nargs="?")
+    export = commands.add_parser("export", help="write a job's finished records")
+    export.add_argument("job_id", type=int)
+    export.add_argument("-o", "--output", required=True, help="output file (.jsonl, .csv, .xlsx, .parquet)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    queue = open_work_queue(args.queue)
+
+    if args.command == "enqueue":
+        from ngo_scraper.batch import read_url_list
+        from ngo_scraper.cli import read_input
+
+        urls = read_url_list(read_input(args.input))
+        if not urls:
+            print("error: no URLs found in input", file=sys.stderr)
+            return 2
+        print(queue.enqueue(urls, label=args.label or (None if args.input == "-" else os.path.basename(args.input))))
+        return 0
+
+    if args.command == "status":
+        if args.job_id is None:
+            for job in queue.jobs():
+                print(f"{job['id']}\t{job['finished']}/{job['total']} done\t{job['failed']} failed\t{job['label'] or ''}")
+        else:
+            progress = queue.progress(args.job_id)
+            print("\t".join(f"{state} {progress[state]}" for state in (QUEUED, LEASED, DONE, FAILED)))
+        return 0
+
+    if args.command == "export":
+        from ngo_scraper.export import export_records
+
+        records = queue.results(args.job_id)
+        export_records(records, args.output)
+        print(f"{len(records)} records written to {args.output}", file=sys.stderr)
+        return 0
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, stream=sys.stderr)
+    worker = Worker(queue, threads=args.threads, exit_when_empty=args.exit_when_empty)
+
+    def stop(signum, frame):
+        logger.info("Stopping: finishing the sites in progress")
+        worker.stop.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        worker.run()
+    finally:
+        render.shutdown_render_pool()
+    if not args.quiet:
+        from ngo_scraper import http_client
+
+        print(summary(worker.metrics), file=sys.stderr)
+        print(http_client.summary(worker.metrics), file=sys.stderr)
+        print(metrics.summary(worker.metrics), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())